@@ -0,0 +1,162 @@
+import argparse
+from datetime import date, timedelta
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from analysis.build_team_game_metrics import FACTS_CSV, load_team_games
+from analysis.stream_engine import stream_layers
+from scripts.print_consistency_board import consistency_board
+from scripts.print_momentum_board import momentum_board
+
+# --------------------------------------------------
+# Walk-forward backtest
+# --------------------------------------------------
+# python -m analysis.backtest [--start 2025-11-01] [--end 2026-02-07]
+#
+# Replays the season as the pipeline saw it. The clock stops on each
+# game day D: the momentum and consistency boards are drawn by their own
+# scripts' selection (momentum_board, consistency_board) from the games
+# before D, and every game on D gets the pregame expectation the
+# pipeline gave it.
+#
+# Every layer is causal in game_date (the contract the DAG's incremental
+# rebuilds rely on), so one fused build with the clock at the last day
+# holds every earlier day's state. Advancing the clock a day only moves
+# the teams that played forward, instead of rebuilding per day.
+
+PREDICTIONS_CSV = "data/derived/backtest_predictions.csv"
+BOARD_CSV = "data/derived/backtest_{board}_board.csv"
+
+PREDICTION_COLUMNS = [
+    "game_date", "game_id", "team_id", "team_name", "opponent_name", "home_away",
+    "fatigue_index", "expected_margin", "actual_margin",
+]
+BOARD_COLUMNS = {
+    "momentum": ["window_start", "window_end", "team_name", "score", "games", "label"],
+    "consistency": [
+        "team_id", "team_name", "game_date",
+        "consistency", "consistency_win", "consistency_loss",
+    ],
+}
+
+
+# --------------------------------------------------
+# Replay
+# --------------------------------------------------
+
+def walk_forward(
+    games: pd.DataFrame,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> Tuple[pd.DataFrame, Dict[str, pd.DataFrame]]:
+    """
+    Replay game days in [start, end] (default: the whole facts range).
+
+    Returns (predictions, boards): one row per team-game on a replayed
+    day with its pregame expected_margin and the actual result, and
+    {board name: frame} with each board as it stood on every replayed
+    day (as_of), ranked the way its script prints it.
+    """
+    days = pd.to_datetime(games["game_date"], errors="coerce").dt.date
+    end = end or days.max()
+
+    # The clock never passes `end`: later games do not exist yet
+    _, cvv = stream_layers(games[days <= end], today=end + timedelta(days=1))
+    if cvv.empty:
+        raise RuntimeError("No scored games on/before the backtest end date.")
+
+    rows = cvv.assign(game_date=cvv["game_date"].dt.date)
+    rows = rows.sort_values("game_date", kind="stable").reset_index(drop=True)
+    dates = rows["game_date"].to_numpy()
+    start = start or dates[0]
+
+    game_days = sorted(d for d in set(dates.tolist()) if start <= d <= end)
+
+    frames = {name: [] for name in BOARD_COLUMNS}
+    for day in game_days:
+        # Advance the clock to `day`: only earlier games are visible
+        seen = rows.iloc[:np.searchsorted(dates, day)]
+        if seen.empty:
+            continue
+
+        window_start, window_end, momentum = momentum_board(seen)
+        boards = {
+            "momentum": momentum.assign(window_start=window_start, window_end=window_end),
+            "consistency": consistency_board(seen),
+        }
+        for name, board in boards.items():
+            board = board[BOARD_COLUMNS[name]].reset_index(drop=True)
+            board.insert(0, "rank", np.arange(1, len(board) + 1))
+            board.insert(0, "as_of", day)
+            frames[name].append(board)
+
+    boards = {
+        name: pd.concat(parts, ignore_index=True) if parts
+        else pd.DataFrame(columns=["as_of", "rank", *BOARD_COLUMNS[name]])
+        for name, parts in frames.items()
+    }
+    boards["consistency"] = boards["consistency"].rename(columns={"game_date": "last_game_date"})
+
+    replayed = (dates >= start) & (dates <= end)
+    predictions = rows.loc[replayed, PREDICTION_COLUMNS]
+
+    return predictions.reset_index(drop=True), boards
+
+
+# --------------------------------------------------
+# Calibration
+# --------------------------------------------------
+
+def calibration(predictions: pd.DataFrame) -> pd.DataFrame:
+    """MAE / bias / winner hit rate of expected vs actual margin, by month and overall."""
+    error = predictions["actual_margin"] - predictions["expected_margin"]
+    hit = np.sign(predictions["expected_margin"]) == np.sign(predictions["actual_margin"])
+
+    frame = pd.DataFrame({
+        "month": pd.to_datetime(predictions["game_date"]).dt.strftime("%Y-%m"),
+        "abs_error": error.abs(),
+        "error": error,
+        "hit": hit,
+    })
+
+    def summarize(g: pd.DataFrame) -> pd.Series:
+        return pd.Series({
+            "rows": len(g),
+            "mae": round(g["abs_error"].mean(), 2),
+            "bias": round(g["error"].mean(), 2),
+            "hit_rate": round(g["hit"].mean(), 3),
+        })
+
+    by_month = frame.groupby("month").apply(summarize, include_groups=False)
+    by_month.loc["all"] = summarize(frame)
+    return by_month.astype({"rows": int})
+
+
+# --------------------------------------------------
+# Entrypoint
+# --------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of pregame expectations")
+    parser.add_argument("--start", type=date.fromisoformat, help="first replayed day (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="last replayed day (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    predictions, boards = walk_forward(load_team_games(FACTS_CSV), args.start, args.end)
+    predictions.to_csv(PREDICTIONS_CSV, index=False)
+
+    days = predictions["game_date"]
+    print(f"🔁 Replayed {days.nunique()} game days ({days.min()} → {days.max()})")
+    print(f"✅ Wrote {len(predictions)} pregame expectations → {PREDICTIONS_CSV}")
+    for name, board in boards.items():
+        path = BOARD_CSV.format(board=name)
+        board.to_csv(path, index=False)
+        print(f"✅ Wrote {len(board)} {name} board rows → {path}")
+    print()
+    print(calibration(predictions).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,24 @@
-import os
 import pandas as pd
 from analysis.archetypes import classify_archetype, direction_label
+from analysis.layers import layer_exists, layer_path, read_layer, save_layer
 
-INPUT_CSV = "data/derived/team_game_metrics_with_rpmi_cvv.csv"
-OUTPUT_CSV = "data/derived/team_game_metrics_with_archetypes.csv"
-
-def main():
-    if not os.path.exists(INPUT_CSV):
-        raise FileNotFoundError("CVV output missing — archetypes cannot run.")
-
-    df = pd.read_csv(INPUT_CSV)
+def build_archetypes(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         raise RuntimeError("Archetypes input is empty.")
 
+    df = df.copy()
     df["archetype"] = df.apply(classify_archetype, axis=1)
     df["direction_label"] = df.apply(direction_label, axis=1)
+    return df
+
+def main():
+    if not layer_exists("cvv"):
+        raise FileNotFoundError("CVV output missing — archetypes cannot run.")
+
+    df = build_archetypes(read_layer("cvv"))
 
-    df.to_csv(OUTPUT_CSV, index=False)
-    print(f"✅ Wrote {len(df)} rows → {OUTPUT_CSV}")
+    save_layer("archetypes", df)
+    print(f"✅ Wrote {len(df)} rows → {layer_path('archetypes')}")
 
 if __name__ == "__main__":
     main()
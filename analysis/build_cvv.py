@@ -1,93 +1,245 @@
 import pandas as pd
 import numpy as np
-import os
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Optional
 
-WINDOW = 10
-VOL_SCALE = 15.0
+from analysis.layers import layer_exists, layer_path, read_layer, save_layer
+from analysis.params import DEFAULT_PARAMS, ModelParams
+from analysis.shards import map_team_columns
+from analysis.utils import fresh_rows, round_values, splice_columns, with_lookback
 
+WINDOW = DEFAULT_PARAMS.cvv_window
+VOL_SCALE = DEFAULT_PARAMS.vol_scale
 
-def consistency_from_values(values: np.ndarray) -> float:
+
+def consistency_from_values(values: np.ndarray, vol_scale: float = VOL_SCALE) -> float:
     if len(values) < 3:
         return np.nan
     vol = np.std(values, ddof=0)
-    return round(1 / (1 + vol / VOL_SCALE), 3)
-
-
-def compute_cvv(df: pd.DataFrame) -> pd.DataFrame:
+    return round(1 / (1 + vol / vol_scale), 3)
+
+
+# --------------------------------------------------
+# Vectorized window moments
+# --------------------------------------------------
+
+def _numpy_pairwise(c: np.ndarray) -> np.ndarray:
+    """Row sums of `c` (every row fully used) in numpy's pairwise_sum order."""
+    n = c.shape[1]
+    if n < 8:
+        res = np.zeros(len(c))
+        for j in range(n):
+            res = res + c[:, j]
+        return res
+
+    if n <= 128:
+        # 8 running accumulators, tree-combined, then the remainder
+        r = [c[:, j] for j in range(8)]
+        i = 8
+        while i < n - n % 8:
+            r = [r[j] + c[:, i + j] for j in range(8)]
+            i += 8
+        res = ((r[0] + r[1]) + (r[2] + r[3])) + ((r[4] + r[5]) + (r[6] + r[7]))
+        for j in range(i, n):
+            res = res + c[:, j]
+        return res
+
+    half = n // 2
+    half -= half % 8
+    return _numpy_pairwise(c[:, :half]) + _numpy_pairwise(c[:, half:])
+
+
+def _pairwise_sum(c: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """
+    Row sums in numpy's own summation order (pairwise_sum).
+
+    `c` holds each row's values compacted to the left and zero-padded.
+    Reproducing np.sum's order keeps means/stds bit-identical to the
+    scalar path, which matters because 2-dp PvE values put many window
+    means exactly on a rounding tie.
+    """
+    if c.shape[1] >= 16:
+        # The order depends on each row's count: sum rows count by count
+        out = np.zeros(len(c))
+        for k in np.unique(n).tolist():
+            rows = n == k
+            out[rows] = _numpy_pairwise(c[rows, :k])
+        return out
+
+    # Windows under 16: at most one block, two passes cover every count
+    seq = np.zeros(len(c))
+    for j in range(c.shape[1]):
+        seq = seq + c[:, j]
+
+    if c.shape[1] < 8:
+        return seq
+
+    r = c[:, :8]
+    blk = ((r[:, 0] + r[:, 1]) + (r[:, 2] + r[:, 3])) + (
+        (r[:, 4] + r[:, 5]) + (r[:, 6] + r[:, 7])
+    )
+    for j in range(8, c.shape[1]):
+        blk = blk + c[:, j]
+
+    return np.where(n >= 8, blk, seq)
+
+
+def masked_mean_std(values: np.ndarray, mask: np.ndarray):
+    """
+    Per-row (count, mean, population std) of values[mask] for a window
+    matrix, matching np.mean / np.std(ddof=0) on the selected values.
+    """
+    order = np.argsort(~mask, axis=1, kind="stable")
+    keep = np.take_along_axis(mask, order, axis=1)
+    c = np.where(keep, np.take_along_axis(values, order, axis=1), 0.0)
+    n = keep.sum(axis=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = _pairwise_sum(c, n) / n
+        dev = np.where(keep, c - mean[:, None], 0.0)
+        std = np.sqrt(_pairwise_sum(dev * dev, n) / n)
+
+    return n, mean, std
+
+
+def consistency_from_std(
+    vol: np.ndarray, n: np.ndarray, vol_scale: float = VOL_SCALE
+) -> np.ndarray:
+    """Array version of consistency_from_values (NaN below 3 values)."""
+    return np.where(n >= 3, np.round(1 / (1 + vol / vol_scale), 3), np.nan)
+
+
+# --------------------------------------------------
+# Main computation
+# --------------------------------------------------
+
+def cvv_lookback(params: ModelParams = DEFAULT_PARAMS) -> int:
+    """Prior rows a row's window reaches back."""
+    return params.cvv_window - 1
+
+
+CVV_LOOKBACK = cvv_lookback()
+
+
+def cvv_columns(
+    margin: np.ndarray,
+    pve: np.ndarray,
+    team_pos: np.ndarray,
+    params: ModelParams = DEFAULT_PARAMS,
+) -> dict:
+    """CVV columns for rows laid out team by team (chronological)."""
+    window = params.cvv_window
+    pad = window - 1
+    pve_w = sliding_window_view(np.concatenate([np.full(pad, np.nan), pve]), window)
+    margin_w = sliding_window_view(
+        np.concatenate([np.full(pad, np.nan), margin]), window
+    )
+    return window_columns(margin_w, pve_w, team_pos, params.vol_scale)
+
+
+def window_columns(
+    margin_w: np.ndarray,
+    pve_w: np.ndarray,
+    team_pos: np.ndarray,
+    vol_scale: float = VOL_SCALE,
+) -> dict:
+    """
+    CVV columns from each row's trailing window (oldest first; WINDOW
+    games by default).
+
+    Windows of rows with team_pos < window - 1 may reach into another
+    team; everything derived from them is masked to NaN.
+    """
+    full = team_pos >= margin_w.shape[1] - 1
+
+    # --------------------------------------------------
+    # Window counts
+    # --------------------------------------------------
+    wins = np.where(full, (margin_w > 0).sum(axis=1), np.nan)
+    losses = np.where(full, (margin_w < 0).sum(axis=1), np.nan)
+    total = wins + losses
+
+    # --------------------------------------------------
+    # Masked moments over the window
+    # --------------------------------------------------
+    # Zero-margin games leave the window; NaN margins stay (not W, not L)
+    in_window = (margin_w != 0) & ~np.isnan(pve_w)
+    n_all, mean_all, std_all = masked_mean_std(pve_w, in_window)
+    n_win, _, std_win = masked_mean_std(pve_w, in_window & (margin_w > 0))
+    n_loss, _, std_loss = masked_mean_std(pve_w, in_window & (margin_w < 0))
+
+    moments = full & (n_all >= 3)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        win_rate = np.where(total > 0, np.round(wins / total, 3), np.nan)
+
+    return {
+        "pve_volatility": np.where(moments, np.round(std_all, 2), np.nan),
+        "consistency": np.where(
+            moments, consistency_from_std(std_all, n_all, vol_scale), np.nan
+        ),
+        "consistency_win": np.where(
+            moments, consistency_from_std(std_win, n_win, vol_scale), np.nan
+        ),
+        "consistency_loss": np.where(
+            moments, consistency_from_std(std_loss, n_loss, vol_scale), np.nan
+        ),
+        "games_played": (team_pos + 1).astype(np.float64),
+        "games_in_window": np.where(full, n_all, np.nan),
+        "avg_pve_window": np.where(moments, round_values(mean_all, 2), np.nan),
+        "wins_window": wins,
+        "losses_window": losses,
+        "win_rate_window": win_rate,
+    }
+
+
+def compute_cvv(
+    df: pd.DataFrame,
+    since=None,
+    previous: Optional[pd.DataFrame] = None,
+    params: ModelParams = DEFAULT_PARAMS,
+    workers: int = 1,
+) -> pd.DataFrame:
+    """
+    With `since` and the previous output, only rows on/after `since`
+    (plus cvv_lookback(params) rows of context per team) are recomputed; the
+    rest are copied from `previous`. `workers` > 1 scores team shards
+    on a process pool (see analysis/shards.py).
+    """
     df = df.copy()
     df["game_date"] = pd.to_datetime(df["game_date"], errors="coerce", utc=True)
     df = df.sort_values(["team_id", "game_date"])
 
-    cols = [
-        "pve_volatility",
-        "consistency",
-        "consistency_win",
-        "consistency_loss",
-        "games_played",
-        "games_in_window",
-        "avg_pve_window",
-        "wins_window",
-        "losses_window",
-        "win_rate_window",
-    ]
-    df[cols] = np.nan
-
-    for team_id, g in df.groupby("team_id"):
-        g = g.reset_index()
-
-        for i in range(len(g)):
-            idx = g.loc[i, "index"]
-            df.loc[idx, "games_played"] = i + 1
-
-            if i < WINDOW - 1:
-                continue
-
-            window = g.loc[i - WINDOW + 1 : i]
-            window = window[window["actual_margin"] != 0]
+    team_pos = df.groupby("team_id").cumcount().to_numpy()
+    fresh = fresh_rows(df, previous, since)
+    rows = with_lookback(team_pos, fresh, cvv_lookback(params))
 
-            wins = (window["actual_margin"] > 0).sum()
-            losses = (window["actual_margin"] < 0).sum()
-            total = wins + losses
-
-            df.loc[idx, "wins_window"] = wins
-            df.loc[idx, "losses_window"] = losses
-            df.loc[idx, "win_rate_window"] = round(wins / total, 3) if total else np.nan
-
-            pve_vals = window["pve"].dropna().values
-            df.loc[idx, "games_in_window"] = len(pve_vals)
-
-            if len(pve_vals) < 3:
-                continue
-
-            df.loc[idx, "avg_pve_window"] = round(float(np.mean(pve_vals)), 2)
-            df.loc[idx, "pve_volatility"] = round(np.std(pve_vals, ddof=0), 2)
-            df.loc[idx, "consistency"] = consistency_from_values(pve_vals)
-
-            df.loc[idx, "consistency_win"] = consistency_from_values(
-                window.loc[window["actual_margin"] > 0, "pve"].dropna().values
-            )
-            df.loc[idx, "consistency_loss"] = consistency_from_values(
-                window.loc[window["actual_margin"] < 0, "pve"].dropna().values
-            )
-
-    return df
+    computed = map_team_columns(
+        cvv_columns,
+        (
+            df["actual_margin"].to_numpy(dtype=np.float64)[rows],
+            df["pve"].to_numpy(dtype=np.float64)[rows],
+            team_pos[rows],
+        ),
+        df["team_id"].to_numpy()[rows],
+        params,
+        workers=workers,
+    )
+    return splice_columns(df, computed, rows, fresh, previous)
 
 
 def main():
-    input_csv = "data/derived/team_game_metrics_with_rpmi.csv"
-    output_csv = "data/derived/team_game_metrics_with_rpmi_cvv.csv"
-
-    if not os.path.exists(input_csv):
+    if not layer_exists("rpmi"):
         raise FileNotFoundError("RPMI output missing — CVV cannot run.")
 
-    df = pd.read_csv(input_csv)
+    df = read_layer("rpmi")
     if df.empty:
         raise RuntimeError("CVV input is empty.")
 
     out = compute_cvv(df)
-    out.to_csv(output_csv, index=False)
+    save_layer("cvv", out)
 
-    print(f"✅ Wrote {len(out)} rows → {output_csv}")
+    print(f"✅ Wrote {len(out)} rows → {layer_path('cvv')}")
     print(f"Window size: {WINDOW}")
     print(f"Avg win-rate (window): {out['win_rate_window'].mean():.3f}")
 
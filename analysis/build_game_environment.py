@@ -1,8 +1,13 @@
 import pandas as pd
 import numpy as np
 import os
+from typing import Optional
+
+from analysis.layers import layer_exists, read_layer
+from analysis.storage import read_table
+from analysis.team_history import TeamHistoryIndex
+from analysis.utils import on_or_after, round_values
 
-INPUT_CSV = "data/derived/team_game_metrics_with_rpmi_cvv.csv"
 FACTS_CSV = "data/core/team_game_facts.csv"
 OUTPUT_CSV = "data/derived/game_environment.csv"
 
@@ -18,163 +23,220 @@ VOL_SCALE = 15.0      # aligned with CVV
 FATIGUE_LOW = 30.0
 FATIGUE_HIGH = 80.0
 
+# Per-team columns carried into the paired home/away view
+PAIRED_COLS = [
+    "team_id",
+    "team_name",
+    "game_date",
+    "fatigue_index",
+    "pve_volatility",
+    "consistency",
+]
+
 
 # --------------------------------------------------
-# Normalization helpers
+# Normalization helpers (column-wise, NaN-propagating)
 # --------------------------------------------------
 
 def clip01(x):
-    return float(np.clip(x, 0.0, 1.0))
+    return np.clip(x, 0.0, 1.0)
 
 
 def norm_fatigue(f):
-    if pd.isna(f):
-        return np.nan
-    return clip01((float(f) - FATIGUE_LOW) / (FATIGUE_HIGH - FATIGUE_LOW))
+    return clip01((f - FATIGUE_LOW) / (FATIGUE_HIGH - FATIGUE_LOW))
 
 
 def norm_volatility(vol):
-    if pd.isna(vol):
-        return np.nan
-    return clip01(float(vol) / VOL_SCALE)
+    return clip01(vol / VOL_SCALE)
 
 
 def norm_asym(x, scale):
-    if pd.isna(x):
-        return np.nan
-    return clip01(abs(float(x)) / scale)
+    return clip01(np.abs(x) / scale)
 
 
 def safe_avg(values):
-    vals = [v for v in values if not pd.isna(v)]
-    return np.nan if not vals else float(np.mean(vals))
+    """Mean of the non-NaN entries per row, NaN if none."""
+    total = np.zeros(len(values[0]))
+    count = np.zeros(len(values[0]))
+    for v in values:
+        ok = ~np.isnan(v)
+        total = total + np.where(ok, v, 0.0)
+        count = count + ok
+    with np.errstate(invalid="ignore"):
+        return np.where(count > 0, total / count, np.nan)
 
 
 # --------------------------------------------------
 # Classification logic
 # --------------------------------------------------
 
+DRIVER_LABELS = ("fatigue load", "volatile teams", "stability mismatch")
+
+
 def classify_environment(risk_score, maturity_ok):
-    if not maturity_ok or pd.isna(risk_score):
-        return "Forming"
-    if risk_score <= CLEAN_THR:
-        return "Clean"
-    if risk_score >= NOISY_THR:
-        return "Noisy"
-    return "Mixed"
+    return np.select(
+        [
+            ~maturity_ok | np.isnan(risk_score),
+            risk_score <= CLEAN_THR,
+            risk_score >= NOISY_THR,
+        ],
+        ["Forming", "Clean", "Noisy"],
+        default="Mixed",
+    ).astype(object)
 
 
 def build_drivers(load_risk, behavior_risk, matchup_risk, maturity_ok):
-    if not maturity_ok:
-        return "early-season/low-history"
+    # 3 flags → 8 possible strings, picked by bitmask
+    combos = []
+    for code in range(2 ** len(DRIVER_LABELS)):
+        drivers = [lbl for bit, lbl in enumerate(DRIVER_LABELS) if code >> bit & 1]
+        combos.append(", ".join(drivers) if drivers else "stable conditions")
+
+    code = (
+        (load_risk >= 0.60) * 1
+        + (behavior_risk >= 0.60) * 2
+        + (matchup_risk >= 0.60) * 4
+    )
+    out = np.asarray(combos, dtype=object)[code]
+    out[~maturity_ok] = "early-season/low-history"
+    return out
+
 
-    drivers = []
-    if load_risk >= 0.60:
-        drivers.append("fatigue load")
-    if behavior_risk >= 0.60:
-        drivers.append("volatile teams")
-    if matchup_risk >= 0.60:
-        drivers.append("stability mismatch")
+# --------------------------------------------------
+# Main builder (paired home/away view)
+# --------------------------------------------------
 
-    return ", ".join(drivers) if drivers else "stable conditions"
+def build_game_environment(
+    df: pd.DataFrame,
+    facts: pd.DataFrame,
+    since=None,
+    previous: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """
+    With `since` and the previous output, games before `since` are
+    copied from `previous` (their inputs cannot have changed) and only
+    the rest are rebuilt.
+    """
+    df = df.reindex(columns=list(dict.fromkeys([*df.columns, *PAIRED_COLS])))
+    df["game_date"] = pd.to_datetime(df["game_date"], utc=True)
+
+    # Complete games only: two rows, one home and one away
+    by_game = df["game_id"]
+    complete = (
+        by_game.groupby(by_game).transform("size").eq(2)
+        & df["home_away"].eq("H").groupby(by_game).transform("sum").eq(1)
+        & df["home_away"].eq("A").groupby(by_game).transform("sum").eq(1)
+    )
+    df = df[complete]
+
+    parts = []
+    if previous is not None and since is not None:
+        settled = previous[
+            previous["game_id"].isin(df["game_id"])
+            & ~on_or_after(previous["game_date"], since)
+        ].copy()
+        settled["game_date"] = pd.to_datetime(settled["game_date"], utc=True)
+        df = df[~df["game_id"].isin(settled["game_id"])]
+        parts.append(settled)
+
+    if not df.empty:
+        parts.append(_environment_rows(df, facts))
+
+    out = pd.concat(parts, ignore_index=True)
+    return out.sort_values(["game_date", "game_id"])
+
+
+def _environment_rows(df: pd.DataFrame, facts: pd.DataFrame) -> pd.DataFrame:
+    wide = df.pivot(index="game_id", columns="home_away", values=PAIRED_COLS)
+    home = wide.xs("H", axis=1, level=1)
+    away = wide.xs("A", axis=1, level=1)
+
+    def col(frame, name):
+        return frame[name].to_numpy(dtype=np.float64)
+
+    game_date = pd.to_datetime(home["game_date"], utc=True)
+
+    # -----------------------------
+    # Maturity check (as-of facts)
+    # -----------------------------
+    history = TeamHistoryIndex(facts)
+    gp_home = history.games_played_many(home["team_id"].to_numpy(), game_date)
+    gp_away = history.games_played_many(
+        away["team_id"].to_numpy(), pd.to_datetime(away["game_date"], utc=True)
+    )
+
+    maturity_ok = (gp_home >= MIN_GAMES_FOR_MATURE) & (gp_away >= MIN_GAMES_FOR_MATURE)
+
+    # -----------------------------
+    # Load risk (fatigue)
+    # -----------------------------
+    f_home = col(home, "fatigue_index")
+    f_away = col(away, "fatigue_index")
+    load_risk = safe_avg([norm_fatigue(f_home), norm_fatigue(f_away)])
+
+    # -----------------------------
+    # Behavior risk (volatility)
+    # -----------------------------
+    v_home = col(home, "pve_volatility")
+    v_away = col(away, "pve_volatility")
+    behavior_risk = safe_avg([norm_volatility(v_home), norm_volatility(v_away)])
+
+    # -----------------------------
+    # Matchup risk (asymmetry)
+    # -----------------------------
+    asym_f = norm_asym(f_home - f_away, 40.0)
+    asym_c = norm_asym(col(home, "consistency") - col(away, "consistency"), 0.30)
+    matchup_risk = safe_avg([asym_f, asym_c])
+
+    # -----------------------------
+    # Overall environment risk
+    # -----------------------------
+    risk_score = safe_avg([
+        0.45 * load_risk,
+        0.35 * behavior_risk,
+        0.20 * matchup_risk,
+    ])
+
+    return pd.DataFrame({
+        "game_id": wide.index.to_numpy(),
+        "game_date": game_date.to_numpy(),
+        "matchup": (away["team_name"] + " @ " + home["team_name"]).to_numpy(),
+
+        "environment_risk": round_values(risk_score, 3),
+        "environment_label": classify_environment(risk_score, maturity_ok),
+        "drivers": build_drivers(load_risk, behavior_risk, matchup_risk, maturity_ok),
+
+        "load_risk": round_values(load_risk, 3),
+        "behavior_risk": round_values(behavior_risk, 3),
+        "matchup_risk": round_values(matchup_risk, 3),
+
+        "fatigue_home": f_home,
+        "fatigue_away": f_away,
+
+        "vol_home": v_home,
+        "vol_away": v_away,
+
+        "games_played_home": gp_home,
+        "games_played_away": gp_away,
+        "maturity_ok": maturity_ok,
+    })
 
 
 # --------------------------------------------------
-# Main builder
+# Entrypoint
 # --------------------------------------------------
 
 def main():
-    if not os.path.exists(INPUT_CSV):
+    if not layer_exists("cvv"):
         raise FileNotFoundError("CVV output missing — game environment cannot run.")
 
     if not os.path.exists(FACTS_CSV):
         raise FileNotFoundError("Facts CSV missing — maturity check impossible.")
 
-    df = pd.read_csv(INPUT_CSV)
-    facts = pd.read_csv(FACTS_CSV)
+    df = read_layer("cvv")
+    facts = read_table(FACTS_CSV, columns=["game_id", "game_date", "team_id"])
 
-    df["game_date"] = pd.to_datetime(df["game_date"], utc=True)
-    facts["game_date"] = pd.to_datetime(facts["game_date"], utc=True)
-
-    valid_games = df.groupby("game_id").size()
-    df = df[df["game_id"].isin(valid_games[valid_games == 2].index)].copy()
-
-    rows = []
-
-    for game_id, g in df.groupby("game_id"):
-        home = g[g["home_away"] == "H"].iloc[0]
-        away = g[g["home_away"] == "A"].iloc[0]
-
-        # -----------------------------
-        # Maturity check
-        # -----------------------------
-        gp_home = facts[
-            (facts["team_id"] == home["team_id"])
-            & (facts["game_date"] < home["game_date"])
-        ].shape[0]
-
-        gp_away = facts[
-            (facts["team_id"] == away["team_id"])
-            & (facts["game_date"] < away["game_date"])
-        ].shape[0]
-
-        maturity_ok = gp_home >= MIN_GAMES_FOR_MATURE and gp_away >= MIN_GAMES_FOR_MATURE
-
-        # -----------------------------
-        # Load risk (fatigue)
-        # -----------------------------
-        f_home = norm_fatigue(home["fatigue_index"])
-        f_away = norm_fatigue(away["fatigue_index"])
-        load_risk = safe_avg([f_home, f_away])
-
-        # -----------------------------
-        # Behavior risk (volatility)
-        # -----------------------------
-        v_home = norm_volatility(home.get("pve_volatility"))
-        v_away = norm_volatility(away.get("pve_volatility"))
-        behavior_risk = safe_avg([v_home, v_away])
-
-        # -----------------------------
-        # Matchup risk (asymmetry)
-        # -----------------------------
-        asym_f = norm_asym(home["fatigue_index"] - away["fatigue_index"], 40.0)
-        asym_c = norm_asym(home.get("consistency") - away.get("consistency"), 0.30)
-        matchup_risk = safe_avg([asym_f, asym_c])
-
-        # -----------------------------
-        # Overall environment risk
-        # -----------------------------
-        risk_score = safe_avg([
-            0.45 * load_risk if not pd.isna(load_risk) else np.nan,
-            0.35 * behavior_risk if not pd.isna(behavior_risk) else np.nan,
-            0.20 * matchup_risk if not pd.isna(matchup_risk) else np.nan,
-        ])
-
-        rows.append({
-            "game_id": game_id,
-            "game_date": home["game_date"],
-            "matchup": f"{away['team_name']} @ {home['team_name']}",
-
-            "environment_risk": None if pd.isna(risk_score) else round(risk_score, 3),
-            "environment_label": classify_environment(risk_score, maturity_ok),
-            "drivers": build_drivers(load_risk, behavior_risk, matchup_risk, maturity_ok),
-
-            "load_risk": None if pd.isna(load_risk) else round(load_risk, 3),
-            "behavior_risk": None if pd.isna(behavior_risk) else round(behavior_risk, 3),
-            "matchup_risk": None if pd.isna(matchup_risk) else round(matchup_risk, 3),
-
-            "fatigue_home": home["fatigue_index"],
-            "fatigue_away": away["fatigue_index"],
-
-            "vol_home": home.get("pve_volatility"),
-            "vol_away": away.get("pve_volatility"),
-
-            "games_played_home": gp_home,
-            "games_played_away": gp_away,
-            "maturity_ok": maturity_ok,
-        })
-
-    out = pd.DataFrame(rows).sort_values(["game_date", "game_id"])
+    out = build_game_environment(df, facts)
     out.to_csv(OUTPUT_CSV, index=False)
     print(f"✅ Wrote {len(out)} rows → {OUTPUT_CSV}")
 
@@ -1,79 +1,183 @@
+import numpy as np
 import pandas as pd
+from typing import Optional
 
-from analysis.pve import expected_margin_breakdown_from_rows
+from analysis.layers import layer_path, save_layer
+from analysis.params import DEFAULT_PARAMS, ModelParams
+from analysis.pve import expected_margin_breakdown
+from analysis.storage import read_table
+from analysis.team_history import TeamHistoryIndex
+from analysis.utils import ROW_KEY, fresh_rows, utc_today
 
 INPUT_CSV = "data/derived/team_game_metrics.csv"
-OUTPUT_CSV = "data/derived/team_game_metrics_with_pve.csv"
 
-
-def build_pve(df: pd.DataFrame) -> pd.DataFrame:
+RECENT_ROWS = 30   # shared pre-game slice for both teams (see _form_inputs)
+
+
+# --------------------------------------------------
+# Per-team prefix aggregates
+# --------------------------------------------------
+
+def _form_inputs(history: TeamHistoryIndex, rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pre-game form / win-rate inputs for each row, from prefix sums.
+
+    The historical slice is the last RECENT_ROWS rows of both teams before
+    game day in (team_id, game_date) order, i.e. the higher team_id's
+    games first and the lower team_id's games filling what is left. Each
+    team's share of that slice is a contiguous tail of its own history,
+    so margin sum / valid count / wins are differences of cumulative
+    arrays over the history index.
+    """
+    margin = history.frame["actual_margin"].to_numpy(dtype=np.float64)
+    valid = ~np.isnan(margin) & (margin != 0)
+    cum_valid = np.concatenate([[0], np.cumsum(valid)])
+    cum_margin = np.concatenate([[0.0], np.cumsum(np.where(valid, margin, 0.0))])
+    cum_wins = np.concatenate([[0], np.cumsum(valid & (margin > 0))])
+
+    team = rows["team_id"].to_numpy()
+    opp = rows["opponent_id"].to_numpy()
+    t_start, t_end = history.bounds_many(team, rows["game_date"])
+    o_start, o_end = history.bounds_many(opp, rows["game_date"])
+
+    # Allocate the shared slice: higher team_id first
+    team_high = team > opp
+    n_high = np.where(team_high, t_end - t_start, o_end - o_start)
+    k_high = np.minimum(n_high, RECENT_ROWS)
+    k_low_cap = RECENT_ROWS - k_high
+    t_k = np.where(team_high, k_high, np.minimum(t_end - t_start, k_low_cap))
+    o_k = np.where(team_high, np.minimum(o_end - o_start, k_low_cap), k_high)
+
+    def window(end: np.ndarray, k: np.ndarray):
+        lo = end - k
+        return (
+            cum_valid[end] - cum_valid[lo],
+            cum_margin[end] - cum_margin[lo],
+            cum_wins[end] - cum_wins[lo],
+        )
+
+    t_n, t_sum, t_wins = window(t_end, t_k)
+    o_n, o_sum, o_wins = window(o_end, o_k)
+
+    return pd.DataFrame({
+        "t_n": t_n, "t_sum": t_sum, "t_wins": t_wins,
+        "o_n": o_n, "o_sum": o_sum, "o_wins": o_wins,
+    }, index=rows.index)
+
+
+# Slice aggregates → breakdown inputs. These stay numpy scalars: the
+# breakdown's round() on them is numpy's rounding (shared with the
+# fused engine, see stream_engine.py).
+
+def form_mean(n, total) -> float:
+    return np.float64(total) / n if n else 0.0
+
+
+def form_win_rate(n, wins) -> float:
+    return np.int64(wins) / n if n else 0.5
+
+
+# --------------------------------------------------
+# Core builder
+# --------------------------------------------------
+
+def build_pve(
+    df: pd.DataFrame,
+    since=None,
+    previous: Optional[pd.DataFrame] = None,
+    today=None,
+    params: ModelParams = DEFAULT_PARAMS,
+) -> pd.DataFrame:
+    """
+    With `since` and the previous output, breakdowns of rows before
+    `since` are copied from `previous` (a row's PvE only looks at games
+    before it); only the rest go through the per-row formula.
+
+    Rows on/after `today` (default: the current UTC date) are unplayed.
+    """
     df = df.copy()
 
     # ------------------------------------------------------------------
     # Date handling (timezone-safe)
     # ------------------------------------------------------------------
     df["game_date"] = pd.to_datetime(df["game_date"], utc=True, errors="coerce")
-    today = pd.Timestamp.utcnow().normalize()
+    today = utc_today(today)
 
     # Exclude games today or in the future (not played yet)
     df = df[df["game_date"] < today]
 
     df = df.sort_values(["team_id", "game_date"])
 
-    pve_rows = []
-
     # ------------------------------------------------------------------
-    # Process game-by-game (pairwise)
+    # Rows to score: complete (two-row) games, non-zero margin
     # ------------------------------------------------------------------
-    for game_id, g in df.groupby("game_id"):
-        if len(g) != 2:
-            continue  # broken game
-
-        for _, row in g.iterrows():
-            actual = row["actual_margin"]
-
-            # --------------------------------------------------
-            # Ignore zero-margin rows (API artifacts)
-            # --------------------------------------------------
-            if pd.isna(actual) or actual == 0:
-                continue
+    game_size = df.groupby("game_id")["game_id"].transform("size")
+    scored = df[
+        (game_size == 2)
+        & df["actual_margin"].notna()
+        & (df["actual_margin"] != 0)
+    ]
+    scored = scored.sort_values("game_id", kind="stable")
 
-            recent_games = df[
-                (df["team_id"].isin([row["team_id"], row["opponent_id"]]))
-                & (df["game_date"] < row["game_date"])
-            ].tail(30)
+    if scored.empty:
+        return pd.DataFrame()
 
-            breakdown = expected_margin_breakdown_from_rows(
-                team_id=row["team_id"],
-                opponent_id=row["opponent_id"],
-                is_home=row["home_away"] == "H",
-                recent_games=recent_games,
-                fatigue_index=row["fatigue_index"],
-            )
+    fresh = fresh_rows(scored, previous, since)
+    todo = scored[fresh]
+    inputs = _form_inputs(TeamHistoryIndex(df), todo)
 
-            expected = breakdown["expected_total"]
-            pve = actual - expected
-
-            pve_rows.append({
-                **row.to_dict(),
-                "expected_margin": round(expected, 2),
-                "pve": round(pve, 2),
-                **breakdown,
-            })
-
-    return pd.DataFrame(pve_rows)
+    # ------------------------------------------------------------------
+    # Breakdown per row (O(1) each, shared formula with pve.py)
+    # ------------------------------------------------------------------
+    breakdowns = []
+    for actual, is_home, fatigue, t_n, t_sum, t_wins, o_n, o_sum, o_wins in zip(
+        todo["actual_margin"].tolist(),
+        (todo["home_away"] == "H").tolist(),
+        todo["fatigue_index"].tolist(),
+        *(inputs[c].tolist() for c in inputs.columns),
+    ):
+        breakdown = expected_margin_breakdown(
+            team_form=form_mean(t_n, t_sum),
+            opp_form=form_mean(o_n, o_sum),
+            team_win_rate=form_win_rate(t_n, t_wins),
+            opp_win_rate=form_win_rate(o_n, o_wins),
+            is_home=is_home,
+            fatigue_index=fatigue,
+            params=params,
+        )
+
+        expected = breakdown["expected_total"]
+        breakdowns.append({
+            "expected_margin": round(expected, 2),
+            "pve": round(actual - expected, 2),
+            **breakdown,
+        })
+
+    computed = pd.DataFrame(breakdowns, index=np.flatnonzero(fresh))
+    if not fresh.all():
+        extra = [c for c in previous.columns if c not in scored.columns]
+        settled = previous.set_index(ROW_KEY)[extra].reindex(
+            pd.MultiIndex.from_frame(scored.loc[~fresh, ROW_KEY])
+        )
+        parts = [settled.set_axis(np.flatnonzero(~fresh))]
+        if breakdowns:
+            parts.append(computed[extra])
+        computed = pd.concat(parts).sort_index()
+
+    out = scored.reset_index(drop=True)
+    return pd.concat([out, computed], axis=1)
 
 
 def main():
-    df = pd.read_csv(INPUT_CSV)
+    df = read_table(INPUT_CSV)
 
     out = build_pve(df)
 
     if out.empty:
         raise RuntimeError("PvE produced no rows — pipeline error")
 
-    out.to_csv(OUTPUT_CSV, index=False)
-    print(f"✅ PvE written: {len(out)} rows")
+    save_layer("pve", out)
+    print(f"✅ PvE written: {len(out)} rows → {layer_path('pve')}")
 
 
 if __name__ == "__main__":
@@ -1,16 +1,23 @@
+import json
+import os
 import pandas as pd
 import numpy as np
-import os
+from collections import deque
+from datetime import date
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Dict, Optional
+
+from analysis.layers import RPMI_COLUMNS, layer_exists, layer_path, read_layer, save_layer
+from analysis.params import DEFAULT_PARAMS, ModelParams
+from analysis.shards import map_team_columns
+from analysis.utils import fresh_rows, round_values, splice_columns, with_lookback
 
 # --------------------------------------------------
 # Configuration
 # --------------------------------------------------
 
-SHORT_WINDOW = 3   # short-term momentum (hot streaks)
-LONG_WINDOW = 7    # longer-term form
-
-INPUT_CSV = "data/derived/team_game_metrics_with_pve.csv"
-OUTPUT_CSV = "data/derived/team_game_metrics_with_rpmi.csv"
+SHORT_WINDOW = DEFAULT_PARAMS.short_window   # short-term momentum (hot streaks)
+LONG_WINDOW = DEFAULT_PARAMS.long_window     # longer-term form
 
 
 # --------------------------------------------------
@@ -56,25 +63,102 @@ def weighted_mean(values: np.ndarray) -> float:
     return float(np.dot(values, weights) / weights.sum())
 
 
-def compute_window_rpmi(g: pd.DataFrame, window: int) -> pd.Series:
-    """Compute RPMI over a rolling window."""
-    out = [np.nan] * len(g)
+def momentum_units(actual_margin: np.ndarray, pve: np.ndarray) -> np.ndarray:
+    """Array version of momentum_contribution (same rules, same NaNs)."""
+    m = np.asarray(actual_margin, dtype=np.float64)
+    p = np.asarray(pve, dtype=np.float64)
+
+    out = np.select(
+        [m > 0, p > 0],
+        [1.0 + np.tanh(p / 10.0), -0.3 + np.tanh(p / 20.0)],
+        default=-1.0 + np.tanh(p / 10.0),
+    )
+    out[(m == 0) | np.isnan(m) | np.isnan(p)] = np.nan
+    return out
+
+
+def rolling_weighted_mean(
+    values: np.ndarray,
+    team_pos: np.ndarray,
+    window: int,
+) -> np.ndarray:
+    """
+    Linear-ramp weighted mean over each row's trailing `window` games.
+
+    `values` are laid out team by team (chronological) and `team_pos` is
+    the row's position inside its team. A window must lie inside one team
+    and contain no NaN, otherwise the result is NaN (full window rule).
+    """
+    padded = np.concatenate([np.full(window - 1, np.nan), values])
+    return window_weighted_mean(sliding_window_view(padded, window), team_pos)
+
 
-    for i in range(window - 1, len(g)):
-        window_vals = g.loc[i - window + 1 : i, "momentum_unit"].dropna().values
-        if len(window_vals) < window:
-            continue
+def window_weighted_mean(values_w: np.ndarray, team_pos: np.ndarray) -> np.ndarray:
+    """
+    rolling_weighted_mean from each row's window (oldest first). Terms
+    are accumulated oldest-first, like weighted_mean.
+    """
+    window = values_w.shape[1]
+    acc = np.zeros(len(values_w))
+    for k in range(window):
+        acc = acc + values_w[:, k] * (k + 1)
 
-        out[i] = round(weighted_mean(window_vals), 2)
+    out = acc / np.arange(1, window + 1).sum()
+    out[team_pos < window - 1] = np.nan
 
-    return pd.Series(out, index=g.index)
+    return round_values(out, 2)
 
 
 # --------------------------------------------------
 # Main computation
 # --------------------------------------------------
 
-def compute_rpmi(df: pd.DataFrame) -> pd.DataFrame:
+def rpmi_lookback(params: ModelParams = DEFAULT_PARAMS) -> int:
+    """Prior rows a row's windows (and delta) reach back."""
+    return max(params.long_window, params.short_window + 1)
+
+
+RPMI_LOOKBACK = rpmi_lookback()
+
+
+def rpmi_columns(
+    actual_margin: np.ndarray,
+    pve: np.ndarray,
+    team_pos: np.ndarray,
+    params: ModelParams = DEFAULT_PARAMS,
+) -> dict:
+    """RPMI columns for rows laid out team by team (chronological)."""
+    units = momentum_units(actual_margin, pve)
+
+    rpmi_s = rolling_weighted_mean(units, team_pos, params.short_window)
+    rpmi_l = rolling_weighted_mean(units, team_pos, params.long_window)
+
+    # Game-to-game momentum change (short window)
+    prev = np.concatenate([[np.nan], rpmi_s[:-1]])
+    prev[team_pos == 0] = np.nan
+
+    return {
+        "momentum_unit": units,
+        "rpmi_short": rpmi_s,
+        "rpmi_long": rpmi_l,
+        "rpmi_accel": rpmi_s - rpmi_l,
+        "rpmi_delta": np.round(rpmi_s - prev, 2),
+    }
+
+
+def compute_rpmi(
+    df: pd.DataFrame,
+    since=None,
+    previous: Optional[pd.DataFrame] = None,
+    params: ModelParams = DEFAULT_PARAMS,
+    workers: int = 1,
+) -> pd.DataFrame:
+    """
+    With `since` and the previous output, only rows on/after `since`
+    (plus rpmi_lookback(params) rows of context per team) are recomputed; the
+    rest are copied from `previous`. `workers` > 1 scores team shards
+    on a process pool (see analysis/shards.py).
+    """
     df = df.copy()
     df["game_date"] = pd.to_datetime(df["game_date"], errors="coerce")
     df = df.sort_values(["team_id", "game_date"])
@@ -82,42 +166,244 @@ def compute_rpmi(df: pd.DataFrame) -> pd.DataFrame:
     # --------------------------------------------------
     # Exclusions
     # --------------------------------------------------
-    df = df[df["actual_margin"] != 0]
+    df = df[df["actual_margin"] != 0].copy()
 
     # --------------------------------------------------
-    # Per-game momentum unit
+    # Rolling windows, all teams in one pass
     # --------------------------------------------------
-    df["momentum_unit"] = df.apply(
-        lambda r: momentum_contribution(r["actual_margin"], r["pve"]),
-        axis=1,
+    team_pos = df.groupby("team_id").cumcount().to_numpy()
+    fresh = fresh_rows(df, previous, since)
+    rows = with_lookback(team_pos, fresh, rpmi_lookback(params))
+
+    computed = map_team_columns(
+        rpmi_columns,
+        (
+            df["actual_margin"].to_numpy(dtype=np.float64)[rows],
+            df["pve"].to_numpy(dtype=np.float64)[rows],
+            team_pos[rows],
+        ),
+        df["team_id"].to_numpy()[rows],
+        params,
+        workers=workers,
     )
+    return splice_columns(df, computed, rows, fresh, previous)
 
-    df["rpmi_short"] = np.nan
-    df["rpmi_long"] = np.nan
-    df["rpmi_accel"] = np.nan
-    df["rpmi_delta"] = np.nan
 
-    # --------------------------------------------------
-    # Rolling windows per team
-    # --------------------------------------------------
-    for team_id, g in df.groupby("team_id"):
-        g = g.reset_index()
-
-        rpmi_s = compute_window_rpmi(g, SHORT_WINDOW)
-        rpmi_l = compute_window_rpmi(g, LONG_WINDOW)
+# --------------------------------------------------
+# Streaming state (one game at a time)
+# --------------------------------------------------
+# compute_rpmi rebuilds windows from the layer. RpmiState carries what a
+# team's next row needs instead (its last momentum units, row count and
+# last rpmi_short), so a new game is scored without reading history.
+# Windows are re-accumulated oldest-first from the ring (at most
+# LONG_WINDOW terms), the float operations of window_weighted_mean:
+# streamed rows equal the layer's. Running sums would drift from it and
+# could flip the 2-decimal rounding.
+
+RPMI_STATE_JSON = "data/derived/rpmi_state.json"
+
+
+class RpmiState:
+    """One team's RPMI state after its latest game."""
+
+    __slots__ = ("short_window", "long_window", "units", "played", "last_short")
+
+    def __init__(self, params: ModelParams = DEFAULT_PARAMS):
+        self.short_window = params.short_window
+        self.long_window = params.long_window
+        self.units = deque(maxlen=max(params.short_window, params.long_window))
+        self.played = 0              # RPMI rows so far (team_pos of the next)
+        self.last_short = np.nan
+
+    def _window_mean(self, window: int) -> float:
+        # Full window rule: NaN until `window` rows, NaN units propagate
+        if self.played < window:
+            return np.nan
+        acc = 0.0
+        for k, unit in enumerate(list(self.units)[-window:]):
+            acc = acc + unit * (k + 1)
+        return round(acc / (window * (window + 1) // 2), 2)
+
+    def update(self, actual_margin: float, pve: float) -> Optional[Dict[str, float]]:
+        """
+        Add one game and return its RPMI columns. Zero-margin games have
+        no RPMI row (see compute_rpmi): None, and the state is unchanged.
+        """
+        if actual_margin == 0:
+            return None
+
+        unit = float(momentum_units([actual_margin], [pve])[0])
+        self.units.append(unit)
+        self.played += 1
+
+        short = self._window_mean(self.short_window)
+        long = self._window_mean(self.long_window)
+        delta = float(np.round(short - self.last_short, 2))
+        self.last_short = short
+
+        return {
+            "momentum_unit": unit,
+            "rpmi_short": short,
+            "rpmi_long": long,
+            "rpmi_accel": short - long,
+            "rpmi_delta": delta,
+        }
+
+
+def rpmi_state(rpmi: pd.DataFrame, params: ModelParams = DEFAULT_PARAMS) -> Dict:
+    """
+    Checkpoint {"through_date", "params", "teams": {team_id: RpmiState}}
+    from an RPMI frame (compute_rpmi output: zero-margin rows dropped).
+    """
+    df = rpmi.sort_values(["team_id", "game_date"], kind="stable")
+    teams = {}
+    for team_id, g in df.groupby("team_id", sort=False):
+        st = RpmiState(params)
+        st.units.extend(g["momentum_unit"].to_numpy(dtype=np.float64).tolist())
+        st.played = len(g)
+        st.last_short = float(g["rpmi_short"].iloc[-1])
+        teams[team_id] = st
+
+    through = pd.to_datetime(df["game_date"]).max()
+    return {
+        "through_date": through.date() if pd.notna(through) else None,
+        "params": params,
+        "teams": teams,
+    }
+
+
+def stream_rpmi(rows: pd.DataFrame, state: Dict) -> pd.DataFrame:
+    """
+    Score games after the checkpoint (actual_margin / pve per team-game)
+    by updating `state` in place; returns the rows that get an RPMI row.
 
-        df.loc[g["index"], "rpmi_short"] = rpmi_s
-        df.loc[g["index"], "rpmi_long"] = rpmi_l
-        df.loc[g["index"], "rpmi_accel"] = rpmi_s - rpmi_l
+    Rows on/before the checkpoint's through_date are already in it:
+    feeding them again would count them twice, so they raise.
+    """
+    teams = state["teams"]
+    rows = rows.sort_values(["game_date", "game_id"], kind="stable")
+
+    through = state.get("through_date")
+    if through is not None and not rows.empty:
+        stale = pd.to_datetime(rows["game_date"]).dt.date <= through
+        if stale.any():
+            raise ValueError(
+                f"{int(stale.sum())} rows on/before the RPMI checkpoint ({through}) — "
+                "rebuild the state with rpmi_state() instead"
+            )
+
+    kept, computed = [], []
+    for i, (team_id, margin, pve) in enumerate(zip(
+        rows["team_id"].tolist(),
+        rows["actual_margin"].tolist(),
+        rows["pve"].tolist(),
+    )):
+        st = teams.get(team_id)
+        if st is None:
+            st = teams[team_id] = RpmiState(state["params"])
+        columns = st.update(margin, pve)
+        if columns is not None:
+            kept.append(i)
+            computed.append(columns)
+
+    out = rows.iloc[kept].reset_index(drop=True)
+    if not rows.empty:
+        through = pd.to_datetime(rows["game_date"]).max().date()
+        if state.get("through_date") is None or through > state["through_date"]:
+            state["through_date"] = through
+    return pd.concat([out, pd.DataFrame(computed, columns=RPMI_COLUMNS)], axis=1)
+
+
+def checkpoint_rpmi(
+    rpmi: pd.DataFrame,
+    since=None,
+    params: ModelParams = DEFAULT_PARAMS,
+    path: str = RPMI_STATE_JSON,
+) -> Dict:
+    """
+    Bring the saved checkpoint up to `rpmi` (the layer just built) and
+    save it. When `since` is after the checkpoint's through_date, rows up
+    to it are unchanged and only newer rows are streamed in; otherwise,
+    or if the advanced state disagrees with the layer, it is re-seeded
+    from `rpmi`.
+    """
+    state = load_rpmi_state(path) if since is not None else None
+    usable = (
+        state is not None
+        and state["through_date"] is not None
+        and (state["params"].short_window, state["params"].long_window)
+        == (params.short_window, params.long_window)
+        and pd.Timestamp(since).date() > state["through_date"]
+    )
+    if usable:
+        newer = pd.to_datetime(rpmi["game_date"]).dt.date > state["through_date"]
+        stream_rpmi(rpmi[newer], state)
+        usable = _state_matches(state, rpmi)
+    if not usable:
+        state = rpmi_state(rpmi, params)
+
+    save_rpmi_state(state, path)
+    return state
+
+
+def _state_matches(state: Dict, rpmi: pd.DataFrame) -> bool:
+    """Each team's row count and last rpmi_short agree with the layer."""
+    df = rpmi.sort_values(["team_id", "game_date"], kind="stable")
+    played = df.groupby("team_id").size()
+    last_short = df.groupby("team_id").tail(1).set_index("team_id")["rpmi_short"]
+    if set(played.index) != set(state["teams"]):
+        return False
+    return all(
+        st.played == played[team_id]
+        and np.array_equal(st.last_short, last_short[team_id], equal_nan=True)
+        for team_id, st in state["teams"].items()
+    )
 
-        # Game-to-game momentum change (short window)
-        for i in range(1, len(g)):
-            prev = rpmi_s.iloc[i - 1]
-            curr = rpmi_s.iloc[i]
-            if not pd.isna(prev) and not pd.isna(curr):
-                df.loc[g.loc[i, "index"], "rpmi_delta"] = round(curr - prev, 2)
 
-    return df
+def save_rpmi_state(state: Dict, path: str = RPMI_STATE_JSON) -> None:
+    payload = {
+        "through_date": state["through_date"].isoformat() if state["through_date"] else None,
+        "short_window": state["params"].short_window,
+        "long_window": state["params"].long_window,
+        "teams": {
+            str(team_id): {
+                "units": list(st.units),
+                "played": st.played,
+                "last_short": st.last_short,
+            }
+            for team_id, st in state["teams"].items()
+        },
+    }
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(payload, f, indent=2)   # NaN units / rpmi_short round-trip as NaN
+    os.replace(tmp, path)
+
+
+def load_rpmi_state(path: str = RPMI_STATE_JSON) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "r") as f:
+        payload = json.load(f)
+
+    params = DEFAULT_PARAMS._replace(
+        short_window=payload["short_window"], long_window=payload["long_window"]
+    )
+    teams = {}
+    for team_id, t in payload["teams"].items():
+        st = RpmiState(params)
+        st.units.extend(t["units"])
+        st.played = t["played"]
+        st.last_short = t["last_short"]
+        teams[int(team_id)] = st
+
+    through = payload["through_date"]
+    return {
+        "through_date": date.fromisoformat(through) if through else None,
+        "params": params,
+        "teams": teams,
+    }
 
 
 # --------------------------------------------------
@@ -125,22 +411,24 @@ def compute_rpmi(df: pd.DataFrame) -> pd.DataFrame:
 # --------------------------------------------------
 
 def main():
-    if not os.path.exists(INPUT_CSV):
+    if not layer_exists("pve"):
         raise FileNotFoundError("PvE output missing — RPMI cannot run.")
 
-    df = pd.read_csv(INPUT_CSV)
+    df = read_layer("pve")
     if df.empty:
         raise RuntimeError("RPMI input is empty — PvE must run successfully first.")
 
     out = compute_rpmi(df)
-    out.to_csv(OUTPUT_CSV, index=False)
+    save_layer("rpmi", out)
+    checkpoint_rpmi(out)
 
     print(
-        f"✅ Built dual-window RPMI → {OUTPUT_CSV}\n"
+        f"✅ Built dual-window RPMI → {layer_path('rpmi')}\n"
         f"   rpmi_short = {SHORT_WINDOW}-game window\n"
         f"   rpmi_long  = {LONG_WINDOW}-game window\n"
         f"   rpmi_accel = rpmi_short - rpmi_long\n"
-        f"   logic: win-first, PvE-modulated, no volatility penalty"
+        f"   logic: win-first, PvE-modulated, no volatility penalty\n"
+        f"   state      → {RPMI_STATE_JSON}"
     )
 
 
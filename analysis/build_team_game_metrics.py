@@ -1,9 +1,37 @@
+import glob
+import json
+import os
+import numpy as np
 import pandas as pd
 from datetime import date, timedelta
-from typing import Optional
-
-from analysis.fli import fatigue_components_from_row
-from analysis.utils import travel_miles
+from typing import Dict, List, Optional
+
+from analysis.fli import fatigue_components_batch
+from analysis.params import DEFAULT_PARAMS, ModelParams
+from analysis.pipeline_dag import code_digest
+from analysis.shards import run_shards, team_frame_shards
+from analysis.storage import read_table, read_tables, write_table
+from analysis.utils import (
+    ARENA_INDEX,
+    ROW_KEY,
+    TEAM_CITY,
+    UNKNOWN_ARENA,
+    team_arena_registry,
+    travel_miles_batch,
+)
+
+FACTS_CSV = "data/core/team_game_facts.csv"
+SEASONS_DIR = "data/core/seasons"          # earlier seasons (backfill_games)
+OUTPUT_CSV = "data/derived/team_game_metrics.csv"
+STATE_JSON = "data/derived/team_game_metrics_state.json"
+
+STATE_WINDOW_DAYS = 14   # longest density window (games_last_14)
+
+# Modules whose source decides the metrics rows: a checkpoint written
+# by other code (or other ModelParams defaults) is discarded
+STATE_CODE = (
+    "analysis.build_team_game_metrics", "analysis.fli", "analysis.params", "analysis.utils",
+)
 
 
 # --------------------------------------------------
@@ -11,63 +39,95 @@ from analysis.utils import travel_miles
 # --------------------------------------------------
 
 def extract_city(team_name: str) -> str:
-    CITY_MAP = {
-        "Atlanta Hawks": "Atlanta",
-        "Boston Celtics": "Boston",
-        "Brooklyn Nets": "Brooklyn",
-        "Charlotte Hornets": "Charlotte",
-        "Chicago Bulls": "Chicago",
-        "Cleveland Cavaliers": "Cleveland",
-        "Dallas Mavericks": "Dallas",
-        "Denver Nuggets": "Denver",
-        "Detroit Pistons": "Detroit",
-        "Golden State Warriors": "San Francisco",
-        "Houston Rockets": "Houston",
-        "Indiana Pacers": "Indianapolis",
-        "LA Clippers": "Los Angeles",
-        "Los Angeles Lakers": "Los Angeles",
-        "Memphis Grizzlies": "Memphis",
-        "Miami Heat": "Miami",
-        "Milwaukee Bucks": "Milwaukee",
-        "Minnesota Timberwolves": "Minneapolis",
-        "New Orleans Pelicans": "New Orleans",
-        "New York Knicks": "New York",
-        "Oklahoma City Thunder": "Oklahoma City",
-        "Orlando Magic": "Orlando",
-        "Philadelphia 76ers": "Philadelphia",
-        "Phoenix Suns": "Phoenix",
-        "Portland Trail Blazers": "Portland",
-        "Sacramento Kings": "Sacramento",
-        "San Antonio Spurs": "San Antonio",
-        "Toronto Raptors": "Toronto",
-        "Utah Jazz": "Salt Lake City",
-        "Washington Wizards": "Washington",
-    }
-
-    return CITY_MAP[team_name]
+    return TEAM_CITY[team_name]
 
 
 # --------------------------------------------------
 # Load team-level game facts
 # --------------------------------------------------
 
-def load_team_games(path: str) -> pd.DataFrame:
-    df = pd.read_csv(path)
-    df["game_date"] = pd.to_datetime(
-        df["game_date"], utc=True, errors="coerce", format="mixed"
-    ).dt.date
-    return df
+def season_tables(seasons_dir: str = SEASONS_DIR) -> List[str]:
+    """Backfilled season partitions, oldest season first."""
+    return sorted(glob.glob(os.path.join(seasons_dir, "team_game_facts_*.csv")))
+
+
+def load_team_games(path: str, seasons_dir: Optional[str] = None) -> pd.DataFrame:
+    """
+    Fact rows of `path`; with `seasons_dir`, the backfilled seasons in it
+    come first, so team histories run on from earlier seasons.
+    """
+    # Typed Parquet copy when present (dates, ids, names already decoded);
+    # refreshed here after the ingest appended to the CSV
+    tables = season_tables(seasons_dir) if seasons_dir else []
+    if not tables:
+        return read_table(path, refresh=True)
+    return read_tables(tables + [path], refresh=True)
+
+
+# --------------------------------------------------
+# Vectorized team-date helpers
+# --------------------------------------------------
+
+def _day_numbers(dates: pd.Series) -> np.ndarray:
+    """Calendar dates → int64 day numbers (NaT → -1 sentinel, masked by caller)."""
+    days = pd.to_datetime(dates, errors="coerce").to_numpy(dtype="datetime64[D]")
+    out = days.astype("int64")
+    out[np.isnat(days)] = -1
+    return out
+
+
+def _window_counts(
+    team_codes: np.ndarray,
+    days: np.ndarray,
+    query_codes: np.ndarray,
+    query_days: np.ndarray,
+    window_days: int,
+) -> np.ndarray:
+    """
+    Number of games per query team in [day - window_days, day).
+
+    All games are packed into one sorted (team, day) key array, so each
+    window count is two binary searches instead of a frame scan.
+    """
+    stride = np.int64(1 << 32)
+    keys = np.sort(team_codes * stride + days)
+    hi = np.searchsorted(keys, query_codes * stride + query_days, side="left")
+    lo = np.searchsorted(
+        keys, query_codes * stride + query_days - window_days, side="left"
+    )
+    return hi - lo
+
+
+def _emit_order(days: np.ndarray, start_date, end_date) -> np.ndarray:
+    """Rows emitted for [start_date, end_date]: calendar order, same-day rows in input order."""
+    start_day = _day_numbers(pd.Series([start_date]))[0]
+    end_day = _day_numbers(pd.Series([end_date]))[0]
+
+    in_range = (days >= 0) & (days >= start_day) & (days <= end_day)
+    order = np.flatnonzero(in_range)
+    return order[np.argsort(days[order], kind="stable")]
 
 
 # --------------------------------------------------
-# Core builder (FIXED)
+# Core builder (vectorized)
 # --------------------------------------------------
 
 def build_team_game_metrics(
     games: pd.DataFrame,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
+    state: Optional[Dict] = None,
+    params: ModelParams = DEFAULT_PARAMS,
+    workers: int = 1,
 ) -> pd.DataFrame:
+    """
+    Build FLI rows for games in [start_date, end_date].
+
+    `state` (see roll_team_state) seeds each team's last city, last game
+    date and trailing game dates, so only games newer than the checkpoint
+    need to be passed in. `workers` > 1 builds team shards on a process
+    pool (see analysis/shards.py).
+    """
 
     if games.empty:
         raise RuntimeError("No team game facts provided.")
@@ -77,112 +137,344 @@ def build_team_game_metrics(
     if end_date is None:
         end_date = games["game_date"].max()
 
-    rows = []
-    current = start_date
+    if workers > 1:
+        return _build_sharded(games, start_date, end_date, state, params, workers)
+
+    days = _day_numbers(games["game_date"])
+    dated = days >= 0
+    team_codes, teams = pd.factorize(games["team_id"])
+    team_codes = team_codes.astype("int64")
+
+    # Checkpointed trailing dates count towards the density windows
+    window_codes = team_codes[dated]
+    window_days = days[dated]
+    if state:
+        seed = [
+            (team_id, d)
+            for team_id, t in state["teams"].items()
+            for d in t["recent_dates"]
+        ]
+        if seed:
+            seed_ids, seed_dates = zip(*seed)
+            seed_codes = teams.get_indexer(list(seed_ids)).astype("int64")
+            known = seed_codes >= 0
+            window_codes = np.concatenate([window_codes, seed_codes[known]])
+            window_days = np.concatenate([
+                window_days, _day_numbers(pd.Series(seed_dates))[known]
+            ])
+
+    order = _emit_order(days, start_date, end_date)
+
+    g = games.iloc[order].reset_index(drop=True)
+    g_days = days[order]
+    g_codes = team_codes[order]
+
+    if g.empty:
+        raise RuntimeError("team_game_metrics produced no rows.")
 
-    # ✅ Per-team rolling state
-    last_city_by_team = {}
-    last_game_date_by_team = {}
+    # -----------------------------
+    # Recent game counts (strictly before game day)
+    # -----------------------------
+    games_last_7 = _window_counts(
+        window_codes, window_days, g_codes, g_days, 7
+    )
+    games_last_14 = _window_counts(
+        window_codes, window_days, g_codes, g_days, 14
+    )
+
+    # -----------------------------
+    # Days since last game (within processed range)
+    # -----------------------------
+    by_team = pd.Series(g_days).groupby(g_codes, sort=False)
+    prev_day = by_team.shift(1)
+    if state:
+        seed_last_day = g["team_id"].map({
+            team_id: t["last_game_date"] for team_id, t in state["teams"].items()
+        })
+        prev_day = prev_day.fillna(pd.Series(_day_numbers(seed_last_day)).where(
+            seed_last_day.notna()
+        ))
+    days_since_last_game = (
+        (g_days - prev_day).fillna(5).astype("int64")  # season opener fallback
+    )
+
+    # -----------------------------
+    # City continuity (arena registry)
+    # -----------------------------
+    is_home = g["home_away"].to_numpy() == "H"
+    host_name = np.where(
+        is_home, g["team_name"].to_numpy(), g["opponent_name"].to_numpy()
+    )
+    host_id = np.where(
+        is_home, g["team_id"].to_numpy(), g["opponent_id"].to_numpy()
+    )
+    city_by_name = {name: extract_city(name) for name in pd.unique(host_name)}
+    current_city = pd.Series(host_name).map(city_by_name)
+
+    registry = team_arena_registry(
+        np.concatenate([g["team_id"].to_numpy(), g["opponent_id"].to_numpy()]),
+        np.concatenate([g["team_name"].to_numpy(), g["opponent_name"].to_numpy()]),
+    )
+    current_arena = pd.Series(host_id).map(registry)
+
+    previous_city = current_city.groupby(g_codes, sort=False).shift(1)
+    previous_arena = current_arena.groupby(g_codes, sort=False).shift(1)
+    if state:
+        seed_city = g["team_id"].map({
+            team_id: t["last_city"] for team_id, t in state["teams"].items()
+        })
+        previous_city = previous_city.fillna(seed_city)
+        previous_arena = previous_arena.fillna(seed_city.map(ARENA_INDEX))
+    previous_city = previous_city.astype(object).where(previous_city.notna(), None)
+
+    travel = travel_miles_batch(
+        previous_arena.fillna(UNKNOWN_ARENA).to_numpy(dtype=np.int64),
+        current_arena.to_numpy(dtype=np.int64),
+    )
+
+    fatigue = pd.DataFrame(fatigue_components_batch(
+        games_last_7=games_last_7,
+        games_last_14=games_last_14,
+        days_since_last_game=days_since_last_game,
+        travel_miles=travel,
+        params=params,
+    ))
+
+    df = pd.DataFrame({
+        "game_id": g["game_id"],
+        "game_date": pd.to_datetime(g_days.astype("datetime64[D]")).date,
+        "team_id": g["team_id"],
+        "team_name": g["team_name"],
+        "opponent_id": g["opponent_id"],
+        "opponent_name": g["opponent_name"],
+        "home_away": g["home_away"],
+        "actual_margin": g["team_points"] - g["opponent_points"],
+        "current_city": current_city,
+        "previous_city": previous_city,
+    })
+
+    return pd.concat([df, fatigue], axis=1)
+
+
+def _build_sharded(games, start_date, end_date, state, params, workers) -> pd.DataFrame:
+    """build_team_game_metrics over shards of whole teams, merged back in emit order."""
+    order = _emit_order(_day_numbers(games["game_date"]), start_date, end_date)
+    if len(order) == 0:
+        raise RuntimeError("team_game_metrics produced no rows.")
 
-    while current <= end_date:
-        games_today = games[games["game_date"] == current]
+    # Teams with no row in range emit nothing: leave them out
+    active = np.flatnonzero(games["team_id"].isin(games["team_id"].iloc[order]).to_numpy())
+    shards = [active[s] for s in team_frame_shards(games.iloc[active])]
 
-        if games_today.empty:
-            current += timedelta(days=1)
-            continue
+    tasks = ((games.iloc[s], start_date, end_date, state, params) for s in shards)
+    parts = list(run_shards(build_team_game_metrics, tasks, workers))
 
-        recent_14 = games[
-            (games["game_date"] < current)
-            & (games["game_date"] >= current - timedelta(days=14))
-        ]
+    # Each shard emits its rows in the global emit order, restricted to
+    # its teams: pick the next row of the owning shard for every row
+    owner = np.empty(len(games), dtype=np.int64)
+    for k, s in enumerate(shards):
+        owner[s] = k
+    owner = owner[order]
+    offsets = np.cumsum([0] + [len(p) for p in parts])[:-1]
+    rank = pd.Series(owner).groupby(owner).cumcount().to_numpy()
 
-        recent_7 = games[
-            (games["game_date"] < current)
-            & (games["game_date"] >= current - timedelta(days=7))
-        ]
+    out = pd.concat(parts, ignore_index=True)
+    return out.iloc[offsets[owner] + rank].reset_index(drop=True)
 
-        for _, g in games_today.iterrows():
-            team_id = g["team_id"]
-            team_name = g["team_name"]
-            opp_id = g["opponent_id"]
-            opp_name = g["opponent_name"]
-
-            actual_margin = g["team_points"] - g["opponent_points"]
-
-            # -----------------------------
-            # Recent game counts
-            # -----------------------------
-            games_last_7 = (recent_7["team_id"] == team_id).sum()
-            games_last_14 = (recent_14["team_id"] == team_id).sum()
-
-            # -----------------------------
-            # Days since last game
-            # -----------------------------
-            if team_id in last_game_date_by_team:
-                days_since_last_game = (current - last_game_date_by_team[team_id]).days
-            else:
-                days_since_last_game = 5  # season opener fallback
-
-            # -----------------------------
-            # City continuity (FIX)
-            # -----------------------------
-            previous_city = last_city_by_team.get(team_id)
-
-            if g["home_away"] == "H":
-                current_city = extract_city(team_name)
-            else:
-                current_city = extract_city(opp_name)
-
-            travel = (
-                travel_miles(previous_city, current_city)
-                if previous_city and current_city
-                else None
-            )
-
-            fatigue = fatigue_components_from_row(
-                games_last_7=games_last_7,
-                games_last_14=games_last_14,
-                days_since_last_game=days_since_last_game,
-                travel_miles=travel,
-            )
-
-            rows.append({
-                "game_id": g["game_id"],
-                "game_date": current,
-                "team_id": team_id,
-                "team_name": team_name,
-                "opponent_id": opp_id,
-                "opponent_name": opp_name,
-                "home_away": g["home_away"],
-                "actual_margin": actual_margin,
-                "current_city": current_city,
-                "previous_city": previous_city,
-                **fatigue,
-            })
-
-            # ✅ update rolling state
-            last_city_by_team[team_id] = current_city
-            last_game_date_by_team[team_id] = current
-
-        current += timedelta(days=1)
-
-    df = pd.DataFrame(rows)
-
-    if df.empty:
-        raise RuntimeError("team_game_metrics produced no rows.")
 
-    return df
+# --------------------------------------------------
+# Per-team rolling state (checkpoint)
+# --------------------------------------------------
+
+def roll_team_state(state: Optional[Dict], metrics: pd.DataFrame) -> Dict:
+    """
+    Advance the per-team checkpoint past the given metrics rows.
+
+    Keeps exactly what the builder needs to continue: last city, last
+    game date and the trailing STATE_WINDOW_DAYS of game dates per team.
+    """
+    teams = {k: dict(v) for k, v in state["teams"].items()} if state else {}
+    through = metrics["game_date"].max()
+    if state and state["through_date"] > through:
+        through = state["through_date"]
+
+    for team_id, t in metrics.groupby("team_id", sort=False):
+        prev = teams.get(team_id, {})
+        last = t.iloc[-1]
+        teams[team_id] = {
+            "last_game_date": last["game_date"],
+            "last_city": last["current_city"],
+            "recent_dates": list(prev.get("recent_dates", [])) + list(t["game_date"]),
+        }
+
+    cutoff = through - timedelta(days=STATE_WINDOW_DAYS - 1)
+    for t in teams.values():
+        t["recent_dates"] = [d for d in t["recent_dates"] if d >= cutoff]
+
+    return {"through_date": through, "teams": teams}
+
+
+def facts_digest(games: pd.DataFrame, through_date: date) -> str:
+    """Order-independent content hash of fact rows on/before through_date."""
+    days = _day_numbers(games["game_date"])
+    through_day = _day_numbers(pd.Series([through_date]))[0]
+    settled = games[(days >= 0) & (days <= through_day)]
+    row_hashes = pd.util.hash_pandas_object(settled, index=False).to_numpy()
+    return str(int(row_hashes.sum(dtype="uint64")))
+
+
+def save_team_state(state: Dict, path: str = STATE_JSON) -> None:
+    payload = {
+        "through_date": state["through_date"].isoformat(),
+        "facts_digest": state["facts_digest"],
+        "code": state["code"],
+        "teams": {
+            str(team_id): {
+                "last_game_date": t["last_game_date"].isoformat(),
+                "last_city": t["last_city"],
+                "recent_dates": [d.isoformat() for d in t["recent_dates"]],
+            }
+            for team_id, t in state["teams"].items()
+        },
+    }
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp, path)
+
+
+def load_team_state(path: str = STATE_JSON) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "r") as f:
+        payload = json.load(f)
+
+    return {
+        "through_date": date.fromisoformat(payload["through_date"]),
+        "facts_digest": payload["facts_digest"],
+        "code": payload.get("code"),
+        "teams": {
+            int(team_id): {
+                "last_game_date": date.fromisoformat(t["last_game_date"]),
+                "last_city": t["last_city"],
+                "recent_dates": [date.fromisoformat(d) for d in t["recent_dates"]],
+            }
+            for team_id, t in payload["teams"].items()
+        },
+    }
 
 
 # --------------------------------------------------
 # Entrypoint
 # --------------------------------------------------
 
-def main():
-    games = load_team_games("data/core/team_game_facts.csv")
-    df = build_team_game_metrics(games)
-    df.to_csv("data/derived/team_game_metrics.csv", index=False)
+def checkpoint_team_state(state: Dict, games: pd.DataFrame) -> None:
+    """Stamp the state with the facts and code it was built from, and save it."""
+    state["facts_digest"] = facts_digest(games, state["through_date"])
+    state["code"] = code_digest(STATE_CODE)
+    save_team_state(state)
+
+
+def load_team_game_metrics(path: str = OUTPUT_CSV) -> pd.DataFrame:
+    return read_table(path)
+
+
+def rebuild_team_game_metrics_since(
+    games: pd.DataFrame,
+    since: date,
+    existing: pd.DataFrame,
+    workers: int = 1,
+) -> pd.DataFrame:
+    """
+    Keep metrics rows before `since`, rebuild the rest from `games`.
+
+    Fact rows missing from `existing` (and existing rows no longer in
+    the facts) count as changed too: `since` moves back to the earliest
+    of them. The state seeded from the kept rows is exactly the
+    checkpoint a full build would have reached the day before `since`.
+    """
+    since_day = _day_numbers(pd.Series([since]))[0]
+
+    facts_key = pd.MultiIndex.from_frame(games[ROW_KEY])
+    existing_key = pd.MultiIndex.from_frame(existing[ROW_KEY])
+    unbuilt = np.concatenate([
+        _day_numbers(games["game_date"])[~facts_key.isin(existing_key)],
+        _day_numbers(existing["game_date"])[~existing_key.isin(facts_key)],
+    ])
+    if len(unbuilt):
+        since_day = min(since_day, unbuilt.min())
+    keep = existing[_day_numbers(existing["game_date"]) < since_day]
+    seed = roll_team_state(None, keep) if not keep.empty else None
+
+    tail_games = games[_day_numbers(games["game_date"]) >= since_day]
+    if tail_games.empty:
+        return keep.reset_index(drop=True)
+
+    df = build_team_game_metrics(tail_games, state=seed, workers=workers)
+    return pd.concat([keep, df], ignore_index=True)
+
+
+def update_team_game_metrics(
+    games: pd.DataFrame,
+    full_rebuild: bool = False,
+    since: Optional[date] = None,
+    existing: Optional[pd.DataFrame] = None,
+    workers: int = 1,
+) -> pd.DataFrame:
+    """
+    Bring team_game_metrics.csv up to date with `games` and return the
+    full table. This layer is always written: the checkpoint refers to it.
+
+    `since` (earliest changed fact date, from ingest) rebuilds only rows
+    on/after it, even when facts before the checkpoint changed.
+    """
+    if since is not None and not full_rebuild and os.path.exists(OUTPUT_CSV):
+        if existing is None:
+            existing = load_team_game_metrics()
+
+        df = rebuild_team_game_metrics_since(games, since, existing, workers)
+        write_table(df, OUTPUT_CSV)
+        checkpoint_team_state(roll_team_state(None, df), games)
+        print(f"✅ Rebuilt team_game_metrics.csv from {since} ({len(df)} rows)")
+        return df
+
+    state = None if full_rebuild else load_team_state()
+    if state is not None and state["code"] != code_digest(STATE_CODE):
+        print("↺ Metrics code changed since checkpoint — full FLI rebuild")
+        state = None
+
+    if state is not None and os.path.exists(OUTPUT_CSV):
+        # Facts at/before the checkpoint changed (late or corrected rows):
+        # the written rows and seeded state are no longer trustworthy.
+        if facts_digest(games, state["through_date"]) == state["facts_digest"]:
+            existing = load_team_game_metrics()
+
+            days = _day_numbers(games["game_date"])
+            through_day = _day_numbers(pd.Series([state["through_date"]]))[0]
+            new_games = games[days > through_day]
+            if new_games.empty:
+                print("✅ team_game_metrics.csv already up to date")
+                return existing
+
+            df = build_team_game_metrics(new_games, state=state, workers=workers)
+            out = pd.concat([existing, df], ignore_index=True)
+            write_table(out, OUTPUT_CSV)
+            checkpoint_team_state(roll_team_state(state, df), games)
+            print(f"✅ Appended {len(df)} rows → team_game_metrics.csv")
+            return out
+
+        print("↺ Facts changed before checkpoint — full FLI rebuild")
+
+    df = build_team_game_metrics(games, workers=workers)
+    write_table(df, OUTPUT_CSV)
+    checkpoint_team_state(roll_team_state(None, df), games)
     print(f"✅ Wrote {len(df)} rows → team_game_metrics.csv")
+    return df
+
+
+def main(full_rebuild: bool = False):
+    update_team_game_metrics(load_team_games(FACTS_CSV), full_rebuild)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,8 @@
 import os
-import requests
 import pandas as pd
 from datetime import datetime, date
 
-API_URL = "https://api.balldontlie.io/v1/games"
+from scripts.ingest.data_provider import api_get
 
 
 def fetch_today_games(run_date: date) -> pd.DataFrame:
@@ -17,15 +16,9 @@ def fetch_today_games(run_date: date) -> pd.DataFrame:
         "per_page": 100,
     }
 
-    # BallDontLie v1 auth (NO Bearer)
-    headers = {
-        "Authorization": api_key
-    }
-
     try:
-        r = requests.get(API_URL, params=params, headers=headers, timeout=30)
-        r.raise_for_status()
-        games = r.json().get("data", [])
+        # Shared session + rate limiter + backoff (auth header included)
+        games = api_get(params).json().get("data", [])
     except Exception:
         return pd.DataFrame()
 
@@ -2,8 +2,13 @@
 from __future__ import annotations
 
 import math
+from functools import lru_cache
 from typing import Any, Dict, Optional
 
+import numpy as np
+
+from analysis.params import DEFAULT_PARAMS, ModelParams
+
 
 # --------------------------------------------------
 # Internal helpers
@@ -105,7 +110,8 @@ def travel_load(travel_miles: Any) -> int:
 def fatigue_index(
     density_score: float,
     days_since_last_game: int,
-    travel_load_score: int
+    travel_load_score: int,
+    params: ModelParams = DEFAULT_PARAMS,
 ) -> float:
     """
     Combines schedule density, travel, and rest recovery
@@ -116,15 +122,11 @@ def fatigue_index(
     tl = _clamp_int(travel_load_score, low=0, high=3)
     b2b = 1 if d == 1 else 0
 
-    TRAVEL_WEIGHT = 4
-    B2B_BONUS = 8
-    COMBO_BONUS = 6
-
     raw = (
         float(density_score)
-        + (B2B_BONUS if b2b else 0)
-        + tl * TRAVEL_WEIGHT
-        + (COMBO_BONUS if b2b and tl >= 2 else 0)
+        + (params.b2b_bonus if b2b else 0)
+        + tl * params.travel_weight
+        + (params.combo_bonus if b2b and tl >= 2 else 0)
     )
 
     score = raw * (1 - recovery_offset(d))
@@ -171,7 +173,8 @@ def fatigue_components_from_row(
     games_last_7: int,
     games_last_14: int,
     days_since_last_game: int,
-    travel_miles: Any
+    travel_miles: Any,
+    params: ModelParams = DEFAULT_PARAMS,
 ) -> Dict[str, Any]:
     """
     Stateless fatigue computation.
@@ -187,7 +190,7 @@ def fatigue_components_from_row(
 
     density = compute_density_score(g7, g14)
     tl = travel_load(travel_miles)
-    fatigue = fatigue_index(density, d, tl)
+    fatigue = fatigue_index(density, d, tl, params)
 
     return {
         "games_last_7": g7,
@@ -199,3 +202,100 @@ def fatigue_components_from_row(
         "fatigue_index": fatigue,
         "fatigue_tier": fatigue_tier(fatigue),
     }
+
+
+# --------------------------------------------------
+# Batch API (precomputed lookup tables)
+# --------------------------------------------------
+# The scalar helpers above stay the reference. Every input they consume
+# saturates on a tiny discrete domain, so the tables below are filled by
+# calling them once per cell and batch scoring is pure indexing.
+
+_G7_MAX = 5      # density_7d_score saturates at 5+ games
+_G14_MAX = 8     # density_14d_score saturates at 8+ games
+_REST_MIN, _REST_MAX = 1, 14
+_TL_MAX = 3
+
+FATIGUE_TIERS = ("Low", "Elevated", "High", "Critical")
+
+
+@lru_cache(maxsize=8)
+def _lookup_tables(travel_weight, b2b_bonus, combo_bonus):
+    """Tables for one set of FLI weights (cached: sweeps revisit them)."""
+    params = DEFAULT_PARAMS._replace(
+        travel_weight=travel_weight, b2b_bonus=b2b_bonus, combo_bonus=combo_bonus
+    )
+    shape = (_G7_MAX + 1, _G14_MAX + 1, _REST_MAX + 1, _TL_MAX + 1)
+    density = np.zeros(shape[:2], dtype=np.float64)
+    fatigue = np.zeros(shape, dtype=np.float64)
+    tier = np.zeros(shape, dtype=np.int8)
+
+    for g7 in range(shape[0]):
+        for g14 in range(shape[1]):
+            density[g7, g14] = compute_density_score(g7, g14)
+            for d in range(_REST_MIN, shape[2]):
+                for tl in range(shape[3]):
+                    f = fatigue_index(density[g7, g14], d, tl, params)
+                    fatigue[g7, g14, d, tl] = f
+                    tier[g7, g14, d, tl] = FATIGUE_TIERS.index(fatigue_tier(f))
+
+    return density, fatigue, tier
+
+
+def lookup_tables(params: ModelParams = DEFAULT_PARAMS):
+    return _lookup_tables(params.travel_weight, params.b2b_bonus, params.combo_bonus)
+
+
+def _clamp_int_array(x: Any, low: int = 0, high: Optional[int] = None) -> np.ndarray:
+    """Array twin of _clamp_int: truncate toward zero, non-finite → 0."""
+    x = np.asarray(x, dtype=np.float64)
+    v = np.where(np.isfinite(x), np.trunc(x), 0.0).astype(np.int64)
+    return np.clip(v, low, high)
+
+
+def travel_load_batch(travel_miles: Any) -> np.ndarray:
+    miles = np.asarray(travel_miles, dtype=np.float64)
+    return np.select(
+        [np.isnan(miles), miles < 300, miles < 800],
+        [0, 1, 2],
+        default=3,
+    ).astype(np.int64)
+
+
+def fatigue_components_batch(
+    games_last_7: Any,
+    games_last_14: Any,
+    days_since_last_game: Any,
+    travel_miles: Any,
+    params: ModelParams = DEFAULT_PARAMS,
+) -> Dict[str, np.ndarray]:
+    """
+    Vectorized fatigue_components_from_row.
+
+    Takes equal-length arrays and returns the same keys as the scalar
+    helper, one array per column (missing travel → NaN).
+    """
+
+    g7 = _clamp_int_array(games_last_7, low=0)
+    g14 = np.maximum(_clamp_int_array(games_last_14, low=0), g7)
+    d = _clamp_int_array(days_since_last_game, low=_REST_MIN, high=_REST_MAX)
+    miles = np.asarray(travel_miles, dtype=np.float64)
+    tl = travel_load_batch(miles)
+
+    density_lut, fatigue_lut, tier_lut = lookup_tables(params)
+    g7_idx = np.minimum(g7, _G7_MAX)
+    g14_idx = np.minimum(g14, _G14_MAX)
+    fatigue = fatigue_lut[g7_idx, g14_idx, d, tl]
+
+    return {
+        "games_last_7": g7,
+        "games_last_14": g14,
+        "density_score": density_lut[g7_idx, g14_idx],
+        "days_since_last_game": d,
+        "travel_miles": miles,
+        "travel_load": tl,
+        "fatigue_index": fatigue,
+        "fatigue_tier": np.asarray(FATIGUE_TIERS, dtype=object)[
+            tier_lut[g7_idx, g14_idx, d, tl]
+        ],
+    }
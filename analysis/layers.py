@@ -0,0 +1,129 @@
+import os
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from analysis.storage import parquet_path, read_table, write_table
+from analysis.utils import ROW_KEY
+
+# --------------------------------------------------
+# Column layers
+# --------------------------------------------------
+# Each analysis stage only adds columns to team_game_metrics. Instead of
+# a cumulative wide copy per stage, a stage persists just its own
+# columns keyed by (game_id, team_id); read_layer() joins the chain back
+# into the wide table on demand.
+#
+#   metrics → pve → rpmi → cvv → archetypes
+
+METRICS_CSV = "data/derived/team_game_metrics.csv"
+
+PVE_COLUMNS = [
+    "expected_margin", "pve",
+    "base_form_diff", "win_diff", "home_away_adj", "fatigue_adj",
+    "expected_raw", "expected_total",
+]
+RPMI_COLUMNS = ["momentum_unit", "rpmi_short", "rpmi_long", "rpmi_accel", "rpmi_delta"]
+CVV_COLUMNS = [
+    "pve_volatility", "consistency", "consistency_win", "consistency_loss",
+    "games_played", "games_in_window", "avg_pve_window",
+    "wins_window", "losses_window", "win_rate_window",
+]
+ARCHETYPE_COLUMNS = ["archetype", "direction_label"]
+
+# name → (own columns, parent layer, legacy wide CSV)
+LAYERS = {
+    "pve": (PVE_COLUMNS, None, "data/derived/team_game_metrics_with_pve.csv"),
+    "rpmi": (RPMI_COLUMNS, "pve", "data/derived/team_game_metrics_with_rpmi.csv"),
+    "cvv": (CVV_COLUMNS, "rpmi", "data/derived/team_game_metrics_with_rpmi_cvv.csv"),
+    "archetypes": (ARCHETYPE_COLUMNS, "cvv", "data/derived/team_game_metrics_with_archetypes.csv"),
+}
+
+
+def layer_table(name: str) -> str:
+    """Table name of a layer's delta (stored as Parquet only)."""
+    return f"data/derived/layers/{name}.csv"
+
+
+def layer_path(name: str) -> str:
+    return parquet_path(layer_table(name))
+
+
+def layer_chain(name: str) -> List[str]:
+    """Layers from the first one up to `name`, in join order."""
+    chain = []
+    while name is not None:
+        chain.insert(0, name)
+        name = LAYERS[name][1]
+    return chain
+
+
+def wide_path(name: str) -> str:
+    return LAYERS[name][2]
+
+
+def layer_exists(name: str) -> bool:
+    """Whether read_layer(name) has something to read."""
+    built = all(os.path.exists(layer_path(n)) for n in layer_chain(name))
+    return built or os.path.exists(wide_path(name))
+
+
+# --------------------------------------------------
+# Write
+# --------------------------------------------------
+
+def save_layer(name: str, df: pd.DataFrame) -> None:
+    """Persist only `name`'s own columns of a stage frame."""
+    write_table(df[ROW_KEY + LAYERS[name][0]], layer_table(name), export_csv=False)
+
+
+def export_wide(name: str) -> str:
+    """Write the joined wide table as the legacy CSV (for humans / old tools)."""
+    path = wide_path(name)
+    df = read_layer(name)
+    # Same game_date text as the stages used to write (UTC midnight timestamps)
+    df["game_date"] = pd.to_datetime(df["game_date"], utc=True)
+    df.to_csv(path, index=False)
+    return path
+
+
+# --------------------------------------------------
+# Lazy join view
+# --------------------------------------------------
+
+def read_layer(name: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Wide table as of layer `name`: metrics plus every layer up to it,
+    in the rows (and row order) `name` produced. With `columns`, only
+    the tables holding those columns are read.
+
+    Falls back to the legacy wide CSV while the layer deltas have not
+    been built yet.
+    """
+    chain = layer_chain(name)
+    if not all(os.path.exists(layer_path(n)) for n in chain):
+        return read_table(wide_path(name), columns=columns)
+
+    tables = [(METRICS_CSV, [c for c in _metric_columns() if c not in ROW_KEY])]
+    tables += [(layer_table(n), LAYERS[n][0]) for n in chain]
+
+    wanted = None if columns is None else set(columns)
+    out = read_table(layer_table(name), columns=ROW_KEY)
+    for table, own in tables:
+        cols = own if wanted is None else [c for c in own if c in wanted]
+        if not cols:
+            continue
+        part = read_table(table, columns=ROW_KEY + cols)
+        out = out.merge(part, on=ROW_KEY, how="left", validate="one_to_one")
+
+    if columns is None:
+        columns = _metric_columns() + [c for n in chain for c in LAYERS[n][0]]
+    return out[list(columns)]
+
+
+def _metric_columns() -> List[str]:
+    path = parquet_path(METRICS_CSV)
+    if os.path.exists(path):
+        return pq.read_schema(path).names
+    return list(pd.read_csv(METRICS_CSV, nrows=0).columns)
@@ -0,0 +1,33 @@
+from typing import NamedTuple
+
+# --------------------------------------------------
+# Model parameters
+# --------------------------------------------------
+# The tunable constants of the FLI / PvE / RPMI / CVV layers in one
+# immutable object. Builders take `params=DEFAULT_PARAMS`; the defaults
+# are the values the published layers are built with, so only sweeps
+# (analysis/sweep.py) and backtests ever pass anything else.
+
+
+class ModelParams(NamedTuple):
+    # PvE (pve.expected_margin_breakdown)
+    home_advantage: float = 4.5     # points, ± for home / away
+    fatigue_weight: float = 3.0     # points at fatigue_index 100
+    win_rate_weight: float = 6.0    # points per unit of win-rate difference
+    max_margin: float = 12.0        # soft bound of the expected margin
+
+    # FLI (fli.fatigue_index)
+    travel_weight: int = 4          # per travel-load step (0-3)
+    b2b_bonus: int = 8              # back-to-back
+    combo_bonus: int = 6            # back-to-back with travel load >= 2
+
+    # RPMI (build_rpmi)
+    short_window: int = 3
+    long_window: int = 7
+
+    # CVV (build_cvv)
+    cvv_window: int = 10
+    vol_scale: float = 15.0
+
+
+DEFAULT_PARAMS = ModelParams()
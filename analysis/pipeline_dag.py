@@ -0,0 +1,327 @@
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from analysis.utils import read_stage_csv
+
+MANIFEST_JSON = "data/derived/pipeline_manifest.json"
+
+EVERYTHING = pd.Timestamp.min   # dirty marker: no usable earliest date
+
+_print_lock = threading.Lock()
+
+
+def _log(msg: str) -> None:
+    # stages print from worker threads; keep lines whole
+    with _print_lock:
+        print(msg, flush=True)
+
+
+# --------------------------------------------------
+# Stage declaration
+# --------------------------------------------------
+
+class Stage(NamedTuple):
+    """
+    One node of the pipeline DAG.
+
+    `run` is called with the frames of `inputs` (upstream stage names, in
+    order) and returns this stage's frame. `sources` are raw files the
+    stage reads itself, `code` the modules whose source versions it.
+
+    An `incremental` stage is causal in game_date (a row only depends on
+    rows up to its own date) and its `run` also accepts `since=` and
+    `previous=` (its last output, via `load`) to rebuild only the tail.
+
+    `save` persists the frame to `output` (default: the whole frame as
+    CSV); column-layer stages store only their own columns there.
+    """
+    name: str
+    title: str
+    run: Callable[..., pd.DataFrame]
+    inputs: Tuple[str, ...] = ()
+    sources: Tuple[str, ...] = ()
+    code: Tuple[str, ...] = ()
+    output: Optional[str] = None      # file holding this stage's frame
+    writes_output: bool = False       # `run` persists `output` itself
+    incremental: bool = False
+    load: Callable[[str], pd.DataFrame] = read_stage_csv
+    save: Optional[Callable[[pd.DataFrame, str], None]] = None
+
+
+# --------------------------------------------------
+# Content hashes
+# --------------------------------------------------
+
+def file_digest(path: str) -> Optional[str]:
+    if not os.path.exists(path):
+        return None
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def frame_digest(df: pd.DataFrame) -> str:
+    h = hashlib.sha1("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def date_digests(df: pd.DataFrame) -> Dict[str, str]:
+    """game_date → digest of that day's rows (row order ignored)."""
+    days = pd.to_datetime(df["game_date"], utc=True, errors="coerce", format="mixed")
+    days = days.dt.strftime("%Y-%m-%d").fillna("NaT")
+    rows = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return {
+        day: f"{len(idx)}:{int(rows[idx].sum(dtype=np.uint64))}"
+        for day, idx in days.groupby(days).indices.items()
+    }
+
+
+def first_changed_date(old: Optional[Dict[str, str]], new: Dict[str, str]) -> Optional[pd.Timestamp]:
+    """
+    Earliest game_date whose rows differ between two date_digests
+    snapshots (None: none differ, EVERYTHING: no usable snapshot).
+    """
+    if old is None or "NaT" in old or "NaT" in new:
+        return EVERYTHING
+    changed = [d for d in set(old) | set(new) if old.get(d) != new.get(d)]
+    return pd.Timestamp(min(changed)) if changed else None
+
+
+def code_digest(modules) -> str:
+    h = hashlib.sha1()
+    for name in modules:
+        h.update(name.encode("utf-8"))
+        h.update(file_digest(importlib.util.find_spec(name).origin).encode("utf-8"))
+    return h.hexdigest()
+
+
+# --------------------------------------------------
+# Manifest
+# --------------------------------------------------
+
+def load_manifest(path: str = MANIFEST_JSON) -> Dict[str, dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("stages", {})
+
+
+def save_manifest(stages: Dict[str, dict], path: str = MANIFEST_JSON) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"stages": stages}, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+# --------------------------------------------------
+# Scheduler
+# --------------------------------------------------
+
+class _DagRun:
+    def __init__(self, stages, manifest, force: bool, dirty):
+        self.stages = {s.name: s for s in stages}
+        self.manifest = manifest
+        self.force = force
+        self.known_dirty = dict(dirty or {})
+        # Output digests as of the last run (the manifest is updated in place)
+        self.last_digests = {name: r.get("digest") for name, r in manifest.items()}
+
+        # Earliest game_date whose rows may differ from the last run:
+        # None = unchanged, EVERYTHING = no usable bound
+        self.dirty: Dict[str, Optional[pd.Timestamp]] = {}
+        self.digests: Dict[str, str] = {}
+        self.frames: Dict[str, pd.DataFrame] = {}
+        self.locks = {name: threading.Lock() for name in self.stages}
+
+    def fingerprint(self, stage: Stage, code: str) -> str:
+        h = hashlib.sha1(stage.name.encode("utf-8"))
+        h.update(code.encode("utf-8"))
+        for path in stage.sources:
+            h.update(f"{path}={file_digest(path)}".encode("utf-8"))
+        for name in stage.inputs:
+            h.update(f"{name}={self.digests[name]}".encode("utf-8"))
+        return h.hexdigest()
+
+    def _files_intact(self, record: dict) -> bool:
+        return all(file_digest(p) == d for p, d in record.get("files", {}).items())
+
+    def up_to_date(self, stage: Stage, fp: str) -> bool:
+        record = self.manifest.get(stage.name)
+        if self.force or not record or record.get("fingerprint") != fp:
+            return False
+        if stage.output and stage.output not in record.get("files", {}):
+            return False
+        return self._files_intact(record)
+
+    def frame(self, name: str) -> pd.DataFrame:
+        """Frame of a resolved stage: in memory, from its output, or recomputed."""
+        with self.locks[name]:
+            if name not in self.frames:
+                stage = self.stages[name]
+                record = self.manifest.get(name, {})
+                if stage.output in record.get("files", {}) and self._files_intact(record):
+                    self.frames[name] = stage.load(stage.output)
+                else:
+                    self.frames[name] = stage.run(*(self.frame(i) for i in stage.inputs))
+            return self.frames[name]
+
+    def previous(self, stage: Stage) -> Optional[pd.DataFrame]:
+        """Last run's output of a stage, if it was written and is intact."""
+        record = self.manifest.get(stage.name, {})
+        if stage.output in record.get("files", {}) and self._files_intact(record):
+            return stage.load(stage.output)
+        return None
+
+    def input_dirty(self, stage: Stage) -> Optional[pd.Timestamp]:
+        # Dirty dates only cover changes since the inputs' last run: if this
+        # stage did not consume those outputs (a run failed in between),
+        # its previous output has no usable bound
+        consumed = self.manifest.get(stage.name, {}).get("inputs", {})
+        if any(consumed.get(i) != self.last_digests.get(i) for i in stage.inputs):
+            return EVERYTHING
+        marks = [self.dirty[i] for i in stage.inputs if self.dirty[i] is not None]
+        return min(marks) if marks else None
+
+    def execute(self, stage: Stage) -> Tuple[str, dict]:
+        code = code_digest(stage.code)
+        fp = self.fingerprint(stage, code)
+        if self.up_to_date(stage, fp):
+            _log(f"⏭️  {stage.title} — unchanged, skipped")
+            self.digests[stage.name] = self.manifest[stage.name]["digest"]
+            self.dirty[stage.name] = None
+            return "skipped", self.manifest[stage.name]
+
+        frames = [self.frame(i) for i in stage.inputs]
+        same_code = not self.force and self.manifest.get(stage.name, {}).get("code") == code
+
+        # A source stage's dirty date comes from diffing its frame against
+        # the snapshot of the last run (below): facts may have moved over
+        # several ingests since the stages last consumed them
+        since = EVERYTHING
+        if same_code and stage.incremental:
+            since = self.input_dirty(stage)
+
+        previous = None
+        if since is None or since is EVERYTHING:
+            _log(f"▶️  {stage.title}...")
+        else:
+            _log(f"▶️  {stage.title} (from {since.date()})...")
+            if stage.incremental:
+                previous = self.previous(stage)
+
+        if previous is not None:
+            df = stage.run(*frames, since=since, previous=previous)
+            since = min(since, _earliest_new_date(previous, df))
+        else:
+            df = stage.run(*frames)
+
+        dates = None
+        if not stage.inputs and "game_date" in df.columns:
+            dates = date_digests(df)
+            old = self.manifest.get(stage.name, {}).get("dates")
+            since = first_changed_date(old, dates) if same_code else EVERYTHING
+            known = self.known_dirty.get(stage.name)
+            if known is not None and since is not None:
+                since = min(since, known)
+            elif known is not None:
+                since = known
+
+        files = {}
+        if stage.output:
+            if stage.save is not None:
+                stage.save(df, stage.output)
+            elif not stage.writes_output:
+                df.to_csv(stage.output, index=False)
+            if not stage.writes_output:
+                _log(f"   ↳ wrote {len(df)} rows → {stage.output}")
+            files[stage.output] = file_digest(stage.output)
+
+        with self.locks[stage.name]:
+            self.frames[stage.name] = df
+        self.digests[stage.name] = frame_digest(df)
+        self.dirty[stage.name] = since
+        record = {
+            "fingerprint": fp,
+            "code": code,
+            "digest": self.digests[stage.name],
+            "files": files,
+            "inputs": {i: self.digests[i] for i in stage.inputs},
+        }
+        if dates is not None:
+            record["dates"] = dates
+        return "ran", record
+
+
+def _earliest_new_date(previous: pd.DataFrame, df: pd.DataFrame) -> pd.Timestamp:
+    """Earliest game_date in `df` past the previous output's last one."""
+    if previous.empty:
+        return EVERYTHING
+
+    def days(frame):
+        ts = pd.to_datetime(frame["game_date"], utc=True, format="mixed")
+        return ts.dt.tz_localize(None)
+
+    dates = days(df)
+    newer = dates[dates > days(previous).max()]
+    return newer.min() if not newer.empty else pd.Timestamp.max
+
+
+def run_dag(
+    stages,
+    manifest_path: str = MANIFEST_JSON,
+    force: bool = False,
+    max_workers: int = 4,
+    dirty: Optional[Dict[str, pd.Timestamp]] = None,
+) -> Dict[str, str]:
+    """
+    Run `stages` in dependency order, skipping any stage whose code,
+    sources and upstream outputs hash the same as in the last run.
+    Stages whose inputs are resolved run concurrently. Returns
+    {stage name: "ran" | "skipped"}.
+
+    A source stage's (no inputs) earliest changed game_date is found by
+    diffing its rows per day against the snapshot the manifest keeps of
+    its last run (none: everything is dirty); `dirty` can only move it
+    earlier. That date propagates downstream: incremental stages rebuild
+    only rows on/after it, seeded by their last output.
+    """
+    manifest = load_manifest(manifest_path)
+    dag = _DagRun(stages, manifest, force, dirty)
+
+    for stage in stages:
+        unknown = set(stage.inputs) - set(dag.stages)
+        if unknown:
+            raise ValueError(f"Stage {stage.name!r} depends on unknown {sorted(unknown)}")
+
+    status: Dict[str, str] = {}
+    pending = [s for s in stages]
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            ready = [s for s in pending if all(i in status for i in s.inputs)]
+            for stage in ready:
+                pending.remove(stage)
+                running[pool.submit(dag.execute, stage)] = stage.name
+
+            if not running:
+                raise ValueError(f"Dependency cycle among {[s.name for s in pending]}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                status[name], manifest[name] = future.result()
+                save_manifest(manifest, manifest_path)
+
+    return status
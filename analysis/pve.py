@@ -1,10 +1,11 @@
 import pandas as pd
 import math
 from typing import Dict
-from analysis.utils import clamp
+from analysis.params import DEFAULT_PARAMS, ModelParams
+from analysis.utils import clamp, utc_today
 
 
-def bounded_sigmoid(x: float, max_margin: float = 12.0) -> float:
+def bounded_sigmoid(x: float, max_margin: float = DEFAULT_PARAMS.max_margin) -> float:
     """
     Smoothly bounds expected margin to [-max_margin, +max_margin]
     using tanh to avoid hard cliffs.
@@ -19,6 +20,8 @@ def expected_margin_breakdown_from_rows(
     is_home: bool,
     recent_games: pd.DataFrame,
     fatigue_index: float,
+    today=None,
+    params: ModelParams = DEFAULT_PARAMS,
 ) -> Dict[str, float]:
     """
     Row-based expected margin calculation (defensive & bounded).
@@ -27,12 +30,14 @@ def expected_margin_breakdown_from_rows(
     - Ignore zero-margin games (broken ingestion / placeholders)
     - Ignore today & future games
     - Bound expectations smoothly (sigmoid)
+
+    `today` defaults to the current UTC date (see utils.utc_today).
     """
 
     # --------------------------------------------------
     # Defensive filtering (CRITICAL)
     # --------------------------------------------------
-    today = pd.Timestamp.utcnow().normalize()
+    today = utc_today(today)
 
     recent_games = recent_games.copy()
     recent_games["game_date"] = pd.to_datetime(
@@ -56,7 +61,6 @@ def expected_margin_breakdown_from_rows(
 
     team_form = team_rows["actual_margin"].mean() if not team_rows.empty else 0.0
     opp_form = opp_rows["actual_margin"].mean() if not opp_rows.empty else 0.0
-    base_form_diff = team_form - opp_form
 
     # --------------------------------------------------
     # Win–loss component (bounded psychological signal)
@@ -68,24 +72,48 @@ def expected_margin_breakdown_from_rows(
         total = len(rows)
         return wins / total if total > 0 else 0.5
 
-    team_win_rate = win_rate(team_rows)
-    opp_win_rate = win_rate(opp_rows)
+    return expected_margin_breakdown(
+        team_form=team_form,
+        opp_form=opp_form,
+        team_win_rate=win_rate(team_rows),
+        opp_win_rate=win_rate(opp_rows),
+        is_home=is_home,
+        fatigue_index=fatigue_index,
+        params=params,
+    )
+
+
+def expected_margin_breakdown(
+    *,
+    team_form: float,
+    opp_form: float,
+    team_win_rate: float,
+    opp_win_rate: float,
+    is_home: bool,
+    fatigue_index: float,
+    params: ModelParams = DEFAULT_PARAMS,
+) -> Dict[str, float]:
+    """
+    Expected margin from pre-aggregated form inputs.
+
+    Shared by the row-based helper above and the prefix-aggregate
+    engine in build_pve. Weights come from `params` (see params.py).
+    """
+    base_form_diff = team_form - opp_form
 
-    # bounded influence: ±6 points
-    win_diff = (team_win_rate - opp_win_rate) * 6.0
+    # bounded influence: ±win_rate_weight points
+    win_diff = (team_win_rate - opp_win_rate) * params.win_rate_weight
 
     # --------------------------------------------------
     # Home / Away adjustment
     # --------------------------------------------------
-    HOME_ADVANTAGE = 4.5
-    home_away_adj = HOME_ADVANTAGE if is_home else -HOME_ADVANTAGE
+    home_away_adj = params.home_advantage if is_home else -params.home_advantage
 
     # --------------------------------------------------
     # Fatigue adjustment
     # --------------------------------------------------
-    FATIGUE_WEIGHT = 3.0
     fatigue_norm = clamp(fatigue_index / 100.0, 0.0, 1.0)
-    fatigue_adj = -fatigue_norm * FATIGUE_WEIGHT
+    fatigue_adj = -fatigue_norm * params.fatigue_weight
 
     # --------------------------------------------------
     # Linear expectation (pre-bounding)
@@ -100,7 +128,7 @@ def expected_margin_breakdown_from_rows(
     # --------------------------------------------------
     # SOFT BOUND (sigmoid)
     # --------------------------------------------------
-    expected_total = bounded_sigmoid(expected_raw, max_margin=12.0)
+    expected_total = bounded_sigmoid(expected_raw, max_margin=params.max_margin)
 
     return {
         "base_form_diff": round(base_form_diff, 2),
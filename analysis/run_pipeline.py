@@ -1,4 +1,195 @@
-def main():
+import argparse
+from functools import partial
+from typing import List
+
+import pandas as pd
+
+from analysis.layers import LAYERS, export_wide, layer_path, read_layer, save_layer
+from analysis.pipeline_dag import Stage, run_dag
+
+# --------------------------------------------------
+# Stage outputs
+# --------------------------------------------------
+# PvE / RPMI / CVV / archetypes only persist their own columns (see
+# analysis/layers.py); the legacy wide CSVs are exported with --materialize.
+
+FACTS_CSV = "data/core/team_game_facts.csv"
+METRICS_CSV = "data/derived/team_game_metrics.csv"
+ENVIRONMENT_CSV = "data/derived/game_environment.csv"
+
+
+# --------------------------------------------------
+# Stage bodies (DataFrame in → DataFrame out)
+# --------------------------------------------------
+
+def _facts(history=False):
+    from analysis.build_team_game_metrics import SEASONS_DIR, load_team_games
+    return load_team_games(FACTS_CSV, seasons_dir=SEASONS_DIR if history else None)
+
+
+def _metrics(facts, since=None, previous=None, workers=1):
+    from analysis.build_team_game_metrics import update_team_game_metrics
+    # Without `since` the DAG wants every row rebuilt (code changed,
+    # --force, no usable previous output): the checkpoint must not
+    # short-circuit that
+    return update_team_game_metrics(
+        facts,
+        full_rebuild=since is None,
+        since=since.date() if since is not None else None,
+        existing=previous,
+        workers=workers,
+    )
+
+
+def _load_metrics(path):
+    from analysis.build_team_game_metrics import load_team_game_metrics
+    return load_team_game_metrics(path)
+
+
+def _pve(metrics, since=None, previous=None):
+    from analysis.build_pve import build_pve
+    out = build_pve(metrics, since=since, previous=previous)
+    if out.empty:
+        raise RuntimeError("❌ PvE produced no rows — aborting pipeline.")
+    return out
+
+
+def _rpmi(pve, since=None, previous=None, workers=1):
+    from analysis.build_rpmi import checkpoint_rpmi, compute_rpmi
+    out = compute_rpmi(pve, since=since, previous=previous, workers=workers)
+    checkpoint_rpmi(out, since=since)
+    return out
+
+
+def _cvv(rpmi, since=None, previous=None, workers=1):
+    from analysis.build_cvv import compute_cvv
+    out = compute_cvv(rpmi, since=since, previous=previous, workers=workers)
+    if out.empty:
+        raise RuntimeError("❌ CVV produced no rows — aborting pipeline.")
+    return out
+
+
+def _environment(cvv, facts, since=None, previous=None):
+    from analysis.build_game_environment import build_game_environment
+    return build_game_environment(cvv, facts, since=since, previous=previous)
+
+
+def _archetypes(cvv):
+    from analysis.build_archetypes import build_archetypes
+    return build_archetypes(cvv)
+
+
+def _fused(facts):
+    from analysis.stream_engine import update_fused
+    return update_fused(facts)
+
+
+def _layer(name):
+    """Stage output options for a column layer."""
+    return dict(
+        output=layer_path(name),
+        save=lambda df, _path: save_layer(name, df),
+        load=lambda _path: read_layer(name),
+    )
+
+
+# --------------------------------------------------
+# DAG
+# --------------------------------------------------
+
+def pipeline_stages(workers: int = 1, fast: bool = False, history: bool = False) -> List[Stage]:
+    """
+    The pipeline DAG. `workers` > 1 runs the per-team FLI / RPMI / CVV
+    kernels on that many processes (see shards.py); it is bound into
+    those stages' bodies. With `history`, facts also include the
+    backfilled season partitions (data/core/seasons/, see
+    scripts/ingest/backfill_games.py) ahead of the live facts.
+
+    With `fast`, one fused pass (analysis/stream_engine.py) stands in for
+    the metrics → pve → rpmi → cvv chain and writes the same tables; it
+    reruns in full whenever facts change. The staged chain is the
+    reference.
+    """
+    facts_sources = (FACTS_CSV,)
+    if history:
+        from analysis.build_team_game_metrics import season_tables
+        facts_sources = (*season_tables(), FACTS_CSV)
+
+    stages = [
+        Stage(
+            "facts", "📥 Loading team game facts", partial(_facts, history=history),
+            sources=facts_sources,
+            code=("analysis.build_team_game_metrics",),
+        ),
+        Stage(
+            "metrics", "⚙️  Fatigue / load metrics", partial(_metrics, workers=workers),
+            inputs=("facts",),
+            code=("analysis.build_team_game_metrics", "analysis.fli", "analysis.params", "analysis.utils"),
+            output=METRICS_CSV, writes_output=True,
+            incremental=True, load=_load_metrics,
+        ),
+        Stage(
+            "pve", "📊 Performance vs expectation", _pve,
+            inputs=("metrics",),
+            code=("analysis.build_pve", "analysis.pve", "analysis.params", "analysis.team_history"),
+            incremental=True, **_layer("pve"),
+        ),
+        Stage(
+            "rpmi", "📈 Rolling momentum index", partial(_rpmi, workers=workers),
+            inputs=("pve",),
+            code=("analysis.build_rpmi", "analysis.params", "analysis.utils"),
+            incremental=True, **_layer("rpmi"),
+        ),
+        Stage(
+            "cvv", "🧩 Consistency & volatility layers", partial(_cvv, workers=workers),
+            inputs=("rpmi",),
+            code=("analysis.build_cvv", "analysis.params", "analysis.utils"),
+            incremental=True, **_layer("cvv"),
+        ),
+        Stage(
+            "environment", "🌍 Game environment dataset", _environment,
+            inputs=("cvv", "facts"),
+            code=("analysis.build_game_environment", "analysis.team_history", "analysis.utils"),
+            output=ENVIRONMENT_CSV, incremental=True,
+        ),
+        Stage(
+            "archetypes", "🧬 Team archetypes", _archetypes,
+            inputs=("cvv",),
+            code=("analysis.build_archetypes", "analysis.archetypes"),
+            **_layer("archetypes"),
+        ),
+    ]
+    if not fast:
+        return stages
+
+    return [
+        stages[0],
+        Stage(
+            "cvv", "⚡ Fused FLI / PvE / RPMI / CVV pass", _fused,
+            inputs=("facts",),
+            code=(
+                "analysis.stream_engine", "analysis.build_team_game_metrics", "analysis.fli",
+                "analysis.build_pve", "analysis.pve", "analysis.build_rpmi",
+                "analysis.build_cvv", "analysis.params", "analysis.utils",
+            ),
+            output=layer_path("cvv"), writes_output=True,
+            load=lambda _path: read_layer("cvv"),
+        ),
+        *stages[-2:],
+    ]
+
+
+STAGES = pipeline_stages()
+FAST_STAGES = pipeline_stages(fast=True)
+
+
+def main(
+    materialize: bool = False,
+    force: bool = False,
+    fast: bool = False,
+    workers: int = 1,
+    history: bool = False,
+):
     """
     Master pipeline runner for Signal & Noise NBA project.
 
@@ -8,70 +199,73 @@ def main():
       3. Build performance vs expectation (PvE)
       4. Build rolling performance momentum index (RPMI)
       5. Build consistency–volatility view (CVV)
-      6. Build game environment layer
-    """
-
-    import os
+      6. Build game environment layer (+ archetypes, in parallel)
 
+    Steps 2–6 form a DAG: a stage is skipped when its code, source files
+    and upstream outputs hash the same as in the last run (see
+    data/derived/pipeline_manifest.json). When ingest reports the
+    earliest changed game_date, stages rebuild only rows on/after it.
+    `force=True` reruns everything, `materialize=True` also exports the
+    wide per-layer CSVs (e.g. _with_rpmi_cvv.csv), `fast=True` builds
+    steps 2–5 in one fused pass instead. `workers` > 1 runs the per-team
+    FLI / RPMI / CVV kernels on that many processes (see shards.py);
+    `history=True` builds over the backfilled seasons too.
+    """
     # -----------------------------
     # 1️⃣ INGEST (critical)
     # -----------------------------
     from scripts.ingest.append_daily_games import main as ingest_games
     print("\n🚚 Step 1 — Ingesting new games...")
-    ingest_games()
-
-    # -----------------------------
-    # 2️⃣ TEAM GAME METRICS (FLI)
-    # -----------------------------
-    from analysis.build_team_game_metrics import main as build_metrics
-    print("⚙️  Step 2 — Building fatigue / load metrics...")
-    build_metrics()
-
-    if not os.path.exists("data/derived/team_game_metrics.csv"):
-        raise FileNotFoundError("❌ team_game_metrics.csv missing — aborting pipeline.")
-
-    # -----------------------------
-    # 3️⃣ PERFORMANCE vs EXPECTATION (PvE)
-    # -----------------------------
-    from analysis.build_pve import main as build_pve
-    print("📊 Step 3 — Calculating performance vs expectation...")
-    build_pve()
-
-    if not os.path.exists("data/derived/team_game_metrics_with_pve.csv"):
-        raise FileNotFoundError("❌ PvE output missing — aborting pipeline.")
-
-    # -----------------------------
-    # 4️⃣ ROLLING PERFORMANCE MOMENTUM INDEX (RPMI)
-    # -----------------------------
-    from analysis.build_rpmi import main as build_rpmi
-    print("📈 Step 4 — Computing rolling momentum index...")
-    build_rpmi()
-
-    if not os.path.exists("data/derived/team_game_metrics_with_rpmi.csv"):
-        raise FileNotFoundError("❌ RPMI output missing — aborting pipeline.")
-
-    # -----------------------------
-    # 5️⃣ CONSISTENCY–VOLATILITY VIEW (CVV)
-    # -----------------------------
-    from analysis.build_cvv import main as build_cvv
-    print("🧩 Step 5 — Deriving consistency & volatility layers...")
-    build_cvv()
-
-    if not os.path.exists("data/derived/team_game_metrics_with_rpmi_cvv.csv"):
-        raise FileNotFoundError("❌ CVV output missing — aborting pipeline.")
+    since = ingest_games()
+    dirty = {"facts": pd.Timestamp(since)} if since is not None else {}
 
     # -----------------------------
-    # 6️⃣ GAME ENVIRONMENT SUMMARY
+    # 2️⃣–6️⃣ DERIVED LAYERS
     # -----------------------------
-    from analysis.build_game_environment import main as build_environment
-    print("🌍 Step 6 — Building game environment dataset...")
-    build_environment()
+    print("🧮 Steps 2–6 — Building derived layers...")
+    status = run_dag(pipeline_stages(workers, fast, history), force=force, dirty=dirty)
 
-    if not os.path.exists("data/derived/game_environment.csv"):
-        raise FileNotFoundError("❌ Game environment output missing.")
+    if materialize:
+        for name in LAYERS:
+            print(f"   ↳ exported {export_wide(name)}")
 
-    print("\n✅ Pipeline completed successfully!")
+    ran = [name for name, s in status.items() if s == "ran"]
+    print(f"\n✅ Pipeline completed successfully! ({len(ran)}/{len(status)} stages ran)")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Signal & Noise daily pipeline")
+    parser.add_argument(
+        "--materialize",
+        action="store_true",
+        help="also export the wide per-layer CSVs (e.g. _with_rpmi_cvv.csv)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="rerun every stage, ignoring the run manifest",
+    )
+    parser.add_argument(
+        "--fast",
+        action="store_true",
+        help="build metrics / PvE / RPMI / CVV in one fused pass",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="processes for the per-team FLI / RPMI / CVV stages (team shards)",
+    )
+    parser.add_argument(
+        "--history",
+        action="store_true",
+        help="also build over the backfilled seasons in data/core/seasons/",
+    )
+    args = parser.parse_args()
+    main(
+        materialize=args.materialize,
+        force=args.force,
+        fast=args.fast,
+        workers=args.workers,
+        history=args.history,
+    )
@@ -0,0 +1,103 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+# --------------------------------------------------
+# Per-team sharding
+# --------------------------------------------------
+# FLI, RPMI and CVV rows only look at earlier rows of the same team, so
+# whole teams can be scored independently. Rows are cut into shards of
+# whole teams (at most SHARD_ROWS rows each, unless one team is bigger),
+# shards run on a process pool with at most two per worker in flight,
+# and results are merged back in shard order: the same rows, in the same
+# order, as one in-process call.
+
+SHARD_ROWS = 20_000
+
+
+def team_shards(team_ids: np.ndarray, max_rows: int = SHARD_ROWS) -> List[slice]:
+    """
+    Contiguous slices of a team-by-team layout, each holding whole teams
+    (greedily packed up to max_rows; a bigger team is a shard alone).
+    """
+    team_ids = np.asarray(team_ids)
+    n = len(team_ids)
+    if n == 0:
+        return []
+
+    starts = np.flatnonzero(np.r_[True, team_ids[1:] != team_ids[:-1]]).tolist()
+    shards, lo = [], 0
+    for start, end in zip(starts, starts[1:] + [n]):
+        if end - lo > max_rows and start > lo:
+            shards.append(slice(lo, start))
+            lo = start
+    shards.append(slice(lo, n))
+    return shards
+
+
+def run_shards(
+    kernel: Callable,
+    tasks: Iterable[tuple],
+    workers: int = 1,
+) -> Iterator:
+    """
+    kernel(*task) for each task, yielded in task order. With workers > 1
+    tasks go to a process pool, at most 2 × workers submitted at a time;
+    tasks are drawn lazily, so only that many shards (and their results)
+    are held at once.
+    """
+    if workers <= 1:
+        for task in tasks:
+            yield kernel(*task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for task in tasks:
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+            pending.append(pool.submit(kernel, *task))
+        while pending:
+            yield pending.popleft().result()
+
+
+def map_team_columns(
+    kernel: Callable,
+    arrays: Sequence[np.ndarray],
+    team_ids: np.ndarray,
+    *extra,
+    workers: int = 1,
+    max_rows: int = SHARD_ROWS,
+) -> Dict[str, np.ndarray]:
+    """
+    Run a column kernel (rpmi_columns, cvv_columns: arrays laid out team
+    by team in, {column: array} out) shard by shard and concatenate.
+    """
+    if workers <= 1:
+        return kernel(*arrays, *extra)
+
+    tasks = (tuple(a[s] for a in arrays) + extra for s in team_shards(team_ids, max_rows))
+    parts = list(run_shards(kernel, tasks, workers))
+    if not parts:
+        return kernel(*arrays, *extra)
+    return {col: np.concatenate([p[col] for p in parts]) for col in parts[0]}
+
+
+def team_frame_shards(
+    frame: pd.DataFrame,
+    team_col: str = "team_id",
+    max_rows: int = SHARD_ROWS,
+) -> List[np.ndarray]:
+    """
+    Row positions of `frame` grouped into shards of whole teams, each in
+    the frame's own row order.
+    """
+    codes, _ = pd.factorize(frame[team_col], sort=True)
+    by_team = np.argsort(codes, kind="stable")
+    return [
+        np.sort(by_team[s])
+        for s in team_shards(codes[by_team], max_rows)
+    ]
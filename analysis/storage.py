@@ -0,0 +1,197 @@
+import os
+from fnmatch import fnmatch
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# --------------------------------------------------
+# Table schemas
+# --------------------------------------------------
+# Tables keep their CSV path as their name (matched against SCHEMAS by
+# file name pattern); the typed copy lives next to it as .parquet.
+# Column kinds:
+#   "date"      → date32 (python dates in pandas)
+#   "int32"/... → fixed-width ints (left as-is when the column has NaN)
+#   "category"  → dictionary-encoded strings
+#   ("float32", n) → float32 on disk, rounded back to n decimals on read
+
+FACTS_SCHEMA = {
+    "game_id": "int32",
+    "game_date": "date",
+    "team_id": "int32",
+    "team_name": "category",
+    "opponent_id": "int32",
+    "opponent_name": "category",
+    "home_away": "category",
+    "team_points": "int16",
+    "opponent_points": "int16",
+}
+
+METRICS_SCHEMA = {
+    "game_id": "int32",
+    "game_date": "date",
+    "team_id": "int32",
+    "team_name": "category",
+    "opponent_id": "int32",
+    "opponent_name": "category",
+    "home_away": "category",
+    "actual_margin": "int16",
+    "current_city": "category",
+    "previous_city": "category",
+    "games_last_7": "int16",
+    "games_last_14": "int16",
+    "density_score": ("float32", 1),
+    "days_since_last_game": "int16",
+    "travel_miles": ("float32", 1),
+    "travel_load": "int16",
+    "fatigue_index": ("float32", 1),
+    "fatigue_tier": "category",
+}
+
+SCHEMAS = {
+    "team_game_facts.csv": FACTS_SCHEMA,
+    "team_game_facts_*.csv": FACTS_SCHEMA,     # season partitions (backfill)
+    "team_game_metrics.csv": METRICS_SCHEMA,
+}
+
+
+def table_schema(csv_path) -> Dict:
+    name = os.path.basename(str(csv_path))
+    for pattern, schema in SCHEMAS.items():
+        if fnmatch(name, pattern):
+            return schema
+    return {}
+
+
+def parquet_path(csv_path) -> str:
+    return os.path.splitext(str(csv_path))[0] + ".parquet"
+
+
+# The Parquet copy records the size and mtime of the CSV it was made
+# from; it is only served while the CSV still matches. Comparing mtimes
+# alone breaks as soon as a copy or checkout resets them.
+CSV_STAMP_KEY = b"csv_stamp"
+
+
+def csv_stamp(csv_path) -> Optional[str]:
+    if not os.path.exists(csv_path):
+        return None
+    st = os.stat(csv_path)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def parquet_stamp(path) -> Optional[str]:
+    stamp = (pq.read_schema(path).metadata or {}).get(CSV_STAMP_KEY)
+    return stamp.decode("utf-8") if stamp is not None else None
+
+
+# --------------------------------------------------
+# Encode / decode
+# --------------------------------------------------
+
+def _parse_dates(values: pd.Series) -> pd.Series:
+    return pd.to_datetime(values, utc=True, errors="coerce", format="mixed").dt.date
+
+
+def _encode(df: pd.DataFrame, schema: Dict) -> pd.DataFrame:
+    out = {}
+    for col in df.columns:
+        kind = schema.get(col)
+        values = df[col]
+        if kind == "date":
+            values = pd.to_datetime(values, errors="coerce").dt.date
+        elif kind == "category":
+            values = values.astype("category")
+        elif isinstance(kind, tuple):
+            values = values.astype(kind[0])
+        elif kind is not None and values.notna().all():
+            values = values.astype(kind)
+        out[col] = values
+    return pd.DataFrame(out, index=df.index)
+
+
+def _decode(df: pd.DataFrame, schema: Dict, from_csv: bool) -> pd.DataFrame:
+    for col in df.columns:
+        kind = schema.get(col)
+        if kind == "date" and from_csv:
+            df[col] = _parse_dates(df[col])
+        elif kind == "category":
+            df[col] = df[col].astype("category")
+        elif isinstance(kind, tuple):
+            # float32 storage → the n-decimal float64 the builder produced
+            df[col] = np.round(df[col].astype(np.float32).astype(np.float64), kind[1])
+        elif kind not in (None, "date") and df[col].notna().all():
+            df[col] = df[col].astype(kind)
+    return df
+
+
+# --------------------------------------------------
+# Read / write
+# --------------------------------------------------
+
+def write_table(df: pd.DataFrame, csv_path, export_csv: bool = True) -> None:
+    """
+    Write a table as typed Parquet (schema from SCHEMAS) and, unless
+    disabled, the human-readable CSV next to it.
+    """
+    os.makedirs(os.path.dirname(str(csv_path)) or ".", exist_ok=True)
+
+    # CSV first: the Parquet copy is stamped with the CSV it mirrors
+    if export_csv:
+        df.to_csv(csv_path, index=False)
+
+    table = pa.Table.from_pandas(_encode(df, table_schema(csv_path)), preserve_index=False)
+    stamp = csv_stamp(csv_path)
+    if stamp is not None:
+        table = table.replace_schema_metadata(
+            {**(table.schema.metadata or {}), CSV_STAMP_KEY: stamp.encode("utf-8")}
+        )
+
+    path = parquet_path(csv_path)
+    tmp = f"{path}.tmp"
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+
+def read_table(
+    csv_path,
+    columns: Optional[List[str]] = None,
+    refresh: bool = False,
+) -> pd.DataFrame:
+    """
+    Read a table, projecting `columns` when given. Prefers the Parquet
+    copy; falls back to the CSV when it is missing or was not made from
+    the CSV as it is now (e.g. a hand-edited or appended-to CSV),
+    decoded to the same types either way. With `refresh`, a full CSV
+    read rewrites the Parquet copy.
+    """
+    path = parquet_path(csv_path)
+
+    use_parquet = os.path.exists(path) and (
+        not os.path.exists(csv_path) or parquet_stamp(path) == csv_stamp(csv_path)
+    )
+    if use_parquet:
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        df = pd.read_csv(csv_path, usecols=columns, float_precision="round_trip")
+        if columns is not None:
+            df = df[columns]
+
+    df = _decode(df, table_schema(csv_path), from_csv=not use_parquet)
+    if refresh and not use_parquet and columns is None:
+        write_table(df, csv_path, export_csv=False)
+    return df
+
+
+def read_tables(csv_paths: List[str], refresh: bool = False) -> pd.DataFrame:
+    """
+    Tables of one schema (e.g. season partitions) stacked in the given
+    order, with the same column types as a single read_table.
+    """
+    parts = [read_table(path, refresh=refresh) for path in csv_paths]
+    df = pd.concat(parts, ignore_index=True)
+    # categories differ per part: concat leaves them as plain objects
+    return _decode(df, table_schema(csv_paths[-1]), from_csv=False)
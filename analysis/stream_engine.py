@@ -0,0 +1,346 @@
+import math
+from bisect import bisect_left
+from collections import deque
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from analysis.build_cvv import window_columns
+from analysis.build_pve import RECENT_ROWS, form_mean, form_win_rate
+from analysis.build_rpmi import checkpoint_rpmi, momentum_units, window_weighted_mean
+from analysis.build_team_game_metrics import (
+    FACTS_CSV,
+    OUTPUT_CSV as METRICS_CSV,
+    STATE_WINDOW_DAYS,
+    checkpoint_team_state,
+    extract_city,
+    load_team_games,
+    roll_team_state,
+)
+from analysis.fli import fatigue_components_batch
+from analysis.layers import PVE_COLUMNS, layer_path, save_layer
+from analysis.params import DEFAULT_PARAMS, ModelParams
+from analysis.pve import expected_margin_breakdown
+from analysis.storage import write_table
+from analysis.utils import ARENA_INDEX, UNKNOWN_ARENA, travel_miles_batch, utc_today
+
+# --------------------------------------------------
+# Fused single-pass engine (FLI → PvE → RPMI → CVV)
+# --------------------------------------------------
+# The staged builders each re-sort and re-group the same rows by team and
+# date. Every one of those layers is a function of per-team chronological
+# state, so this engine walks team_game_facts once, day by day, and
+# emits the full row for each game from a compact per-team state.
+#
+# The staged builders stay the reference: outputs are identical (same
+# rows, same order, same bits), so either path can follow the other.
+
+
+class TeamState:
+    """What one team's past contributes to its next game."""
+
+    __slots__ = (
+        "last_day", "last_city", "last_arena", "recent_days",
+        "form", "played", "window", "scored",
+    )
+
+    def __init__(self, window: int = DEFAULT_PARAMS.cvv_window):
+        # FLI: rest, travel and schedule density
+        self.last_day = None
+        self.last_city = None
+        self.last_arena = UNKNOWN_ARENA
+        self.recent_days = []        # sorted game days, last STATE_WINDOW_DAYS
+
+        # PvE: running (valid games, margin sum, wins) after each of the
+        # last RECENT_ROWS history rows, so any tail is one subtraction
+        self.form = deque([(0, 0.0, 0)], maxlen=RECENT_ROWS + 1)
+        self.played = 0
+
+        # RPMI / CVV: ring buffer of the team's last scored rows (pointers
+        # into the emitted PvE rows), oldest first
+        self.window = deque(maxlen=window)
+        self.scored = 0
+
+    def push_form(self, margin: float) -> None:
+        n, total, wins = self.form[-1]
+        if not math.isnan(margin) and margin != 0:
+            n, total, wins = n + 1, total + margin, wins + (margin > 0)
+        self.form.append((n, total, wins))
+        self.played += 1
+
+    def form_tail(self, k: int):
+        """(valid games, margin sum, wins) over the last k history rows."""
+        n1, total1, wins1 = self.form[-1]
+        n0, total0, wins0 = self.form[-1 - k]
+        return n1 - n0, total1 - total0, wins1 - wins0
+
+
+NO_HISTORY = TeamState()
+
+
+def _slice_inputs(team: TeamState, opp: TeamState, team_high: bool) -> tuple:
+    """
+    Form aggregates of the shared RECENT_ROWS pre-game slice: the higher
+    team_id's rows first, the lower one's filling what is left (see
+    build_pve._form_inputs).
+    """
+    high, low = (team, opp) if team_high else (opp, team)
+    k_high = min(high.played, RECENT_ROWS)
+    k_low = min(low.played, RECENT_ROWS - k_high)
+    return (
+        team.form_tail(k_high if team_high else k_low)
+        + opp.form_tail(k_low if team_high else k_high)
+    )
+
+
+def _gather(values: np.ndarray, pointers: np.ndarray) -> np.ndarray:
+    """values[pointers] with NaN where the pointer is -1 (no such game)."""
+    return np.where(pointers >= 0, values[pointers], np.nan)
+
+
+# --------------------------------------------------
+# Engine
+# --------------------------------------------------
+
+def stream_layers(
+    games: pd.DataFrame,
+    today=None,
+    params: ModelParams = DEFAULT_PARAMS,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    One chronological pass over team_game_facts.
+
+    Returns (metrics, cvv): the team_game_metrics table and the wide
+    CVV-level frame (metrics + PvE + RPMI + CVV columns), equal to what
+    build_team_game_metrics → build_pve → compute_rpmi → compute_cvv
+    produce from the same facts, `today` (see build_pve) and `params`.
+
+    The pass only advances team state and records each row's inputs
+    (density counts, arenas, slice aggregates, window pointers); the
+    columns are then scored in batch by the stages' own kernels.
+    """
+    if games.empty:
+        raise RuntimeError("No team game facts provided.")
+
+    days = pd.to_datetime(games["game_date"], errors="coerce").to_numpy(dtype="datetime64[D]")
+    order = np.flatnonzero(~np.isnat(days))
+    order = order[np.argsort(days[order], kind="stable")]
+
+    g = games.iloc[order].reset_index(drop=True)
+    g_days = days[order].astype("int64")
+    if g.empty:
+        raise RuntimeError("team_game_metrics produced no rows.")
+
+    is_home = (g["home_away"] == "H").to_numpy()
+    host_names = np.where(is_home, g["team_name"].to_numpy(), g["opponent_name"].to_numpy())
+    margins = (g["team_points"] - g["opponent_points"]).to_numpy(dtype=np.float64)
+
+    # Only settled, complete (two-row) games get PvE and beyond
+    settled = g_days < np.datetime64(utc_today(today).date(), "D").astype("int64")
+    ids, counts = np.unique(g["game_id"].to_numpy()[settled], return_counts=True)
+    complete = set(ids[counts == 2].tolist())
+    scorable = (
+        settled & g["game_id"].isin(complete).to_numpy()
+        & ~np.isnan(margins) & (margins != 0)
+    ).tolist()
+
+    city_of = {name: extract_city(name) for name in pd.unique(host_names)}
+
+    # Plain lists: the pass below is scalar Python
+    day_list = g_days.tolist()
+    team_ids = g["team_id"].tolist()
+    opp_ids = g["opponent_id"].tolist()
+    game_ids = g["game_id"].tolist()
+    margin_list = margins.tolist()
+    hosts = host_names.tolist()
+
+    # One ring buffer serves every window (and the previous short RPMI)
+    ring = max(params.cvv_window, params.long_window, params.short_window + 1)
+    teams: Dict[object, TeamState] = {}
+    g7, g14, rest, prev_arena, cur_arena = [], [], [], [], []
+    current_city, previous_city = [], []
+    scored_rows, slices, windows, team_pos = [], [], [], []
+
+    bounds = np.flatnonzero(np.diff(g_days)) + 1
+    for lo, hi in zip([0] + bounds.tolist(), bounds.tolist() + [len(g)]):
+        day = day_list[lo]
+
+        # -----------------------------
+        # FLI (state as of the previous game)
+        # -----------------------------
+        for i in range(lo, hi):
+            st = teams.get(team_ids[i])
+            if st is None:
+                st = teams[team_ids[i]] = TeamState(ring)
+            recent = st.recent_days
+            del recent[:bisect_left(recent, day - STATE_WINDOW_DAYS)]
+            before = bisect_left(recent, day)
+
+            city = city_of[hosts[i]]
+            g7.append(before - bisect_left(recent, day - 7))
+            g14.append(before)
+            rest.append(day - st.last_day if st.last_day is not None else 5)
+            prev_arena.append(st.last_arena)
+            cur_arena.append(ARENA_INDEX.get(city, UNKNOWN_ARENA))
+            current_city.append(city)
+            previous_city.append(st.last_city)
+
+            st.recent_days.append(day)
+            st.last_day, st.last_city, st.last_arena = day, city, cur_arena[-1]
+
+        # -----------------------------
+        # PvE slice (history strictly before game day)
+        # -----------------------------
+        # RPMI / CVV step teams in PvE's game_id order
+        scored = sorted(
+            (i for i in range(lo, hi) if scorable[i]), key=game_ids.__getitem__
+        )
+        for i in scored:
+            slices.append(_slice_inputs(
+                teams[team_ids[i]],
+                teams.get(opp_ids[i], NO_HISTORY),
+                team_ids[i] > opp_ids[i],
+            ))
+
+        for i in range(lo, hi):
+            teams[team_ids[i]].push_form(margin_list[i])
+
+        # -----------------------------
+        # RPMI / CVV windows
+        # -----------------------------
+        for i in scored:
+            st = teams[team_ids[i]]
+            st.window.append(len(scored_rows))
+            windows.append([-1] * (ring - len(st.window)) + list(st.window))
+            team_pos.append(st.scored)
+            st.scored += 1
+            scored_rows.append(i)
+
+    # --------------------------------------------------
+    # Metrics table (build_team_game_metrics layout)
+    # --------------------------------------------------
+    previous_city = pd.Series(previous_city, dtype=object)
+    metrics = pd.DataFrame({
+        "game_id": g["game_id"],
+        "game_date": pd.to_datetime(g_days.astype("datetime64[D]")).date,
+        "team_id": g["team_id"],
+        "team_name": g["team_name"],
+        "opponent_id": g["opponent_id"],
+        "opponent_name": g["opponent_name"],
+        "home_away": g["home_away"],
+        "actual_margin": g["team_points"] - g["opponent_points"],
+        "current_city": pd.Series(current_city),
+        "previous_city": previous_city.where(previous_city.notna(), None),
+    })
+    fatigue = pd.DataFrame(fatigue_components_batch(
+        games_last_7=g7,
+        games_last_14=g14,
+        days_since_last_game=rest,
+        travel_miles=travel_miles_batch(prev_arena, cur_arena),
+        params=params,
+    ))
+    metrics = pd.concat([metrics, fatigue], axis=1)
+
+    if not scored_rows:
+        return metrics, pd.DataFrame()
+
+    # --------------------------------------------------
+    # PvE (shared formula, per row)
+    # --------------------------------------------------
+    wide = metrics.iloc[scored_rows].reset_index(drop=True)
+    breakdowns = []
+    for actual, home, fatigue_index, (t_n, t_sum, t_wins, o_n, o_sum, o_wins) in zip(
+        wide["actual_margin"].tolist(),
+        (wide["home_away"] == "H").tolist(),
+        wide["fatigue_index"].tolist(),
+        slices,
+    ):
+        breakdown = expected_margin_breakdown(
+            team_form=form_mean(t_n, t_sum),
+            opp_form=form_mean(o_n, o_sum),
+            team_win_rate=form_win_rate(t_n, t_wins),
+            opp_win_rate=form_win_rate(o_n, o_wins),
+            is_home=home,
+            fatigue_index=fatigue_index,
+            params=params,
+        )
+        expected = breakdown["expected_total"]
+        breakdowns.append({
+            "expected_margin": round(expected, 2),
+            "pve": round(actual - expected, 2),
+            **breakdown,
+        })
+
+    wide["game_date"] = pd.to_datetime(wide["game_date"], utc=True, errors="coerce")
+    pve_frame = pd.DataFrame(breakdowns, columns=PVE_COLUMNS)
+    for col in PVE_COLUMNS:
+        wide[col] = pve_frame[col].to_numpy()
+
+    # --------------------------------------------------
+    # RPMI / CVV from the window pointers
+    # --------------------------------------------------
+    windows = np.array(windows, dtype=np.int64)
+    team_pos = np.array(team_pos)
+    margin = margins[scored_rows]
+    pve = wide["pve"].to_numpy(dtype=np.float64)
+    units = momentum_units(margin, pve)
+    units_w = _gather(units, windows)
+
+    rpmi_s = window_weighted_mean(units_w[:, -params.short_window:], team_pos)
+    rpmi_l = window_weighted_mean(units_w[:, -params.long_window:], team_pos)
+    prev_s = _gather(rpmi_s, windows[:, -2])
+
+    wide["momentum_unit"] = units
+    wide["rpmi_short"] = rpmi_s
+    wide["rpmi_long"] = rpmi_l
+    wide["rpmi_accel"] = rpmi_s - rpmi_l
+    wide["rpmi_delta"] = np.round(rpmi_s - prev_s, 2)
+
+    cvv_w = windows[:, -params.cvv_window:]
+    cvv = window_columns(
+        _gather(margin, cvv_w), _gather(pve, cvv_w), team_pos, params.vol_scale
+    )
+    for col, values in cvv.items():
+        wide[col] = values
+
+    layout = np.lexsort((wide["game_id"], g_days[scored_rows], wide["team_id"]))
+    return metrics, wide.iloc[layout].reset_index(drop=True)
+
+
+# --------------------------------------------------
+# Entrypoint
+# --------------------------------------------------
+
+def update_fused(games: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rebuild team_game_metrics and the PvE / RPMI / CVV layers in one
+    pass and return the wide CVV frame. The FLI checkpoint is refreshed
+    too, so the staged builders can carry on incrementally from here.
+    """
+    metrics, cvv = stream_layers(games)
+    if cvv.empty:
+        raise RuntimeError("❌ Fused pass produced no PvE rows — aborting pipeline.")
+
+    write_table(metrics, METRICS_CSV)
+    checkpoint_team_state(roll_team_state(None, metrics), games)
+
+    # PvE's own layout is game by game
+    save_layer("pve", cvv.sort_values(["game_id", "team_id"], kind="stable"))
+    save_layer("rpmi", cvv)
+    checkpoint_rpmi(cvv)
+    save_layer("cvv", cvv)
+
+    print(
+        f"✅ Fused pass: {len(metrics)} metric rows, {len(cvv)} PvE/RPMI/CVV rows "
+        f"→ {METRICS_CSV}, {layer_path('cvv')}"
+    )
+    return cvv
+
+
+def main():
+    update_fused(load_team_games(FACTS_CSV))
+
+
+if __name__ == "__main__":
+    main()
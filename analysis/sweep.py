@@ -0,0 +1,235 @@
+import argparse
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from analysis.backtest import calibration
+from analysis.build_team_game_metrics import FACTS_CSV, load_team_games
+from analysis.params import DEFAULT_PARAMS, ModelParams
+from analysis.stream_engine import stream_layers
+
+# --------------------------------------------------
+# Parameter sweep
+# --------------------------------------------------
+# python -m analysis.sweep [--random 200] [--workers 8] [--top 15]
+#
+# Scores ModelParams configurations by how well the pregame expectation
+# tracks the actual margin over the facts (MAE / bias / winner hit rate,
+# see backtest.calibration). Each configuration is one fused pass
+# (stream_engine) on a process pool; the facts are packed once into a
+# shared-memory block that every worker maps, instead of being pickled
+# to each task. Tasks only carry the (tiny) ModelParams.
+#
+# Only the PvE and FLI constants move the expectation: the RPMI / CVV
+# windows can be swept too, but leave the calibration metrics as is.
+
+OUTPUT_CSV = "data/derived/param_sweep.csv"
+
+SEARCH_SPACE: Dict[str, Sequence] = {
+    "home_advantage": [3.0, 3.5, 4.0, 4.5, 5.0],
+    "fatigue_weight": [0.0, 1.5, 3.0, 4.5],
+    "max_margin": [9.0, 12.0, 15.0],
+    "travel_weight": [2, 4, 6],
+    "b2b_bonus": [4, 8, 12],
+}
+
+METRIC_COLUMNS = ["rows", "mae", "bias", "hit_rate"]
+
+
+# --------------------------------------------------
+# Configurations
+# --------------------------------------------------
+
+def grid(space: Dict[str, Sequence] = SEARCH_SPACE) -> List[ModelParams]:
+    """Every combination of the listed values (other fields at default)."""
+    names = list(space)
+    return [
+        DEFAULT_PARAMS._replace(**dict(zip(names, values)))
+        for values in itertools.product(*(space[n] for n in names))
+    ]
+
+
+def random_search(
+    n: int,
+    space: Dict[str, Sequence] = SEARCH_SPACE,
+    seed: int = 0,
+) -> List[ModelParams]:
+    """
+    n distinct random configurations. A (low, high) tuple is sampled
+    uniformly (integers if both ends are ints); a list is sampled from.
+    """
+    rng = random.Random(seed)
+
+    def draw(values):
+        if isinstance(values, tuple):
+            low, high = values
+            if isinstance(low, int) and isinstance(high, int):
+                return rng.randint(low, high)
+            return round(rng.uniform(low, high), 2)
+        return rng.choice(list(values))
+
+    configs = {}
+    for _ in range(n * 20):
+        if len(configs) == n:
+            break
+        params = DEFAULT_PARAMS._replace(**{name: draw(v) for name, v in space.items()})
+        configs.setdefault(params, None)
+    return list(configs)
+
+
+# --------------------------------------------------
+# Shared facts
+# --------------------------------------------------
+# Strings are stored as codes into small name tables that travel with
+# the block's spec; everything else is a fixed-width numeric field.
+
+FACTS_DTYPE = np.dtype([
+    ("game_id", np.int64),
+    ("game_date", "datetime64[D]"),
+    ("team_id", np.int64),
+    ("team_name", np.int32),
+    ("opponent_id", np.int64),
+    ("opponent_name", np.int32),
+    ("home_away", np.int8),
+    ("team_points", np.float64),
+    ("opponent_points", np.float64),
+])
+
+
+def share_facts(games: pd.DataFrame):
+    """Copy the facts into a new shared-memory block → (block, spec)."""
+    names = pd.unique(pd.concat([games["team_name"], games["opponent_name"]]).astype(str))
+    sides = pd.unique(games["home_away"].astype(str))
+
+    block = SharedMemory(create=True, size=max(1, len(games) * FACTS_DTYPE.itemsize))
+    packed = np.ndarray(len(games), dtype=FACTS_DTYPE, buffer=block.buf)
+    packed["game_id"] = games["game_id"].to_numpy(dtype=np.int64)
+    packed["game_date"] = pd.to_datetime(games["game_date"]).to_numpy(dtype="datetime64[D]")
+    packed["team_id"] = games["team_id"].to_numpy(dtype=np.int64)
+    packed["team_name"] = pd.Index(names).get_indexer(games["team_name"].astype(str))
+    packed["opponent_id"] = games["opponent_id"].to_numpy(dtype=np.int64)
+    packed["opponent_name"] = pd.Index(names).get_indexer(games["opponent_name"].astype(str))
+    packed["home_away"] = pd.Index(sides).get_indexer(games["home_away"].astype(str))
+    packed["team_points"] = games["team_points"].to_numpy(dtype=np.float64)
+    packed["opponent_points"] = games["opponent_points"].to_numpy(dtype=np.float64)
+    del packed   # the block must not be closed while a view is alive
+
+    return block, (block.name, len(games), names.tolist(), sides.tolist())
+
+
+def attach_facts(spec) -> pd.DataFrame:
+    """The facts frame back from a share_facts spec."""
+    name, rows, names, sides = spec
+    block = SharedMemory(name=name)
+    try:
+        packed = np.ndarray(rows, dtype=FACTS_DTYPE, buffer=block.buf)
+        names = np.asarray(names, dtype=object)
+        games = pd.DataFrame({
+            "game_id": packed["game_id"].copy(),
+            "game_date": pd.to_datetime(packed["game_date"]).date,
+            "team_id": packed["team_id"].copy(),
+            "team_name": names[packed["team_name"]],
+            "opponent_id": packed["opponent_id"].copy(),
+            "opponent_name": names[packed["opponent_name"]],
+            "home_away": np.asarray(sides, dtype=object)[packed["home_away"]],
+            "team_points": packed["team_points"].copy(),
+            "opponent_points": packed["opponent_points"].copy(),
+        })
+        del packed
+    finally:
+        block.close()
+    return games
+
+
+# --------------------------------------------------
+# Workers
+# --------------------------------------------------
+
+_FACTS: Optional[pd.DataFrame] = None
+_TODAY = None
+
+
+def _init_worker(spec, today) -> None:
+    global _FACTS, _TODAY
+    _FACTS, _TODAY = attach_facts(spec), today
+
+
+def evaluate(games: pd.DataFrame, params: ModelParams, today=None) -> Dict:
+    """Calibration of one configuration over every scored game."""
+    _, cvv = stream_layers(games, today=today, params=params)
+    if cvv.empty:
+        raise RuntimeError("No scored games to calibrate.")
+    overall = calibration(cvv).loc["all", METRIC_COLUMNS].to_dict()
+    overall["rows"] = int(overall["rows"])
+    return {**params._asdict(), **overall}
+
+
+def _evaluate(params: ModelParams) -> Dict:
+    return evaluate(_FACTS, params, _TODAY)
+
+
+def sweep(
+    games: pd.DataFrame,
+    configs: List[ModelParams],
+    workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """Evaluate configs in parallel; rows ranked by MAE (ties: config order)."""
+    # Every game so far counts as played
+    days = pd.to_datetime(games["game_date"], errors="coerce")
+    today = days.max().date() + timedelta(days=1)
+
+    block, spec = share_facts(games)
+    try:
+        workers = workers or min(len(configs), os.cpu_count() or 1)
+        with ProcessPoolExecutor(
+            max_workers=max(1, workers),
+            initializer=_init_worker,
+            initargs=(spec, today),
+        ) as pool:
+            chunk = max(1, len(configs) // (4 * max(1, workers)))
+            results = list(pool.map(_evaluate, configs, chunksize=chunk))
+    finally:
+        block.close()
+        block.unlink()
+
+    out = pd.DataFrame(results, columns=[*ModelParams._fields, *METRIC_COLUMNS])
+    return out.sort_values("mae", kind="stable").reset_index(drop=True)
+
+
+# --------------------------------------------------
+# Entrypoint
+# --------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel sweep of model constants")
+    parser.add_argument("--random", type=int, metavar="N", help="N random configs instead of the grid")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, help="process count (default: CPU count)")
+    parser.add_argument("--top", type=int, default=10, help="configurations to print")
+    args = parser.parse_args()
+
+    configs = random_search(args.random, seed=args.seed) if args.random else grid()
+    if DEFAULT_PARAMS not in configs:
+        configs.append(DEFAULT_PARAMS)   # the baseline is always scored
+
+    print(f"🧪 Sweeping {len(configs)} configurations")
+    results = sweep(load_team_games(FACTS_CSV), configs, workers=args.workers)
+    results.to_csv(OUTPUT_CSV, index=False)
+
+    baseline = results[
+        (results[list(ModelParams._fields)] == pd.Series(DEFAULT_PARAMS._asdict())).all(axis=1)
+    ].iloc[0]
+    print(f"✅ Wrote {len(results)} configurations → {OUTPUT_CSV}")
+    print(f"📏 Baseline MAE {baseline['mae']} (bias {baseline['bias']}, hit rate {baseline['hit_rate']})\n")
+    print(results.head(args.top).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+from typing import Hashable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# --------------------------------------------------
+# Date normalization
+# --------------------------------------------------
+
+def _utc_naive(values) -> pd.Series:
+    """Any game_date representation → naive UTC datetime64 (NaT on failure)."""
+    ts = pd.to_datetime(pd.Series(values), utc=True, errors="coerce", format="mixed")
+    return ts.dt.tz_localize(None).astype("datetime64[ns]")
+
+
+def _as_ns(when) -> np.ndarray:
+    return _utc_naive(np.atleast_1d(when)).to_numpy().view(np.int64)
+
+
+# --------------------------------------------------
+# Point-in-time team history
+# --------------------------------------------------
+
+class TeamHistoryIndex:
+    """
+    As-of lookups over a team-row table (facts or metrics).
+
+    Rows are sorted once by (key, game_date); every query is a binary
+    search into that order, so "what did team X look like before D"
+    costs O(log n) instead of a frame scan. Rows with unparseable dates
+    are dropped. Row order within a team/date is the input order.
+    """
+
+    def __init__(self, df: pd.DataFrame, key: str = "team_id"):
+        ts = _utc_naive(df["game_date"]).to_numpy()
+        keep = ~np.isnat(ts)
+
+        team_keys, codes = np.unique(df[key].to_numpy()[keep], return_inverse=True)
+        ts = ts[keep].view(np.int64)
+        order = np.lexsort((ts, codes))
+
+        self.key = key
+        self.frame = df[keep].iloc[order].reset_index(drop=True)
+        self.teams = pd.Index(team_keys)
+
+        self._codes = codes[order].astype(np.int64)
+        self._ts = ts[order]
+        self._uniq_ts = np.unique(self._ts)
+        self._stride = np.int64(len(self._uniq_ts) + 1)
+        self._packed = (
+            self._codes * self._stride + np.searchsorted(self._uniq_ts, self._ts)
+        )
+        self._team_start = np.searchsorted(
+            self._packed, np.arange(len(team_keys)) * self._stride
+        )
+        self._team_end = np.append(self._team_start[1:], len(self._packed))
+
+        if "actual_margin" in self.frame:
+            margin = self.frame["actual_margin"].to_numpy(dtype=np.float64)
+            self._margin = margin
+            self._cum_wins = np.concatenate([[0], np.cumsum(margin > 0)])
+            self._cum_losses = np.concatenate([[0], np.cumsum(margin < 0)])
+        else:
+            self._margin = None
+
+    # -----------------------------
+    # Vectorized positions
+    # -----------------------------
+
+    def bounds_many(self, teams, as_of, inclusive: bool = False):
+        """
+        (start, end) row positions of each team's history before `as_of`
+        (on/before when inclusive). Unknown teams get an empty range.
+        """
+        code = self.teams.get_indexer(np.atleast_1d(teams))
+        known = code >= 0
+        safe = np.where(known, code, 0)
+
+        side = "right" if inclusive else "left"
+        rank = np.searchsorted(self._uniq_ts, _as_ns(as_of), side=side)
+        end = np.searchsorted(self._packed, safe * self._stride + rank)
+
+        start = np.where(known, self._team_start[safe], 0)
+        return start, np.where(known, end, 0)
+
+    def games_played_many(self, teams, as_of, inclusive: bool = False) -> np.ndarray:
+        start, end = self.bounds_many(teams, as_of, inclusive)
+        return end - start
+
+    # -----------------------------
+    # Scalar queries
+    # -----------------------------
+
+    def games_played(self, team: Hashable, as_of, inclusive: bool = False) -> int:
+        return int(self.games_played_many([team], as_of, inclusive)[0])
+
+    def record(
+        self,
+        team: Hashable,
+        as_of,
+        since=None,
+        inclusive: bool = True,
+    ) -> Tuple[int, int]:
+        """W–L from `since` (inclusive) up to `as_of`."""
+        if self._margin is None:
+            raise KeyError("record() needs an actual_margin column")
+
+        start, end = self.bounds_many([team], as_of, inclusive)
+        lo, hi = int(start[0]), int(end[0])
+        if since is not None:
+            lo = max(lo, int(self.bounds_many([team], since)[1][0]))
+        if hi <= lo:
+            return 0, 0
+
+        wins = int(self._cum_wins[hi] - self._cum_wins[lo])
+        losses = int(self._cum_losses[hi] - self._cum_losses[lo])
+        return wins, losses
+
+    def last_margins(self, team: Hashable, as_of, n: int = 10) -> np.ndarray:
+        """Last n margins strictly before `as_of` (oldest first)."""
+        if self._margin is None:
+            raise KeyError("last_margins() needs an actual_margin column")
+
+        start, end = self.bounds_many([team], as_of)
+        lo = max(int(start[0]), int(end[0]) - n)
+        return self._margin[lo:int(end[0])]
+
+    def latest_row(self, team: Hashable, as_of=None) -> Optional[pd.Series]:
+        """Latest row on/before `as_of` (latest overall when None)."""
+        code = self.teams.get_indexer([team])[0]
+        if code < 0:
+            return None
+
+        if as_of is None:
+            end = int(self._team_end[code])
+        else:
+            end = int(self.bounds_many([team], as_of, inclusive=True)[1][0])
+
+        if end <= self._team_start[code]:
+            return None
+        return self.frame.iloc[end - 1]
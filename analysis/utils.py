@@ -1,9 +1,12 @@
 import math
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
 
+from analysis.team_history import TeamHistoryIndex
+
 
 # --------------------------------------------------
 # Game helpers (pure parsing / logic)
@@ -45,6 +48,22 @@ def margin_for_team(g: Dict, team_id: int) -> Optional[float]:
     return float(team_score - opp_score)
 
 
+# --------------------------------------------------
+# Clock
+# --------------------------------------------------
+
+def utc_today(today=None) -> pd.Timestamp:
+    """
+    The pipeline's "today" as midnight UTC: of `today` when given (date,
+    timestamp or ISO string; naive values are taken as UTC), else of
+    the current time. Games on/after it count as not played yet.
+    """
+    ts = pd.Timestamp.now("UTC") if today is None else pd.Timestamp(today)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return ts.tz_convert("UTC").normalize()
+
+
 # --------------------------------------------------
 # Math helpers
 # --------------------------------------------------
@@ -53,6 +72,19 @@ def clamp(x: float, lo: float, hi: float) -> float:
     return max(lo, min(hi, x))
 
 
+def round_values(values, ndigits: int) -> np.ndarray:
+    """
+    Element-wise built-in round() over an array (NaN stays NaN).
+
+    np.round scales by 10**ndigits first and can land on the other side
+    of a tie; vectorized stages use this where the scalar code used round().
+    """
+    return np.array(
+        [round(v, ndigits) for v in np.asarray(values, dtype=np.float64).tolist()],
+        dtype=np.float64,
+    )
+
+
 # --------------------------------------------------
 # Debug helpers (NO alternative logic)
 # --------------------------------------------------
@@ -161,18 +193,118 @@ def travel_miles(city_a: Optional[str], city_b: Optional[str]) -> Optional[float
     return haversine_miles(*CITY_COORDS[city_a], *CITY_COORDS[city_b])
 
 
+# --------------------------------------------------
+# Arena registry (vectorized travel)
+# --------------------------------------------------
+
+TEAM_CITY = {
+    "Atlanta Hawks": "Atlanta",
+    "Boston Celtics": "Boston",
+    "Brooklyn Nets": "Brooklyn",
+    "Charlotte Hornets": "Charlotte",
+    "Chicago Bulls": "Chicago",
+    "Cleveland Cavaliers": "Cleveland",
+    "Dallas Mavericks": "Dallas",
+    "Denver Nuggets": "Denver",
+    "Detroit Pistons": "Detroit",
+    "Golden State Warriors": "San Francisco",
+    "Houston Rockets": "Houston",
+    "Indiana Pacers": "Indianapolis",
+    "LA Clippers": "Los Angeles",
+    "Los Angeles Lakers": "Los Angeles",
+    "Memphis Grizzlies": "Memphis",
+    "Miami Heat": "Miami",
+    "Milwaukee Bucks": "Milwaukee",
+    "Minnesota Timberwolves": "Minneapolis",
+    "New Orleans Pelicans": "New Orleans",
+    "New York Knicks": "New York",
+    "Oklahoma City Thunder": "Oklahoma City",
+    "Orlando Magic": "Orlando",
+    "Philadelphia 76ers": "Philadelphia",
+    "Phoenix Suns": "Phoenix",
+    "Portland Trail Blazers": "Portland",
+    "Sacramento Kings": "Sacramento",
+    "San Antonio Spurs": "San Antonio",
+    "Toronto Raptors": "Toronto",
+    "Utah Jazz": "Salt Lake City",
+    "Washington Wizards": "Washington",
+}
+
+UNKNOWN_ARENA = -1
+
+ARENA_CITIES = np.array(list(CITY_COORDS), dtype=object)
+ARENA_INDEX = {city: i for i, city in enumerate(ARENA_CITIES)}
+
+
+def _build_arena_distances() -> np.ndarray:
+    """N×N float32 great-circle miles between arena cities (haversine_miles)."""
+    n = len(ARENA_CITIES)
+    out = np.zeros((n, n), dtype=np.float32)
+    for i, a in enumerate(ARENA_CITIES):
+        for j, b in enumerate(ARENA_CITIES):
+            out[i, j] = haversine_miles(*CITY_COORDS[a], *CITY_COORDS[b])
+    return out
+
+
+ARENA_DISTANCES = _build_arena_distances()
+
+
+def arena_index(cities) -> np.ndarray:
+    """City names → arena index (missing / unknown → UNKNOWN_ARENA)."""
+    return np.array(
+        [ARENA_INDEX.get(c, UNKNOWN_ARENA) if isinstance(c, str) else UNKNOWN_ARENA
+         for c in cities],
+        dtype=np.int64,
+    )
+
+
+def team_arena_registry(team_ids, team_names) -> Dict[int, int]:
+    """
+    team_id → home arena index.
+
+    Ids are not stable across providers, so the registry is built from the
+    (id, name) pairs present in the data. Unknown team names raise KeyError.
+    """
+    pairs = pd.DataFrame({"team_id": team_ids, "team_name": team_names})
+    pairs = pairs.drop_duplicates()
+    return {
+        team_id: ARENA_INDEX.get(TEAM_CITY[name], UNKNOWN_ARENA)
+        for team_id, name in zip(pairs["team_id"], pairs["team_name"])
+    }
+
+
+def travel_miles_batch(arena_a: np.ndarray, arena_b: np.ndarray) -> np.ndarray:
+    """
+    Column-wise travel_miles on arena indices: one fancy-index lookup.
+    Any UNKNOWN_ARENA side yields NaN.
+    """
+    arena_a = np.asarray(arena_a, dtype=np.int64)
+    arena_b = np.asarray(arena_b, dtype=np.int64)
+    known = (arena_a != UNKNOWN_ARENA) & (arena_b != UNKNOWN_ARENA)
+
+    out = np.full(arena_a.shape, np.nan)
+    # float32 storage → back to the 0.1-mile values haversine_miles returns
+    out[known] = np.round(
+        ARENA_DISTANCES[arena_a[known], arena_b[known]].astype(np.float64), 1
+    )
+    return out
+
+
 # --------------------------------------------------
 # Season record helper (safe, aligned)
 # --------------------------------------------------
 
 def season_record(
-    df: pd.DataFrame,
+    df: Union[pd.DataFrame, TeamHistoryIndex],
     team_name: str,
     cutoff_date,
 ) -> Tuple[int, int]:
     """
     Season W–L record up to cutoff_date.
     Uses actual_margin from pipeline.
+
+    Pass a TeamHistoryIndex keyed by team_name when calling per game;
+    a DataFrame is indexed on the fly.
     """
     cutoff = pd.to_datetime(cutoff_date)
 
@@ -183,13 +315,79 @@ def season_record(
 
     season_start = pd.Timestamp(year=season_start_year, month=10, day=1)
 
-    team_games = df[
-        (df["team_name"] == team_name)
-        & (pd.to_datetime(df["game_date"]) >= season_start)
-        & (pd.to_datetime(df["game_date"]) <= cutoff)
-    ]
+    history = (
+        df if isinstance(df, TeamHistoryIndex)
+        else TeamHistoryIndex(df, key="team_name")
+    )
+    return history.record(team_name, cutoff, since=season_start)
+
+
+# --------------------------------------------------
+# Dirty-range helpers (recompute only from a date on)
+# --------------------------------------------------
+
+ROW_KEY = ["game_id", "team_id"]
+
 
-    wins = int((team_games["actual_margin"] > 0).sum())
-    losses = int((team_games["actual_margin"] < 0).sum())
+def read_stage_csv(path: str) -> pd.DataFrame:
+    """Stage output reader; round_trip keeps unrounded floats bit-exact."""
+    return pd.read_csv(path, float_precision="round_trip")
 
-    return wins, losses
+
+def on_or_after(dates, since) -> np.ndarray:
+    """game_date (any representation) >= since, compared as UTC calendar days."""
+    ts = pd.to_datetime(pd.Series(dates), utc=True, errors="coerce", format="mixed")
+    return (ts.dt.tz_localize(None) >= pd.Timestamp(since)).to_numpy()
+
+
+def fresh_rows(df: pd.DataFrame, previous: Optional[pd.DataFrame], since) -> np.ndarray:
+    """
+    Rows that must be recomputed: on/after `since`, or not in the
+    previous output. Everything is fresh without a previous output.
+    """
+    if previous is None or since is None:
+        return np.ones(len(df), dtype=bool)
+
+    known = pd.MultiIndex.from_frame(df[ROW_KEY]).isin(
+        pd.MultiIndex.from_frame(previous[ROW_KEY])
+    )
+    return ~known | on_or_after(df["game_date"], since)
+
+
+def with_lookback(team_pos: np.ndarray, fresh: np.ndarray, lookback: int) -> np.ndarray:
+    """
+    Fresh rows plus the `lookback` rows before each of them in the same
+    team, for a frame laid out team by team (chronological).
+    """
+    need = fresh.copy()
+    for lag in range(1, lookback + 1):
+        ahead = np.zeros(len(fresh), dtype=bool)
+        ahead[:-lag] = fresh[lag:] & (team_pos[lag:] >= lag)
+        need |= ahead
+    return need
+
+
+def splice_columns(
+    df: pd.DataFrame,
+    computed: Dict[str, np.ndarray],
+    rows: np.ndarray,
+    fresh: np.ndarray,
+    previous: Optional[pd.DataFrame],
+) -> pd.DataFrame:
+    """
+    Add float stage columns to `df`: fresh rows from `computed` (laid out
+    over df[rows]), settled rows copied from the previous output.
+    """
+    if previous is None:
+        for col, values in computed.items():
+            df[col] = values
+        return df
+
+    settled = previous.set_index(ROW_KEY)
+    key = pd.MultiIndex.from_frame(df[ROW_KEY])
+    take = fresh[rows]
+    for col, values in computed.items():
+        out = settled[col].reindex(key).to_numpy(dtype=np.float64, copy=True)
+        out[fresh] = values[take]
+        df[col] = out
+    return df
@@ -1,15 +1,21 @@
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Dict
+
 import pandas as pd
 
 from scripts.ingest.data_provider import fetch_games_range
 from analysis.utils import game_date, is_completed
+from scripts.ingest.facts_store import FACTS_COLUMNS, FactsStore
 
 # --------------------------------------------------
 # Project root
 # --------------------------------------------------
 BASE_DIR = Path(__file__).resolve().parents[2]
 FACTS_PATH = BASE_DIR / "data" / "core" / "team_game_facts.csv"
+SEASONS_DIR = BASE_DIR / "data" / "core" / "seasons"
+
+SEASON_START = pd.to_datetime("2025-10-01").date()
 
 # --------------------------------------------------
 # Official NBA team name mapping
@@ -55,40 +61,8 @@ def normalize_team_names(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def main():
-    TODAY_UTC = datetime.utcnow().date()
-
-    # --------------------------------------------------
-    # Rolling UTC backfill window (authoritative)
-    # --------------------------------------------------
-    BACKFILL_DAYS = 4
-    start_date = TODAY_UTC - timedelta(days=BACKFILL_DAYS)
-    end_date = TODAY_UTC
-
-    # --------------------------------------------------
-    # Load existing facts (if any)
-    # --------------------------------------------------
-    if FACTS_PATH.exists():
-        existing = pd.read_csv(FACTS_PATH)
-        existing["game_date"] = pd.to_datetime(
-            existing["game_date"], errors="coerce"
-        ).dt.date
-    else:
-        existing = None
-
-    # --------------------------------------------------
-    # Fetch games (API UTC → UTC calendar date)
-    # --------------------------------------------------
-    games = fetch_games_range(start_date.isoformat(), end_date.isoformat())
-    games = [g for g in games if is_completed(g)]
-
-    if not games:
-        print("No completed games found.")
-        return
-
-    # --------------------------------------------------
-    # Normalize to team-level rows (UTC calendar date)
-    # --------------------------------------------------
+def games_to_rows(games) -> pd.DataFrame:
+    """API game objects → team-level fact rows (H and A), UTC calendar date."""
     rows = []
     for g in games:
         gd = game_date(g)  # UTC calendar date
@@ -120,45 +94,101 @@ def main():
             },
         ])
 
-    new_df = pd.DataFrame(rows)
-    new_df = normalize_team_names(new_df)
-    new_df["game_date"] = pd.to_datetime(
-        new_df["game_date"], errors="coerce"
-    ).dt.date
+    df = normalize_team_names(pd.DataFrame(rows, columns=FACTS_COLUMNS))
+    df["game_date"] = pd.to_datetime(df["game_date"], errors="coerce").dt.date
+    return df
+
+
+# --------------------------------------------------
+# Season partitions
+# --------------------------------------------------
+# FACTS_PATH (what the pipeline reads) holds every season from
+# SEASON_START on, so the current season is always there and the daily
+# ingest keeps feeding it across the season rollover. Earlier seasons
+# loaded by the backfill go to SEASONS_DIR.
+
+def season_of(d) -> int:
+    """NBA season by starting year: games from August on open a new season."""
+    return d.year if d.month >= 8 else d.year - 1
+
+
+def season_facts_path(season: int) -> Path:
+    if season >= SEASON_START.year:
+        return FACTS_PATH
+    return SEASONS_DIR / f"team_game_facts_{season}-{(season + 1) % 100:02d}.csv"
+
+
+def upsert_seasons(rows: pd.DataFrame, stores: Dict[Path, FactsStore]) -> Dict[int, object]:
+    """
+    Upsert fact rows into their season's store (opened on demand into
+    `stores`, one per file). Returns {season: earliest changed game_date}.
+    """
+    # Same safety filter as the daily ingest for the current season
+    seasons = rows["game_date"].map(season_of)
+    keep = (rows["game_date"] >= SEASON_START) | (seasons < SEASON_START.year)
+    rows, seasons = rows[keep], seasons[keep]
+
+    changed = {}
+    for season, part in rows.groupby(seasons):
+        path = season_facts_path(season)
+        if path not in stores:
+            stores[path] = FactsStore(path)
+        since = stores[path].upsert(part)
+        if since is not None:
+            changed[season] = since
+    return changed
+
+
+def main():
+    """
+    Append the backfill window; returns the earliest changed game_date in
+    FACTS_PATH (or None). Rows of earlier seasons go to their season
+    file, exactly as the backfill routes them.
+    """
+    TODAY_UTC = datetime.utcnow().date()
 
     # --------------------------------------------------
-    # Merge + dedupe (canonical key = game_id + team_id)
+    # Rolling UTC backfill window (authoritative)
     # --------------------------------------------------
-    if existing is not None:
-        combined = pd.concat([existing, new_df], ignore_index=True)
-    else:
-        combined = new_df
+    BACKFILL_DAYS = 4
+    start_date = TODAY_UTC - timedelta(days=BACKFILL_DAYS)
+    end_date = TODAY_UTC
 
-    combined = combined.drop_duplicates(
-        subset=["game_id", "team_id"], keep="last"
-    )
+    # --------------------------------------------------
+    # Fetch games (API UTC → UTC calendar date)
+    # --------------------------------------------------
+    games = fetch_games_range(start_date.isoformat(), end_date.isoformat())
+    games = [g for g in games if is_completed(g)]
 
-    combined = combined.sort_values(
-        ["game_date", "game_id"], ascending=[True, True]
-    )
+    if not games:
+        print("No completed games found.")
+        return None
 
     # --------------------------------------------------
-    # Season safety filter (UTC calendar)
+    # Normalize to team-level rows (UTC calendar date)
     # --------------------------------------------------
-    combined = combined[
-        combined["game_date"] >= pd.to_datetime("2025-10-01").date()
-    ]
+    new_df = games_to_rows(games)
 
     # --------------------------------------------------
-    # Save (UTC calendar date, no timezone)
+    # Upsert per season (primary key = game_id + team_id): new games
+    # are appended, backfill edits rewrite only the tail they touch.
+    # upsert_seasons applies the season safety filter (UTC calendar).
     # --------------------------------------------------
-    FACTS_PATH.parent.mkdir(parents=True, exist_ok=True)
-    combined.to_csv(FACTS_PATH, index=False)
+    stores: Dict[Path, FactsStore] = {}
+    changed = upsert_seasons(new_df, stores)
 
     print(
         f"✅ Ingested games from {start_date} → {end_date} "
         f"({len(new_df)} team-rows, UTC canonical)"
     )
+    for path in sorted(stores):
+        if path != FACTS_PATH:
+            print(f"   earlier season → {path}")
+
+    live = [d for season, d in changed.items() if season_facts_path(season) == FACTS_PATH]
+    since = min(live) if live else None
+    print(f"   earliest changed game_date: {since if since is not None else 'none'}")
+    return since
 
 
 if __name__ == "__main__":
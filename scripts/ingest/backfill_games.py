@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from scripts.ingest.append_daily_games import BASE_DIR, games_to_rows, upsert_seasons
+from scripts.ingest.data_provider import fetch_games_range
+from scripts.ingest.facts_store import FactsStore
+from analysis.utils import is_completed
+
+# --------------------------------------------------
+# Historical backfill (multi-season, resumable)
+# --------------------------------------------------
+# python -m scripts.ingest.backfill_games --start 2022-10-01 --end 2025-06-30
+#
+# The range is split into CHUNK_DAYS chunks fetched in parallel (all
+# requests share data_provider's rate limiter). Each finished chunk is
+# upserted into its season's facts file and checkpointed, so a rerun
+# after an interruption only fetches what is left.
+
+CHECKPOINT_JSON = BASE_DIR / "data" / "raw" / "backfill_checkpoint.json"
+
+CHUNK_DAYS = 14
+CHUNK_WORKERS = 4
+
+
+def date_chunks(start: date, end: date, days: int = CHUNK_DAYS) -> List[Tuple[date, date]]:
+    """[start, end] as consecutive inclusive chunks of at most `days` days."""
+    chunks = []
+    lo = start
+    while lo <= end:
+        hi = min(end, lo + timedelta(days=days - 1))
+        chunks.append((lo, hi))
+        lo = hi + timedelta(days=1)
+    return chunks
+
+
+def chunk_key(chunk: Tuple[date, date]) -> str:
+    return f"{chunk[0].isoformat()}_{chunk[1].isoformat()}"
+
+
+def load_checkpoint(path: Path = CHECKPOINT_JSON) -> Dict[str, int]:
+    """Completed chunk → team-rows it held."""
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("done", {})
+
+
+def save_checkpoint(done: Dict[str, int], path: Path = CHECKPOINT_JSON) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"done": done}, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _fetch_chunk(chunk: Tuple[date, date]):
+    # One page-worker per chunk: the parallelism is across chunks
+    games = fetch_games_range(chunk[0].isoformat(), chunk[1].isoformat(), max_workers=1)
+    return games_to_rows([g for g in games if is_completed(g)])
+
+
+def backfill(
+    start: date,
+    end: date,
+    chunk_days: int = CHUNK_DAYS,
+    workers: int = CHUNK_WORKERS,
+    checkpoint: Path = CHECKPOINT_JSON,
+) -> Dict[int, object]:
+    """
+    Load every completed game in [start, end] into season-partitioned
+    facts. Returns {season: earliest changed game_date} for the seasons
+    that changed.
+    """
+    done = load_checkpoint(checkpoint)
+    todo = [c for c in date_chunks(start, end, chunk_days) if chunk_key(c) not in done]
+    print(f"🗂️  Backfill {start} → {end}: {len(todo)} chunks to fetch, "
+          f"{len(date_chunks(start, end, chunk_days)) - len(todo)} already done")
+
+    stores: Dict[Path, FactsStore] = {}
+    changed: Dict[int, object] = {}
+
+    pool = ThreadPoolExecutor(max_workers=max(1, workers))
+    futures = {pool.submit(_fetch_chunk, c): c for c in todo}
+    try:
+        # Writes stay on this thread, one chunk at a time
+        for future in as_completed(futures):
+            chunk = futures[future]
+            rows = future.result()
+
+            for season, since in upsert_seasons(rows, stores).items():
+                changed[season] = min(since, changed.get(season, since))
+
+            done[chunk_key(chunk)] = len(rows)
+            save_checkpoint(done, checkpoint)
+            print(f"   ✓ {chunk[0]} → {chunk[1]}: {len(rows)} team-rows")
+    except BaseException:
+        # Completed chunks are checkpointed; don't fetch the rest now
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+
+    for path in sorted(stores):
+        print(f"✅ {len(stores[path])} team-rows → {path}")
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill historical games into season facts")
+    parser.add_argument("--start", required=True, type=date.fromisoformat, help="YYYY-MM-DD")
+    parser.add_argument("--end", required=True, type=date.fromisoformat, help="YYYY-MM-DD")
+    parser.add_argument("--chunk-days", type=int, default=CHUNK_DAYS)
+    parser.add_argument("--workers", type=int, default=CHUNK_WORKERS)
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="ignore the checkpoint and refetch every chunk",
+    )
+    args = parser.parse_args()
+
+    if args.start > args.end:
+        parser.error("--start must not be after --end")
+    if args.restart and CHECKPOINT_JSON.exists():
+        CHECKPOINT_JSON.unlink()
+
+    backfill(args.start, args.end, chunk_days=args.chunk_days, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,105 @@
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
 import requests
-from typing import List, Dict
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+
+from scripts.ingest import http_cache
+from scripts.ingest.rate_limit import TokenBucket, backoff_delay, parse_retry_after
 load_dotenv()
 
 # --------------------------------------------------
 # API configuration
 # --------------------------------------------------
 API_URL = "https://api.balldontlie.io/v1/games"
-API_KEY = os.getenv("BALLDONTLIE_API_KEY")
 
-if not API_KEY:
-    raise RuntimeError(
-        "BALLDONTLIE_API_KEY environment variable is not set"
-    )
 
-HEADERS = {
-    "Authorization": API_KEY
-}
+def api_headers() -> Dict[str, str]:
+    """Auth headers; the key is only required once a request is made."""
+    api_key = os.getenv("BALLDONTLIE_API_KEY")
+    if not api_key:
+        raise RuntimeError(
+            "BALLDONTLIE_API_KEY environment variable is not set"
+        )
+    return {"Authorization": api_key}
 
 # --------------------------------------------------
-# Internal GET helper (rate-limit safe)
+# Pooled HTTP session
 # --------------------------------------------------
-def _get(params: Dict, timeout: int = 30) -> requests.Response:
-    resp = requests.get(
-        API_URL,
-        headers=HEADERS,
-        params=params,
-        timeout=timeout
-    )
+MAX_WORKERS = 4          # concurrent page requests once total_pages is known
 
-    # Handle rate limiting
-    if resp.status_code == 429:
-        time.sleep(1)
-        resp = requests.get(
-            API_URL,
-            headers=HEADERS,
-            params=params,
-            timeout=timeout
-        )
+_session = None
+_session_lock = threading.Lock()
 
-    if resp.status_code != 200:
-        raise RuntimeError(
-            f"BallDontLie API error "
-            f"status={resp.status_code} "
-            f"params={params} "
-            f"body={resp.text}"
-        )
 
-    return resp
+def get_session() -> requests.Session:
+    """Shared keep-alive session, pooled for MAX_WORKERS connections."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(api_headers())
+            _session = session
+        return _session
+
+
+# --------------------------------------------------
+# Shared rate limiter (every API call goes through api_get)
+# --------------------------------------------------
+REQUESTS_PER_MIN = float(os.getenv("BALLDONTLIE_REQUESTS_PER_MIN", "60"))
+MAX_RETRIES = 6
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+RATE_LIMITER = TokenBucket(REQUESTS_PER_MIN)
+
+
+def api_get(params: Dict, api_url: Optional[str] = None, timeout: int = 30) -> requests.Response:
+    """
+    GET through the shared session and rate limiter. 429 / 5xx and
+    connection errors are retried with jittered exponential backoff,
+    honoring Retry-After; a 429 also pauses every other caller.
+    """
+    if http_cache.http_mode() == "replay":
+        raise RuntimeError(f"Replay mode: no network access (params={params})")
+
+    url = api_url or API_URL
+    session = get_session()
+
+    for attempt in range(MAX_RETRIES + 1):
+        RATE_LIMITER.acquire()
+        try:
+            resp = session.get(url, params=params, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(backoff_delay(attempt))
+            continue
+
+        if resp.status_code == 200:
+            return resp
+        if resp.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+            break
+
+        delay = backoff_delay(attempt, parse_retry_after(resp.headers.get("Retry-After")))
+        if resp.status_code == 429:
+            RATE_LIMITER.pause(delay)
+        else:
+            time.sleep(delay)
+
+    raise RuntimeError(
+        f"BallDontLie API error "
+        f"status={resp.status_code} "
+        f"params={params} "
+        f"body={resp.text}"
+    )
+
 
 # --------------------------------------------------
 # Public fetch function
@@ -57,41 +107,56 @@ def _get(params: Dict, timeout: int = 30) -> requests.Response:
 def fetch_games_range(
     start_date: str,
     end_date: str,
-    sleep_sec: float = 0.15
+    max_workers: int = MAX_WORKERS,
+    api_url: Optional[str] = None,
 ) -> List[Dict]:
     """
     Fetch all games between start_date and end_date (inclusive).
 
     Dates must be ISO format: YYYY-MM-DD
-    Returns raw API game objects (no transformation).
-    """
+    Returns raw API game objects (no transformation), in page order.
 
-    all_games: List[Dict] = []
-    page = 1
-
-    while True:
-        params = {
-            "start_date": start_date,
-            "end_date": end_date,
-            "per_page": 100,
-            "page": page,
-            "sort": "-date"
-        }
-
-        payload = _get(params).json()
-        data = payload.get("data", [])
-        meta = payload.get("meta", {})
-
-        if not data:
-            break
+    Page 1 tells total_pages; the remaining pages are fetched
+    concurrently over the pooled session (at most `max_workers` in
+    flight, paced by RATE_LIMITER). `api_url` overrides the endpoint,
+    e.g. for a local stand-in server.
 
-        all_games.extend(data)
+    Fetched pages are recorded in the HTTP cache (see http_cache.py);
+    final or recent ranges are served from it, and replay mode serves
+    everything from it without a network call or API key.
+    """
+    mode = http_cache.http_mode()
+    if mode == "replay":
+        return http_cache.replay(start_date, end_date)
+    if mode == "record":
+        cached = http_cache.lookup(start_date, end_date)
+        if cached is not None:
+            return cached
+
+    base = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "per_page": 100,
+        "sort": "-date"
+    }
+
+    def fetch_page(page: int) -> Dict:
+        return api_get({**base, "page": page}, api_url=api_url).json()
+
+    pages = [fetch_page(1)]
+
+    total_pages = pages[0].get("meta", {}).get("total_pages") or 1
+    if pages[0].get("data") and total_pages > 1:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            # map() yields in page order regardless of completion order
+            pages.extend(pool.map(fetch_page, range(2, total_pages + 1)))
 
-        total_pages = meta.get("total_pages")
-        if total_pages is None or page >= total_pages:
+    all_games: List[Dict] = []
+    for i, page in enumerate(pages):
+        if not page.get("data"):
+            pages = pages[:i]
             break
+        all_games.extend(page["data"])
 
-        page += 1
-        time.sleep(sleep_sec)
-
+    http_cache.record(start_date, end_date, pages)
     return all_games
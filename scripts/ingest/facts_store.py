@@ -0,0 +1,238 @@
+import json
+import os
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from analysis.storage import FACTS_SCHEMA
+
+# --------------------------------------------------
+# Append-oriented facts store
+# --------------------------------------------------
+# team_game_facts.csv stays a plain CSV sorted by (game_date, game_id).
+# Next to it:
+#   .idx      fixed-width primary-key index, one record per CSV row
+#             (game_id, team_id, day, byte offset), in file order
+#   .journal  redo record of an in-flight write (tail offset + new tail)
+#
+# An upsert only touches rows from the first one that has to move: new
+# games append, backfill edits rewrite a short tail. Both files are
+# changed through the journal, so a crash mid-write is replayed on open.
+
+KEY = ["game_id", "team_id"]
+FACTS_COLUMNS = list(FACTS_SCHEMA)
+
+INDEX_DTYPE = np.dtype([
+    ("game_id", "<i8"),
+    ("team_id", "<i8"),
+    ("day", "<i4"),       # days since 1970-01-01
+    ("offset", "<i8"),    # byte offset of the row in the CSV
+])
+
+
+def _days(dates) -> np.ndarray:
+    ts = pd.to_datetime(pd.Series(dates), errors="coerce")
+    return ts.to_numpy(dtype="datetime64[D]").astype(np.int32)
+
+
+def _order(day: np.ndarray, game_id: np.ndarray) -> np.ndarray:
+    """File order (game_date, game_id) as one sortable int64."""
+    return (day.astype(np.int64) << 32) | game_id.astype(np.int64)
+
+
+def _lines(rows: pd.DataFrame) -> List[bytes]:
+    text = rows.to_csv(index=False, header=False, lineterminator="\n")
+    return text.encode("utf-8").splitlines(keepends=True)
+
+
+def _fsync_write(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class FactsStore:
+    """Team-game facts keyed on (game_id, team_id), upserted in place."""
+
+    def __init__(self, path, columns: List[str] = FACTS_COLUMNS):
+        self.path = Path(path)
+        self.index_path = self.path.with_suffix(".idx")
+        self.journal_path = self.path.with_suffix(".journal")
+
+        if not self.path.exists():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            _fsync_write(self.path, (",".join(columns) + "\n").encode("utf-8"))
+            _fsync_write(self.index_path, b"")
+
+        with open(self.path, "rb") as f:
+            header = f.readline()
+        self.columns = header.decode("utf-8").rstrip("\r\n").split(",")
+
+        if self.journal_path.exists():
+            self._replay()
+        self.index = self._load_index()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    # --------------------------------------------------
+    # Index
+    # --------------------------------------------------
+
+    def _load_index(self) -> np.ndarray:
+        # Same staleness rule as the Parquet copies: a CSV edited by hand
+        # after the last write gets its index rebuilt.
+        if self.index_path.exists() and (
+            self.index_path.stat().st_mtime_ns >= self.path.stat().st_mtime_ns
+        ):
+            index = np.fromfile(self.index_path, dtype=INDEX_DTYPE)
+            if self._ends_at_last_row(index):
+                return index
+        return self._rebuild_index()
+
+    def _ends_at_last_row(self, index: np.ndarray) -> bool:
+        """Cheap consistency probe: the last indexed row is the CSV's last line."""
+        size = self.path.stat().st_size
+        start = int(index["offset"][-1]) if len(index) else None
+        with open(self.path, "rb") as f:
+            if start is None:
+                return len(f.readline()) == size
+            if not 0 < start < size:
+                return False
+            f.seek(start - 1)
+            tail = f.read()
+        return tail.startswith(b"\n") and tail.count(b"\n") == 2 and tail.endswith(b"\n")
+
+    def _rebuild_index(self) -> np.ndarray:
+        raw = self.path.read_bytes()
+        if raw and not raw.endswith(b"\n"):
+            raw += b"\n"
+            _fsync_write(self.path, raw)
+
+        ends = np.flatnonzero(np.frombuffer(raw, dtype=np.uint8) == ord("\n"))
+        df = pd.read_csv(self.path, usecols=["game_id", "team_id", "game_date"])
+
+        index = np.empty(len(df), dtype=INDEX_DTYPE)
+        index["game_id"] = df["game_id"].to_numpy()
+        index["team_id"] = df["team_id"].to_numpy()
+        index["day"] = _days(df["game_date"])
+        index["offset"] = ends[:-1][:len(df)] + 1
+        _fsync_write(self.index_path, index.tobytes())
+        return index
+
+    def lookup(self, keys: pd.DataFrame) -> np.ndarray:
+        """Row numbers of (game_id, team_id) keys; -1 when absent."""
+        stored = pd.MultiIndex.from_arrays([self.index["game_id"], self.index["team_id"]])
+        return stored.get_indexer(pd.MultiIndex.from_frame(keys[KEY]))
+
+    def _read_lines(self, positions: np.ndarray) -> List[Optional[bytes]]:
+        out = []
+        with open(self.path, "rb") as f:
+            for p in positions:
+                if p < 0:
+                    out.append(None)
+                    continue
+                f.seek(int(self.index["offset"][p]))
+                out.append(f.readline())
+        return out
+
+    # --------------------------------------------------
+    # Writes
+    # --------------------------------------------------
+
+    def upsert(self, rows: pd.DataFrame):
+        """
+        Insert new (game_id, team_id) rows and replace changed ones.
+        Returns the earliest game_date whose rows changed (None if none).
+        """
+        rows = rows[self.columns].drop_duplicates(subset=KEY, keep="last")
+        if rows.empty:
+            return None
+
+        lines = _lines(rows)
+        pos = self.lookup(rows)
+        changed = np.array(
+            [old != new for old, new in zip(self._read_lines(pos), lines)], dtype=bool
+        )
+        if not changed.any():
+            return None
+
+        rows = rows[changed]
+        lines = [line for line, c in zip(lines, changed) if c]
+        pos = pos[changed]
+        days = _days(rows["game_date"])
+        game_ids = rows["game_id"].to_numpy()
+
+        # First stored row that moves: a replaced row, or where a new row
+        # sorts in (after equal keys, as a stable sort of old + new would)
+        stored_order = _order(self.index["day"], self.index["game_id"])
+        new_order = _order(days, game_ids)
+        cut = int(np.searchsorted(stored_order, new_order, side="right").min())
+        replaced = pos[pos >= 0]
+        if len(replaced):
+            cut = min(cut, int(replaced.min()))
+
+        touched = np.concatenate([days, self.index["day"][replaced]])
+        since = pd.Timestamp(int(touched.min()), unit="D").date()
+
+        self._rewrite_tail(cut, replaced, rows, lines, new_order)
+        return since
+
+    def _rewrite_tail(self, cut, replaced, rows, lines, new_order) -> None:
+        start = int(self.index["offset"][cut]) if cut < len(self.index) else self.path.stat().st_size
+
+        # Surviving stored rows of the tail, then the upserted ones
+        keep = np.ones(len(self.index) - cut, dtype=bool)
+        keep[replaced - cut] = False
+        old = self.index[cut:][keep]
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            old_lines = f.read().splitlines(keepends=True)
+        old_lines = [line for line, k in zip(old_lines, keep) if k]
+
+        order = np.argsort(
+            np.concatenate([_order(old["day"], old["game_id"]), new_order]), kind="stable"
+        )
+        all_lines = old_lines + lines
+
+        new = np.empty(len(rows), dtype=INDEX_DTYPE)
+        new["game_id"] = rows["game_id"].to_numpy()
+        new["team_id"] = rows["team_id"].to_numpy()
+        new["day"] = _days(rows["game_date"])
+
+        tail = np.concatenate([old, new])[order]
+        data = [all_lines[i] for i in order]
+        tail["offset"] = start + np.concatenate([[0], np.cumsum([len(x) for x in data])[:-1]])
+
+        self._commit(start, cut, b"".join(data), tail)
+
+    def _commit(self, offset: int, cut: int, data: bytes, tail: np.ndarray) -> None:
+        head = json.dumps({"offset": offset, "cut": cut, "size": len(data)}).encode("utf-8")
+        _fsync_write(self.journal_path, head + b"\n" + data + tail.tobytes())
+        self._replay()
+
+    def _replay(self) -> None:
+        """Apply the journal (idempotent), then drop it."""
+        with open(self.journal_path, "rb") as f:
+            head = json.loads(f.readline())
+            data = f.read(head["size"])
+            tail = f.read()
+
+        for path, offset, payload in (
+            (self.path, head["offset"], data),
+            (self.index_path, head["cut"] * INDEX_DTYPE.itemsize, tail),
+        ):
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+                f.seek(offset)
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+
+        os.remove(self.journal_path)
+        self.index = np.fromfile(self.index_path, dtype=INDEX_DTYPE)
@@ -0,0 +1,148 @@
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# --------------------------------------------------
+# Record / replay cache for /games pages
+# --------------------------------------------------
+# One entry per fetched date range: the raw page payloads as gzipped
+# NDJSON (one page per line) under CACHE_DIR, indexed in index.json.
+#
+#   final entries  range ended before today and every game is Final →
+#                  never expire
+#   other entries  expire after CACHE_TTL_HOURS
+#
+# BALLDONTLIE_HTTP_MODE:
+#   record (default)  serve fresh entries, fetch + record the rest
+#   replay            cache only, never touches the network or the key
+#   live              always fetch (still records)
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+CACHE_DIR = Path(os.getenv("BALLDONTLIE_CACHE_DIR", BASE_DIR / "data" / "raw" / "api_cache"))
+CACHE_TTL_HOURS = float(os.getenv("BALLDONTLIE_CACHE_TTL_HOURS", "6"))
+
+MODES = ("record", "replay", "live")
+
+_index_lock = threading.Lock()
+
+
+def http_mode() -> str:
+    mode = os.getenv("BALLDONTLIE_HTTP_MODE", "record").strip().lower()
+    if mode not in MODES:
+        raise ValueError(f"BALLDONTLIE_HTTP_MODE must be one of {MODES}, got {mode!r}")
+    return mode
+
+
+def _index_path(cache_dir: Path) -> Path:
+    return cache_dir / "index.json"
+
+
+def _load_index(cache_dir: Path) -> Dict[str, dict]:
+    path = _index_path(cache_dir)
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_index(cache_dir: Path, index: Dict[str, dict]) -> None:
+    path = _index_path(cache_dir)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _read_pages(path: Path) -> List[dict]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _games_in(pages: List[dict], start: str, end: str) -> List[Dict]:
+    # Same date semantics as the API's start_date / end_date filters
+    return [
+        g for page in pages for g in page.get("data", [])
+        if start <= g["date"][:10] <= end
+    ]
+
+
+def is_final(pages: List[dict], end: str, today: Optional[str] = None) -> bool:
+    """A range can no longer change: it ended before today, all games Final."""
+    today = today or datetime.now(timezone.utc).date().isoformat()
+    games = [g for page in pages for g in page.get("data", [])]
+    return end < today and all(g.get("status") == "Final" for g in games)
+
+
+# --------------------------------------------------
+# Lookup / record
+# --------------------------------------------------
+
+def lookup(start: str, end: str, cache_dir: Path = CACHE_DIR,
+           ttl_hours: float = CACHE_TTL_HOURS) -> Optional[List[Dict]]:
+    """Games of a final or unexpired entry covering [start, end], else None."""
+    now = time.time()
+    index = _load_index(cache_dir)
+
+    # Exact range first, then the newest fetch
+    covering = sorted(
+        (e for e in index.values() if e["start"] <= start and end <= e["end"]),
+        key=lambda e: (e["end"] > end or e["start"] < start, -e["fetched_at"]),
+    )
+    for entry in covering:
+        if entry["final"] or now - entry["fetched_at"] < ttl_hours * 3600:
+            pages = _read_pages(cache_dir / entry["file"])
+            if (entry["start"], entry["end"]) == (start, end):
+                return [g for page in pages for g in page.get("data", [])]
+            return _games_in(pages, start, end)
+    return None
+
+
+def replay(start: str, end: str, cache_dir: Path = CACHE_DIR) -> List[Dict]:
+    """
+    Every cached game dated in [start, end], whatever the entry's age;
+    when a game appears in several entries the latest fetch wins.
+    """
+    index = _load_index(cache_dir)
+    overlapping = sorted(
+        (e for e in index.values() if e["start"] <= end and start <= e["end"]),
+        key=lambda e: e["fetched_at"],
+    )
+    if not overlapping:
+        print(f"⚠️ Replay: no cached pages for {start} → {end} in {cache_dir}")
+        return []
+
+    games: Dict[int, Dict] = {}
+    for entry in overlapping:
+        for g in _games_in(_read_pages(cache_dir / entry["file"]), start, end):
+            games.pop(g["id"], None)
+            games[g["id"]] = g
+    return list(games.values())
+
+
+def record(start: str, end: str, pages: List[dict], cache_dir: Path = CACHE_DIR) -> None:
+    """Store one fetched range (raw page payloads) and index it."""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    name = f"games_{start}_{end}.ndjson.gz"
+
+    tmp = cache_dir / f"{name}.tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        for page in pages:
+            f.write(json.dumps(page, separators=(",", ":")) + "\n")
+    os.replace(tmp, cache_dir / name)
+
+    with _index_lock:
+        index = _load_index(cache_dir)
+        index[f"{start}_{end}"] = {
+            "start": start,
+            "end": end,
+            "file": name,
+            "fetched_at": time.time(),
+            "final": is_final(pages, end),
+            "games": sum(len(p.get("data", [])) for p in pages),
+        }
+        _save_index(cache_dir, index)
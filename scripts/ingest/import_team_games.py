@@ -0,0 +1,92 @@
+import argparse
+from typing import Dict
+
+import pandas as pd
+
+from scripts.ingest.append_daily_games import BASE_DIR, NAME_MAP, upsert_seasons
+from scripts.ingest.facts_store import FACTS_COLUMNS, FactsStore
+
+# --------------------------------------------------
+# Bulk importer for NBA-format game files
+# --------------------------------------------------
+# python -m scripts.ingest.import_team_games [data/raw/team_games.csv ...]
+#
+# One row per game (gameId, game_date, hometeam*/awayteam*, homeScore,
+# awayScore, ...) → team_game_facts rows (H and A), merged into the
+# season facts stores. Team ids are kept as given (NBA ids), matching
+# the facts rows already seeded from these files.
+
+RAW_CSV = BASE_DIR / "data" / "raw" / "team_games.csv"
+
+RAW_COLUMNS = [
+    "gameId", "game_date",
+    "hometeamCity", "hometeamName", "hometeamId",
+    "awayteamCity", "awayteamName", "awayteamId",
+    "homeScore", "awayScore",
+]
+
+
+def full_team_name(city: pd.Series, name: pd.Series) -> pd.Series:
+    """Nickname → official name via NAME_MAP, else "City Nickname"."""
+    return name.map(NAME_MAP).fillna(city.str.cat(name, sep=" "))
+
+
+def raw_to_rows(raw: pd.DataFrame) -> pd.DataFrame:
+    """Game-level rows → team-level fact rows, home row first per game."""
+    raw = raw.dropna(subset=["homeScore", "awayScore"])
+
+    # Calendar date as recorded (matches the existing facts)
+    day = pd.to_datetime(raw["game_date"], errors="coerce").dt.date
+    home_name = full_team_name(raw["hometeamCity"], raw["hometeamName"])
+    away_name = full_team_name(raw["awayteamCity"], raw["awayteamName"])
+
+    def side(team, opp, team_name, opp_name, flag, pts, opp_pts):
+        return pd.DataFrame({
+            "game_id": raw["gameId"],
+            "game_date": day,
+            "team_id": raw[team],
+            "team_name": team_name,
+            "opponent_id": raw[opp],
+            "opponent_name": opp_name,
+            "home_away": flag,
+            "team_points": raw[pts].astype("int64"),
+            "opponent_points": raw[opp_pts].astype("int64"),
+        }, columns=FACTS_COLUMNS)
+
+    home = side("hometeamId", "awayteamId", home_name, away_name, "H", "homeScore", "awayScore")
+    away = side("awayteamId", "hometeamId", away_name, home_name, "A", "awayScore", "homeScore")
+
+    # Same index per game: a stable sort interleaves H, A
+    rows = pd.concat([home, away]).sort_index(kind="stable")
+    return rows[rows["game_date"].notna()].reset_index(drop=True)
+
+
+def import_files(paths) -> Dict[int, object]:
+    """Import raw game files; returns {season: earliest changed game_date}."""
+    stores: Dict[int, FactsStore] = {}
+    changed: Dict[int, object] = {}
+
+    for path in paths:
+        rows = raw_to_rows(pd.read_csv(path, usecols=RAW_COLUMNS))
+        for season, since in upsert_seasons(rows, stores).items():
+            changed[season] = min(since, changed.get(season, since))
+        print(f"   ✓ {path}: {len(rows)} team-rows")
+
+    for season in sorted(stores):
+        since = changed.get(season)
+        print(
+            f"✅ Season {season}: {len(stores[season])} team-rows → {stores[season].path} "
+            f"(earliest changed: {since if since is not None else 'none'})"
+        )
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import NBA-format game files into team_game_facts")
+    parser.add_argument("paths", nargs="*", default=[RAW_CSV], help="raw game CSVs")
+    args = parser.parse_args()
+    import_files(args.paths)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+# --------------------------------------------------
+# Client-side rate limiting for the BallDontLie API
+# --------------------------------------------------
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate_per_min` requests per minute on
+    average, bursts of up to `burst`. pause() stops every caller until
+    the server's back-off window has passed (e.g. after a 429).
+    """
+
+    def __init__(self, rate_per_min: float, burst: Optional[int] = None,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate_per_min / 60.0
+        self.capacity = float(burst if burst is not None else max(1, int(rate_per_min // 60)))
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def acquire(self) -> None:
+        """Block until a request may start."""
+        while True:
+            with self.lock:
+                now = self.clock()
+                self._refill(now)
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold all callers for `seconds` and drop any saved-up burst."""
+        with self.lock:
+            now = self.clock()
+            self._refill(now)
+            self.paused_until = max(self.paused_until, now + seconds)
+            # resume at the base rate: nothing accrues while paused
+            self.tokens = 0.0
+            self.updated = self.paused_until
+
+
+# --------------------------------------------------
+# Backoff
+# --------------------------------------------------
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After header (delta-seconds or HTTP-date) → seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None,
+                  base: float = 1.0, cap: float = 60.0, rng=random) -> float:
+    """
+    Seconds to wait before retry number `attempt` (0-based): the
+    server's Retry-After when given (plus a little jitter so threads do
+    not return in lockstep), else full-jitter exponential backoff.
+    """
+    if retry_after is not None:
+        return retry_after + rng.uniform(0, base)
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
@@ -1,6 +1,6 @@
 import pandas as pd
 
-INPUT_CSV = "data/derived/team_game_metrics_with_rpmi_cvv.csv"
+from analysis.layers import read_layer
 
 
 def consistency_band(v):
@@ -17,8 +17,17 @@ def fmt_float(x, nd=2):
     return "—" if pd.isna(x) else f"{float(x):.{nd}f}"
 
 
+def consistency_board(df: pd.DataFrame) -> pd.DataFrame:
+    """Each team's latest row with a consistency score, most consistent first."""
+    df = df.sort_values(["team_id", "game_date", "game_id"])
+    latest = df.drop_duplicates(subset=["team_id"], keep="last").copy()
+
+    latest = latest[latest["consistency"].notna()].copy()
+    return latest.sort_values(["consistency", "team_name"], ascending=[False, True])
+
+
 def main():
-    df = pd.read_csv(INPUT_CSV)
+    df = read_layer("cvv")
 
     df["game_date"] = pd.to_datetime(df["game_date"], errors="coerce", utc=True)
     df = df[df["game_date"].notna()].copy()
@@ -27,16 +36,11 @@ def main():
         print("⚠️ No data available.")
         return
 
-    df = df.sort_values(["team_id", "game_date", "game_id"])
-    latest = df.drop_duplicates(subset=["team_id"], keep="last").copy()
-
-    latest = latest[latest["consistency"].notna()].copy()
+    latest = consistency_board(df)
     if latest.empty:
         print("⚠️ No valid consistency data available.")
         return
 
-    latest = latest.sort_values(["consistency", "team_name"], ascending=[False, True])
-
     latest_date = latest["game_date"].max().date()
     print(f"📊 Consistency Board ({latest_date})\n")
 
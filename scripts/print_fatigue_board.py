@@ -3,6 +3,8 @@
 from datetime import date
 import pandas as pd
 
+from analysis.storage import read_table
+
 
 SCHEDULE_PATH = "data/derived/game_schedule_today.csv"
 METRICS_PATH = "data/derived/team_game_metrics.csv"
@@ -52,10 +54,10 @@ def main():
         return
 
     # Load fatigue metrics
-    metrics = pd.read_csv(METRICS_PATH)
-    metrics["game_date"] = pd.to_datetime(
-        metrics["game_date"], errors="coerce"
-    ).dt.date
+    metrics = read_table(
+        METRICS_PATH,
+        columns=["game_date", "team_name", "fatigue_index", "fatigue_tier"],
+    )
 
     # Normalize team names
     name_map = {
@@ -4,7 +4,8 @@ from datetime import timedelta
 import pandas as pd
 import numpy as np
 
-INPUT_CSV = "data/derived/team_game_metrics_with_pve.csv"
+from analysis.layers import read_layer
+
 WINDOW_DAYS = 7  # calendar-day window
 
 
@@ -38,18 +39,20 @@ def momentum_label(score: float):
 
 
 # --------------------------------------------------
-# Main
+# Board
 # --------------------------------------------------
 
-def main():
-    df = pd.read_csv(INPUT_CSV)
-
+def momentum_board(df: pd.DataFrame):
+    """
+    Every team's weighted PvE over the WINDOW_DAYS calendar days ending
+    at the latest game in df → (start_date, latest_date, board), best first.
+    """
     # Required columns
     required = {"team_name", "game_date", "pve", "actual_margin", "game_id"}
     if not required.issubset(df.columns):
         raise RuntimeError("Missing required columns. Rebuild PvE first.")
 
-    df["game_date"] = pd.to_datetime(df["game_date"], errors="coerce").dt.date
+    df = df.assign(game_date=pd.to_datetime(df["game_date"], errors="coerce").dt.date)
 
     # Exclude invalid games
     df = df[
@@ -93,6 +96,16 @@ def main():
     out["_sort"] = out["score"].fillna(-9999)
     out = out.sort_values(["_sort", "games"], ascending=[False, False]).drop(columns="_sort")
 
+    return start_date, latest_date, out
+
+
+# --------------------------------------------------
+# Main
+# --------------------------------------------------
+
+def main():
+    start_date, latest_date, out = momentum_board(read_layer("pve"))
+
     # --------------------------------------------------
     # Output
     # --------------------------------------------------
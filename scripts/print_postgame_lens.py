@@ -1,12 +1,7 @@
 import pandas as pd
 from datetime import datetime, timedelta
 from analysis.compose_tweet import compose_tweet
-
-
-# --------------------------------------------------
-# Paths
-# --------------------------------------------------
-METRICS_CSV = "data/derived/team_game_metrics_with_rpmi_cvv.csv"
+from analysis.layers import read_layer
 
 
 # --------------------------------------------------
@@ -79,7 +74,7 @@ def format_postgame(home, away):
 # Main
 # --------------------------------------------------
 def main(target_date: str = None):
-    df = pd.read_csv(METRICS_CSV)
+    df = read_layer("cvv")
     df["game_date"] = pd.to_datetime(df["game_date"], errors="coerce").dt.date
 
     if target_date:
@@ -1,11 +1,12 @@
 import pandas as pd
 from datetime import date
 from analysis.utils import season_record
+from analysis.team_history import TeamHistoryIndex
 from analysis.compose_tweet import compose_tweet
+from analysis.layers import read_layer
 
 
 SCHEDULE_CSV = "data/derived/game_schedule_today.csv"
-METRICS_CSV = "data/derived/team_game_metrics_with_rpmi_cvv.csv"
 
 
 # -------------------- SAFE HELPERS --------------------
@@ -74,11 +75,8 @@ def matchup_volatility_label(vol_home, vol_away):
 
 # -------------------- DATA HELPERS --------------------
 
-def latest_valid_row(df, team_name):
-    team_df = df[df["team_name"] == team_name]
-    if team_df.empty:
-        return team_df
-    return team_df.sort_values("game_date").tail(1)
+def latest_valid_row(history: TeamHistoryIndex, team_name):
+    return history.latest_row(team_name)
 
 
 def format_pregame_lens(home, away, home_record, away_record):
@@ -125,11 +123,13 @@ def format_pregame_lens(home, away, home_record, away_record):
 
 def main():
     sched = pd.read_csv(SCHEDULE_CSV)
-    metrics = pd.read_csv(METRICS_CSV)
+    metrics = read_layer("cvv")
 
     sched["game_date"] = pd.to_datetime(sched["game_date"], errors="coerce").dt.date
     metrics["game_date"] = pd.to_datetime(metrics["game_date"], errors="coerce").dt.date
 
+    history = TeamHistoryIndex(metrics, key="team_name")
+
     run_date = sched["game_date"].max()
     cutoff = run_date
     print(f"📅 Using schedule for {run_date}\n")
@@ -138,18 +138,15 @@ def main():
         home_name = game["home_team_name"]
         away_name = game["away_team_name"]
 
-        home_df = latest_valid_row(metrics, home_name)
-        away_df = latest_valid_row(metrics, away_name)
+        home = latest_valid_row(history, home_name)
+        away = latest_valid_row(history, away_name)
 
-        if home_df.empty or away_df.empty:
+        if home is None or away is None:
             print(f"⚠️ Missing metrics for {away_name} @ {home_name}")
             continue
 
-        home = home_df.iloc[0]
-        away = away_df.iloc[0]
-
-        home_w, home_l = season_record(metrics, home["team_name"], cutoff)
-        away_w, away_l = season_record(metrics, away["team_name"], cutoff)
+        home_w, home_l = season_record(history, home["team_name"], cutoff)
+        away_w, away_l = season_record(history, away["team_name"], cutoff)
 
         base_text = format_pregame_lens(
             home,
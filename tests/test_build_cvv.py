@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis.build_cvv import compute_cvv, masked_mean_std
+from analysis.params import DEFAULT_PARAMS
+
+# --------------------------------------------------
+# CVV vs numpy and the scalar builder
+# --------------------------------------------------
+# masked_mean_std replays numpy's pairwise summation order so window
+# moments stay bit-identical to np.mean / np.std. These tests pin that
+# order (a numpy change would show up here first) on every code path:
+# under 8 values, 8-15 and 16+, and check compute_cvv against the
+# original row-by-row builder.
+
+CVV_COLUMNS = [
+    "pve_volatility", "consistency", "consistency_win", "consistency_loss",
+    "games_played", "games_in_window", "avg_pve_window",
+    "wins_window", "losses_window", "win_rate_window",
+]
+
+
+def scalar_cvv(df: pd.DataFrame, window: int, vol_scale: float) -> pd.DataFrame:
+    """The original per-row builder (build_cvv before vectorization)."""
+
+    def consistency_from_values(values):
+        if len(values) < 3:
+            return np.nan
+        vol = np.std(values, ddof=0)
+        return round(1 / (1 + vol / vol_scale), 3)
+
+    df = df.copy()
+    df["game_date"] = pd.to_datetime(df["game_date"], errors="coerce", utc=True)
+    df = df.sort_values(["team_id", "game_date"])
+    df[CVV_COLUMNS] = np.nan
+
+    for _, g in df.groupby("team_id"):
+        g = g.reset_index()
+        for i in range(len(g)):
+            idx = g.loc[i, "index"]
+            df.loc[idx, "games_played"] = i + 1
+            if i < window - 1:
+                continue
+
+            w = g.loc[i - window + 1 : i]
+            w = w[w["actual_margin"] != 0]
+            wins = (w["actual_margin"] > 0).sum()
+            losses = (w["actual_margin"] < 0).sum()
+            total = wins + losses
+            df.loc[idx, "wins_window"] = wins
+            df.loc[idx, "losses_window"] = losses
+            df.loc[idx, "win_rate_window"] = round(wins / total, 3) if total else np.nan
+
+            pve = w["pve"].dropna().values
+            df.loc[idx, "games_in_window"] = len(pve)
+            if len(pve) < 3:
+                continue
+            df.loc[idx, "avg_pve_window"] = round(float(np.mean(pve)), 2)
+            df.loc[idx, "pve_volatility"] = round(np.std(pve, ddof=0), 2)
+            df.loc[idx, "consistency"] = consistency_from_values(pve)
+            df.loc[idx, "consistency_win"] = consistency_from_values(
+                w.loc[w["actual_margin"] > 0, "pve"].dropna().values
+            )
+            df.loc[idx, "consistency_loss"] = consistency_from_values(
+                w.loc[w["actual_margin"] < 0, "pve"].dropna().values
+            )
+    return df
+
+
+def synthetic_pve(teams: int = 6, games: int = 45, seed: int = 7) -> pd.DataFrame:
+    """PvE-layer rows: 2-dp PvE (ties on rounding), zero margins and NaN PvE."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for team in range(1, teams + 1):
+        days = pd.Timestamp("2025-10-21") + pd.to_timedelta(
+            np.cumsum(rng.integers(1, 4, games)), unit="D"
+        )
+        margin = rng.integers(-25, 26, games)
+        margin[rng.random(games) < 0.05] = 0
+        pve = np.round(rng.normal(0, 9, games), 2)
+        pve[rng.random(games) < 0.08] = np.nan
+        for k in range(games):
+            rows.append({
+                "game_id": team * 1000 + k,
+                "game_date": days[k].date(),
+                "team_id": team,
+                "actual_margin": float(margin[k]),
+                "pve": pve[k],
+            })
+    return pd.DataFrame(rows)
+
+
+def _key_order(df: pd.DataFrame) -> pd.DataFrame:
+    return df.sort_values(["team_id", "game_date", "game_id"]).reset_index(drop=True)
+
+
+# --------------------------------------------------
+# Tests
+# --------------------------------------------------
+
+@pytest.mark.parametrize("width", [3, 5, 7, 8, 10, 15, 16, 17, 40, 128, 129, 300])
+def test_masked_moments_match_numpy(width):
+    rng = np.random.default_rng(width)
+    values = np.round(rng.normal(0, 9, (400, width)), 2)
+    mask = rng.random((400, width)) > 0.25
+    mask[:5] = True                      # full windows
+    mask[5:10] = False                   # empty windows
+    values[~mask & (rng.random((400, width)) < 0.5)] = np.nan   # masked NaNs
+
+    n, mean, std = masked_mean_std(values, mask)
+
+    for row in range(len(values)):
+        picked = values[row][mask[row]]
+        assert n[row] == len(picked)
+        if len(picked) == 0:
+            assert np.isnan(mean[row])
+            continue
+        # bit-identical, not just close
+        assert mean[row] == np.mean(picked)
+        assert std[row] == np.std(picked, ddof=0)
+
+
+@pytest.mark.parametrize("window", [DEFAULT_PARAMS.cvv_window, 5, 16, 20])
+def test_compute_cvv_matches_scalar_builder(window):
+    df = synthetic_pve()
+    params = DEFAULT_PARAMS._replace(cvv_window=window)
+
+    got = _key_order(compute_cvv(df, params=params))
+    want = _key_order(scalar_cvv(df, window, params.vol_scale))
+
+    pd.testing.assert_frame_equal(
+        got[CVV_COLUMNS], want[CVV_COLUMNS], check_dtype=False, check_exact=True
+    )
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+from analysis.build_cvv import compute_cvv
+from analysis.build_game_environment import FACTS_CSV, MIN_GAMES_FOR_MATURE, build_game_environment
+from analysis.build_pve import build_pve
+from analysis.build_rpmi import compute_rpmi
+from analysis.build_team_game_metrics import build_team_game_metrics
+from analysis.storage import read_table
+
+# --------------------------------------------------
+# Game environment vs the scalar per-game builder
+# --------------------------------------------------
+# build_game_environment scores every game column-wise on a paired
+# home/away frame; game_environment.csv must stay what the original
+# per-game loop wrote from the same CVV rows and facts.
+
+CLEAN_THR, NOISY_THR = 0.35, 0.65
+VOL_SCALE, FATIGUE_LOW, FATIGUE_HIGH = 15.0, 30.0, 80.0
+
+
+def _clip01(x):
+    return float(np.clip(x, 0.0, 1.0))
+
+
+def _norm(x, low, scale):
+    return np.nan if pd.isna(x) else _clip01((float(x) - low) / scale)
+
+
+def _norm_asym(x, scale):
+    return np.nan if pd.isna(x) else _clip01(abs(float(x)) / scale)
+
+
+def _safe_avg(values):
+    vals = [v for v in values if not pd.isna(v)]
+    return np.nan if not vals else float(np.mean(vals))
+
+
+def _classify(risk_score, maturity_ok):
+    if not maturity_ok or pd.isna(risk_score):
+        return "Forming"
+    if risk_score <= CLEAN_THR:
+        return "Clean"
+    if risk_score >= NOISY_THR:
+        return "Noisy"
+    return "Mixed"
+
+
+def _drivers(load_risk, behavior_risk, matchup_risk, maturity_ok):
+    if not maturity_ok:
+        return "early-season/low-history"
+    drivers = []
+    if load_risk >= 0.60:
+        drivers.append("fatigue load")
+    if behavior_risk >= 0.60:
+        drivers.append("volatile teams")
+    if matchup_risk >= 0.60:
+        drivers.append("stability mismatch")
+    return ", ".join(drivers) if drivers else "stable conditions"
+
+
+def scalar_environment(df: pd.DataFrame, facts: pd.DataFrame) -> pd.DataFrame:
+    """The original builder (build_game_environment.main before vectorization)."""
+    df = df.copy()
+    facts = facts.copy()
+    df["game_date"] = pd.to_datetime(df["game_date"], utc=True)
+    facts["game_date"] = pd.to_datetime(facts["game_date"], utc=True)
+
+    valid = df.groupby("game_id").size()
+    df = df[df["game_id"].isin(valid[valid == 2].index)].copy()
+
+    rows = []
+    for game_id, g in df.groupby("game_id"):
+        home = g[g["home_away"] == "H"].iloc[0]
+        away = g[g["home_away"] == "A"].iloc[0]
+
+        gp_home = facts[
+            (facts["team_id"] == home["team_id"]) & (facts["game_date"] < home["game_date"])
+        ].shape[0]
+        gp_away = facts[
+            (facts["team_id"] == away["team_id"]) & (facts["game_date"] < away["game_date"])
+        ].shape[0]
+        maturity_ok = gp_home >= MIN_GAMES_FOR_MATURE and gp_away >= MIN_GAMES_FOR_MATURE
+
+        load_risk = _safe_avg([
+            _norm(home["fatigue_index"], FATIGUE_LOW, FATIGUE_HIGH - FATIGUE_LOW),
+            _norm(away["fatigue_index"], FATIGUE_LOW, FATIGUE_HIGH - FATIGUE_LOW),
+        ])
+        behavior_risk = _safe_avg([
+            _norm(home.get("pve_volatility"), 0.0, VOL_SCALE),
+            _norm(away.get("pve_volatility"), 0.0, VOL_SCALE),
+        ])
+        matchup_risk = _safe_avg([
+            _norm_asym(home["fatigue_index"] - away["fatigue_index"], 40.0),
+            _norm_asym(home.get("consistency") - away.get("consistency"), 0.30),
+        ])
+        risk_score = _safe_avg([
+            0.45 * load_risk if not pd.isna(load_risk) else np.nan,
+            0.35 * behavior_risk if not pd.isna(behavior_risk) else np.nan,
+            0.20 * matchup_risk if not pd.isna(matchup_risk) else np.nan,
+        ])
+
+        rows.append({
+            "game_id": game_id,
+            "game_date": home["game_date"],
+            "matchup": f"{away['team_name']} @ {home['team_name']}",
+            "environment_risk": None if pd.isna(risk_score) else round(risk_score, 3),
+            "environment_label": _classify(risk_score, maturity_ok),
+            "drivers": _drivers(load_risk, behavior_risk, matchup_risk, maturity_ok),
+            "load_risk": None if pd.isna(load_risk) else round(load_risk, 3),
+            "behavior_risk": None if pd.isna(behavior_risk) else round(behavior_risk, 3),
+            "matchup_risk": None if pd.isna(matchup_risk) else round(matchup_risk, 3),
+            "fatigue_home": home["fatigue_index"],
+            "fatigue_away": away["fatigue_index"],
+            "vol_home": home.get("pve_volatility"),
+            "vol_away": away.get("pve_volatility"),
+            "games_played_home": gp_home,
+            "games_played_away": gp_away,
+            "maturity_ok": maturity_ok,
+        })
+
+    return pd.DataFrame(rows).sort_values(["game_date", "game_id"])
+
+
+def test_environment_matches_scalar_builder():
+    games = read_table(FACTS_CSV)
+    cvv = compute_cvv(compute_rpmi(build_pve(build_team_game_metrics(games))))
+    facts = games[["game_id", "game_date", "team_id"]]
+
+    # The season's inputs are calm: also spread fatigue and volatility out
+    # so every driver branch is exercised
+    rng = np.random.default_rng(9)
+    spread = cvv.assign(
+        fatigue_index=np.round(rng.uniform(0, 100, len(cvv)), 1),
+        pve_volatility=np.round(cvv["pve_volatility"] * rng.uniform(0.5, 3.0, len(cvv)), 2),
+    )
+
+    for frame in (cvv, spread):
+        got = build_game_environment(frame, facts)
+        want = scalar_environment(frame, pd.read_csv(FACTS_CSV))
+        assert got.to_csv(index=False) == want.to_csv(index=False)
+
+    drivers = set(build_game_environment(spread, facts)["drivers"].str.split(", ").explode())
+    assert {"fatigue load", "volatile teams", "stability mismatch"} <= drivers
@@ -0,0 +1,66 @@
+import pandas as pd
+
+from analysis.build_pve import build_pve
+from analysis.build_team_game_metrics import FACTS_CSV, build_team_game_metrics
+from analysis.pve import expected_margin_breakdown_from_rows
+from analysis.storage import read_table
+from analysis.utils import utc_today
+
+# --------------------------------------------------
+# PvE builder vs the scalar per-row builder
+# --------------------------------------------------
+# build_pve reads each game's form inputs from per-team prefix sums; it
+# must write the same PvE rows as the original builder, which filtered
+# the frame for every team-row and took the last 30 games before it.
+# The clock is stopped mid-season so unplayed rows are dropped too.
+
+TODAY = pd.Timestamp("2025-12-01")
+
+
+def scalar_pve(df: pd.DataFrame, today) -> pd.DataFrame:
+    """The original builder (build_pve before prefix aggregates)."""
+    df = df.copy()
+    df["game_date"] = pd.to_datetime(df["game_date"], utc=True, errors="coerce")
+    df = df[df["game_date"] < utc_today(today)]
+    df = df.sort_values(["team_id", "game_date"])
+
+    rows = []
+    for _, g in df.groupby("game_id"):
+        if len(g) != 2:
+            continue
+        for _, row in g.iterrows():
+            actual = row["actual_margin"]
+            if pd.isna(actual) or actual == 0:
+                continue
+
+            recent_games = df[
+                (df["team_id"].isin([row["team_id"], row["opponent_id"]]))
+                & (df["game_date"] < row["game_date"])
+            ].tail(30)
+
+            breakdown = expected_margin_breakdown_from_rows(
+                team_id=row["team_id"],
+                opponent_id=row["opponent_id"],
+                is_home=row["home_away"] == "H",
+                recent_games=recent_games,
+                fatigue_index=row["fatigue_index"],
+                today=today,
+            )
+            expected = breakdown["expected_total"]
+            rows.append({
+                **row.to_dict(),
+                "expected_margin": round(expected, 2),
+                "pve": round(actual - expected, 2),
+                **breakdown,
+            })
+    return pd.DataFrame(rows)
+
+
+def test_pve_matches_scalar_builder():
+    metrics = build_team_game_metrics(read_table(FACTS_CSV))
+
+    got = build_pve(metrics, today=TODAY)
+    want = scalar_pve(metrics, TODAY)
+
+    assert len(want) > 0
+    assert got.to_csv(index=False) == want.to_csv(index=False)
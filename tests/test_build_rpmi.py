@@ -0,0 +1,161 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis.build_pve import build_pve
+from analysis.build_rpmi import (
+    compute_rpmi,
+    load_rpmi_state,
+    momentum_contribution,
+    rpmi_state,
+    save_rpmi_state,
+    stream_rpmi,
+    weighted_mean,
+)
+from analysis.build_team_game_metrics import FACTS_CSV, build_team_game_metrics
+from analysis.layers import RPMI_COLUMNS
+from analysis.params import DEFAULT_PARAMS
+from analysis.storage import read_table
+
+# --------------------------------------------------
+# RPMI vs the scalar builder, streamed vs batch
+# --------------------------------------------------
+# compute_rpmi scores every window in one vectorized pass and
+# RpmiState scores one game at a time from a checkpoint; both must
+# write the rows of the original per-team builder. That builder
+# assigned its window Series by label after reset_index, which put
+# values on the wrong rows; the reference below assigns positionally.
+
+ROW_KEY = ["team_id", "game_date", "game_id"]
+CUTOFF = date(2025, 12, 1)
+
+
+def scalar_rpmi(df: pd.DataFrame, short_window: int, long_window: int) -> pd.DataFrame:
+    """The original builder (build_rpmi before vectorization), row-aligned."""
+
+    def window_rpmi(units, window):
+        out = [np.nan] * len(units)
+        for i in range(window - 1, len(units)):
+            window_vals = units[i - window + 1 : i + 1]
+            window_vals = window_vals[~np.isnan(window_vals)]
+            if len(window_vals) < window:
+                continue
+            out[i] = round(weighted_mean(window_vals), 2)
+        return np.array(out)
+
+    df = df.copy()
+    df["game_date"] = pd.to_datetime(df["game_date"], errors="coerce")
+    df = df.sort_values(["team_id", "game_date"])
+    df = df[df["actual_margin"] != 0]
+
+    df["momentum_unit"] = df.apply(
+        lambda r: momentum_contribution(r["actual_margin"], r["pve"]),
+        axis=1,
+    )
+    df[["rpmi_short", "rpmi_long", "rpmi_accel", "rpmi_delta"]] = np.nan
+
+    for _, g in df.groupby("team_id"):
+        units = g["momentum_unit"].to_numpy(dtype=np.float64)
+        rpmi_s = window_rpmi(units, short_window)
+        rpmi_l = window_rpmi(units, long_window)
+
+        delta = np.full(len(g), np.nan)
+        for i in range(1, len(g)):
+            if not np.isnan(rpmi_s[i - 1]) and not np.isnan(rpmi_s[i]):
+                delta[i] = round(rpmi_s[i] - rpmi_s[i - 1], 2)
+
+        df.loc[g.index, "rpmi_short"] = rpmi_s
+        df.loc[g.index, "rpmi_long"] = rpmi_l
+        df.loc[g.index, "rpmi_accel"] = rpmi_s - rpmi_l
+        df.loc[g.index, "rpmi_delta"] = delta
+    return df
+
+
+def synthetic_pve(teams: int = 5, games: int = 40, seed: int = 11) -> pd.DataFrame:
+    """PvE-layer rows with zero margins and NaN PvE mixed in."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for team in range(1, teams + 1):
+        days = pd.Timestamp("2025-10-21") + pd.to_timedelta(
+            np.cumsum(rng.integers(1, 4, games)), unit="D"
+        )
+        margin = rng.integers(-25, 26, games)
+        margin[rng.random(games) < 0.05] = 0
+        pve = np.round(rng.normal(0, 9, games), 2)
+        pve[rng.random(games) < 0.05] = np.nan
+        for k in range(games):
+            rows.append({
+                "game_id": team * 1000 + k,
+                "game_date": days[k].date(),
+                "team_id": team,
+                "actual_margin": float(margin[k]),
+                "pve": pve[k],
+            })
+    return pd.DataFrame(rows)
+
+
+def committed_pve() -> pd.DataFrame:
+    return build_pve(build_team_game_metrics(read_table(FACTS_CSV)))
+
+
+def game_day(df: pd.DataFrame) -> pd.Series:
+    return pd.to_datetime(df["game_date"]).dt.date
+
+
+def _key_order(df: pd.DataFrame) -> pd.DataFrame:
+    return df.assign(game_date=game_day(df)).sort_values(ROW_KEY).reset_index(drop=True)
+
+
+# --------------------------------------------------
+# Tests
+# --------------------------------------------------
+
+@pytest.mark.parametrize("source", [committed_pve, synthetic_pve])
+@pytest.mark.parametrize("windows", [(3, 7), (2, 12)])
+def test_compute_rpmi_matches_scalar_builder(source, windows):
+    df = source()
+    params = DEFAULT_PARAMS._replace(short_window=windows[0], long_window=windows[1])
+
+    got = _key_order(compute_rpmi(df, params=params))
+    want = _key_order(scalar_rpmi(df, *windows))
+
+    assert got["rpmi_short"].notna().any()
+    pd.testing.assert_frame_equal(
+        got[ROW_KEY + RPMI_COLUMNS], want[ROW_KEY + RPMI_COLUMNS],
+        check_dtype=False, check_exact=True,
+    )
+
+
+@pytest.mark.parametrize("source", [committed_pve, synthetic_pve])
+def test_streamed_rows_match_compute_rpmi(source, tmp_path):
+    df = source()
+    batch = compute_rpmi(df)
+    days = game_day(batch)
+
+    # Checkpoint mid-season, round-trip it through JSON, stream the rest
+    path = str(tmp_path / "rpmi_state.json")
+    save_rpmi_state(rpmi_state(batch[days < CUTOFF]), path)
+    state = load_rpmi_state(path)
+
+    streamed = stream_rpmi(df[game_day(df) >= CUTOFF], state)
+
+    got, want = _key_order(streamed), _key_order(batch[days >= CUTOFF])
+
+    assert len(got) > 0
+    pd.testing.assert_frame_equal(
+        got[ROW_KEY + RPMI_COLUMNS], want[ROW_KEY + RPMI_COLUMNS],
+        check_dtype=False, check_exact=True,
+    )
+    assert state["through_date"] == days.max()
+
+
+def test_stream_refuses_rows_already_in_checkpoint():
+    df = synthetic_pve()
+    batch = compute_rpmi(df)
+    state = rpmi_state(batch[game_day(batch) < CUTOFF])
+
+    overlap = df[game_day(df) >= state["through_date"]]
+    with pytest.raises(ValueError, match="on/before the RPMI checkpoint"):
+        stream_rpmi(overlap, state)
@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+import pandas as pd
+
+from analysis.build_team_game_metrics import FACTS_CSV, build_team_game_metrics, extract_city
+from analysis.fli import fatigue_components_from_row
+from analysis.storage import read_table
+from analysis.utils import travel_miles
+
+# --------------------------------------------------
+# Metrics builder vs the scalar day-by-day builder
+# --------------------------------------------------
+# The vectorized builder must write the same team_game_metrics.csv as
+# the original one (per-day frame filters, iterrows, running per-team
+# city / last-game state) on the committed facts.
+
+
+def scalar_metrics(games: pd.DataFrame) -> pd.DataFrame:
+    """The original builder (build_team_game_metrics before vectorization)."""
+    rows = []
+    last_city, last_day = {}, {}
+    current, end = games["game_date"].min(), games["game_date"].max()
+
+    while current <= end:
+        today = games[games["game_date"] == current]
+        if today.empty:
+            current += timedelta(days=1)
+            continue
+
+        before = games["game_date"] < current
+        recent_14 = games[before & (games["game_date"] >= current - timedelta(days=14))]
+        recent_7 = games[before & (games["game_date"] >= current - timedelta(days=7))]
+
+        for _, g in today.iterrows():
+            team_id = g["team_id"]
+            previous_city = last_city.get(team_id)
+            current_city = extract_city(
+                g["team_name"] if g["home_away"] == "H" else g["opponent_name"]
+            )
+            travel = (
+                travel_miles(previous_city, current_city)
+                if previous_city and current_city
+                else None
+            )
+            fatigue = fatigue_components_from_row(
+                games_last_7=(recent_7["team_id"] == team_id).sum(),
+                games_last_14=(recent_14["team_id"] == team_id).sum(),
+                days_since_last_game=(
+                    (current - last_day[team_id]).days if team_id in last_day else 5
+                ),
+                travel_miles=travel,
+            )
+            rows.append({
+                "game_id": g["game_id"],
+                "game_date": current,
+                "team_id": team_id,
+                "team_name": g["team_name"],
+                "opponent_id": g["opponent_id"],
+                "opponent_name": g["opponent_name"],
+                "home_away": g["home_away"],
+                "actual_margin": g["team_points"] - g["opponent_points"],
+                "current_city": current_city,
+                "previous_city": previous_city,
+                **fatigue,
+            })
+            last_city[team_id] = current_city
+            last_day[team_id] = current
+
+        current += timedelta(days=1)
+
+    return pd.DataFrame(rows)
+
+
+def test_metrics_csv_matches_scalar_builder():
+    raw = pd.read_csv(FACTS_CSV)
+    raw["game_date"] = pd.to_datetime(
+        raw["game_date"], utc=True, errors="coerce", format="mixed"
+    ).dt.date
+
+    got = build_team_game_metrics(read_table(FACTS_CSV))
+    want = scalar_metrics(raw)
+
+    assert got.to_csv(index=False) == want.to_csv(index=False)
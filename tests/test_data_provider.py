@@ -0,0 +1,145 @@
+import functools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from scripts.ingest import data_provider, http_cache
+from scripts.ingest.rate_limit import TokenBucket
+
+# --------------------------------------------------
+# Local stand-in for the BallDontLie API
+# --------------------------------------------------
+# python -m pytest tests
+#
+# A real HTTP server on 127.0.0.1 plays back a scripted list of
+# responses, so api_get's retry / Retry-After / rate-limit handling is
+# exercised over the pooled session end to end.
+
+
+class StandIn:
+    """Serves `script` responses in order (the last one repeats) and logs each hit."""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.hits = []          # (monotonic time, query string)
+        self.lock = threading.Lock()
+
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stand_in.lock:
+                    stand_in.hits.append((time.monotonic(), self.path.partition("?")[2]))
+                    status, headers, body = stand_in.script[
+                        min(len(stand_in.hits), len(stand_in.script)) - 1
+                    ]
+                payload = body(self.path) if callable(body) else body
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1/games"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def live_client(monkeypatch, tmp_path):
+    """Fresh session and limiter per test; pages are cached under tmp_path."""
+    monkeypatch.setenv("BALLDONTLIE_API_KEY", "test-key")
+    monkeypatch.setenv("BALLDONTLIE_HTTP_MODE", "live")
+    monkeypatch.setattr(data_provider, "_session", None)
+    monkeypatch.setattr(data_provider, "RATE_LIMITER", TokenBucket(6000, burst=10))
+    monkeypatch.setattr(http_cache, "record", functools.partial(http_cache.record, cache_dir=tmp_path))
+
+
+def page(n, total):
+    return {"data": [{"id": n}], "meta": {"total_pages": total}}
+
+
+# --------------------------------------------------
+# Tests
+# --------------------------------------------------
+
+def test_429_waits_out_retry_after():
+    script = [
+        (429, {"Retry-After": "1"}, {"error": "slow down"}),
+        (200, {}, page(1, 1)),
+    ]
+    with StandIn(script) as api:
+        resp = data_provider.api_get({"page": 1}, api_url=api.url)
+
+    assert resp.json() == page(1, 1)
+    assert len(api.hits) == 2
+    # Retry-After is a floor: the retry never comes back early
+    assert api.hits[1][0] - api.hits[0][0] >= 1.0
+
+
+def test_429_pauses_every_caller():
+    limiter = data_provider.RATE_LIMITER
+    script = [
+        (429, {"Retry-After": "1"}, {"error": "slow down"}),
+        (200, {}, page(1, 1)),
+    ]
+    with StandIn(script) as api:
+        worker = threading.Thread(target=data_provider.api_get, args=({"page": 1},),
+                                  kwargs={"api_url": api.url})
+        worker.start()
+        while len(api.hits) < 1:
+            time.sleep(0.01)
+        time.sleep(0.1)   # let the worker see its 429
+
+        started = time.monotonic()
+        data_provider.api_get({"page": 2}, api_url=api.url)
+        worker.join()
+
+    # The other caller was held by the shared pause, not only the one that got the 429
+    assert limiter.paused_until > 0
+    assert time.monotonic() - started >= 0.8
+
+
+def test_pages_are_paced_by_the_rate_limit(monkeypatch):
+    # 600 / min with no burst: one request every 0.1 s
+    monkeypatch.setattr(data_provider, "RATE_LIMITER", TokenBucket(600, burst=1))
+
+    def body(path):
+        n = int(path.rpartition("page=")[2].partition("&")[0])
+        return page(n, 6)
+
+    with StandIn([(200, {}, body)]) as api:
+        games = data_provider.fetch_games_range("2025-10-21", "2025-10-22", max_workers=4,
+                                                api_url=api.url)
+
+    assert [g["id"] for g in games] == [1, 2, 3, 4, 5, 6]
+    times = sorted(t for t, _ in api.hits)
+    assert len(times) == 6
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    assert min(gaps) >= 0.08
+    assert times[-1] - times[0] >= 0.45
+
+
+def test_client_errors_are_not_retried():
+    with StandIn([(401, {}, {"error": "bad key"})]) as api:
+        with pytest.raises(RuntimeError, match="status=401"):
+            data_provider.api_get({"page": 1}, api_url=api.url)
+
+    assert len(api.hits) == 1
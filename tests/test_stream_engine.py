@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from analysis.build_cvv import compute_cvv
+from analysis.build_pve import build_pve
+from analysis.build_rpmi import compute_rpmi
+from analysis.build_team_game_metrics import FACTS_CSV, build_team_game_metrics
+from analysis.params import DEFAULT_PARAMS
+from analysis.storage import read_table
+from analysis.stream_engine import stream_layers
+
+# --------------------------------------------------
+# Fused pass vs the staged chain
+# --------------------------------------------------
+# stream_layers replaces build_team_game_metrics → build_pve →
+# compute_rpmi → compute_cvv with one chronological pass; both paths
+# must write the same rows and values. Checked with the season clock
+# running and stopped mid-season (unplayed rows dropped from PvE on).
+
+ROW_KEY = ["team_id", "game_date", "game_id"]
+
+
+def _key_order(df: pd.DataFrame) -> pd.DataFrame:
+    return df.sort_values(ROW_KEY).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("today", [None, pd.Timestamp("2025-12-01")])
+@pytest.mark.parametrize("params", [
+    DEFAULT_PARAMS,
+    DEFAULT_PARAMS._replace(home_advantage=3.0, b2b_bonus=12, long_window=9, cvv_window=5),
+])
+def test_fused_pass_matches_staged_chain(today, params):
+    games = read_table(FACTS_CSV)
+
+    metrics, cvv = stream_layers(games, today=today, params=params)
+
+    staged_metrics = build_team_game_metrics(games, params=params)
+    pve = build_pve(staged_metrics, today=today, params=params)
+    staged_cvv = compute_cvv(compute_rpmi(pve, params=params), params=params)
+
+    assert len(staged_cvv) > 0
+    assert metrics.to_csv(index=False) == staged_metrics.to_csv(index=False)
+
+    got = _key_order(cvv)
+    want = _key_order(staged_cvv)
+    assert list(got.columns) == list(want.columns)
+    assert got.to_csv(index=False) == want.to_csv(index=False)